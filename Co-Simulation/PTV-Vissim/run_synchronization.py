@@ -18,6 +18,8 @@ import json
 import logging
 import time
 
+import numpy as np
+
 # ==================================================================================================
 # -- find carla module -----------------------------------------------------------------------------
 # ==================================================================================================
@@ -38,6 +40,8 @@ except IndexError:
 # -- vissim integration imports --------------------------------------------------------------------
 # ==================================================================================================
 
+import carla  # pylint: disable=import-error
+
 from vissim_integration.bridge_helper import BridgeHelper
 from vissim_integration.carla_simulation import CarlaSimulation
 from vissim_integration.vissim_simulation import PTVVissimSimulation
@@ -48,6 +52,29 @@ from vissim_integration.constants import INVALID_ACTOR_ID
 # ==================================================================================================
 
 
+def _get_transform_row(transform):
+    """
+    Returns the given transform as a (x, y, z, pitch, yaw, roll) tuple.
+    """
+    return (transform.location.x, transform.location.y, transform.location.z,
+            transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll)
+
+
+def _get_extent_row(actor):
+    """
+    Returns the extent of the bounding box of the given actor as a (x, y, z) tuple.
+    """
+    extent = actor.bounding_box.extent
+    return (extent.x, extent.y, extent.z)
+
+
+def _make_transform(location, rotation):
+    """
+    Returns a carla transform from the (x, y, z) location and (pitch, yaw, roll) rotation arrays.
+    """
+    return carla.Transform(carla.Location(*location.tolist()), carla.Rotation(*rotation.tolist()))
+
+
 class SimulationSynchronization(object):
     """
     SimulationSynchronization class is responsible for the synchronization of ptv-vissim and carla
@@ -101,15 +128,25 @@ class SimulationSynchronization(object):
             if vissim_actor_id in self.vissim2carla_ids:
                 self.vissim.destroy_actor(self.vissim2carla_ids.pop(vissim_actor_id))
 
-        # Updating vissim controlled vehicles in carla.
-        for vissim_actor_id in self.vissim2carla_ids:
+        # Updating vissim controlled vehicles in carla. The transforms are converted at once.
+        vissim_actor_ids = list(self.vissim2carla_ids)
+        vissim_transforms = np.array([
+            _get_transform_row(self.vissim.get_actor(vissim_actor_id).get_transform())
+            for vissim_actor_id in vissim_actor_ids
+        ]).reshape(-1, 6)
+        carla_extents = [
+            _get_extent_row(self.carla.get_actor(self.vissim2carla_ids[vissim_actor_id]))
+            for vissim_actor_id in vissim_actor_ids
+        ]
+        carla_locations, carla_rotations = BridgeHelper.get_carla_transforms(
+            vissim_transforms[:, :3], vissim_transforms[:, 3:], carla_extents)
+
+        for i, vissim_actor_id in enumerate(vissim_actor_ids):
             carla_actor_id = self.vissim2carla_ids[vissim_actor_id]
 
             vissim_actor = self.vissim.get_actor(vissim_actor_id)
-            carla_actor = self.carla.get_actor(carla_actor_id)
 
-            carla_transform = BridgeHelper.get_carla_transform(vissim_actor.get_transform(),
-                                                               carla_actor.bounding_box.extent)
+            carla_transform = _make_transform(carla_locations[i], carla_rotations[i])
             carla_velocity = BridgeHelper.get_carla_velocity(vissim_actor.get_velocity())
             self.carla.synchronize_vehicle(carla_actor_id, carla_transform, carla_velocity)
 
@@ -138,16 +175,23 @@ class SimulationSynchronization(object):
             if carla_actor_id in self.carla2vissim_ids:
                 self.vissim.destroy_actor(self.carla2vissim_ids.pop(carla_actor_id))
 
-        # Updating carla controlled vehicles in vissim.
-        for carla_actor_id in self.carla2vissim_ids:
+        # Updating carla controlled vehicles in vissim. The transforms are converted at once.
+        carla_actors = [(carla_actor_id, self.carla.get_actor(carla_actor_id))
+                        for carla_actor_id, vissim_actor_id in self.carla2vissim_ids.items()
+                        if vissim_actor_id != INVALID_ACTOR_ID]
+        carla_transforms = np.array([
+            _get_transform_row(carla_actor.get_transform()) for _, carla_actor in carla_actors
+        ]).reshape(-1, 6)
+        vissim_locations, vissim_rotations = BridgeHelper.get_vissim_transforms(
+            carla_transforms[:, :3], carla_transforms[:, 3:],
+            [_get_extent_row(carla_actor) for _, carla_actor in carla_actors])
+
+        for i, (carla_actor_id, carla_actor) in enumerate(carla_actors):
             vissim_actor_id = self.carla2vissim_ids[carla_actor_id]
-            if vissim_actor_id != INVALID_ACTOR_ID:
-                carla_actor = self.carla.get_actor(carla_actor_id)
 
-                vissim_transform = BridgeHelper.get_vissim_transform(
-                    carla_actor.get_transform(), carla_actor.bounding_box.extent)
-                vissim_velocity = BridgeHelper.get_vissim_velocity(carla_actor.get_velocity())
-                self.vissim.synchronize_vehicle(vissim_actor_id, vissim_transform, vissim_velocity)
+            vissim_transform = _make_transform(vissim_locations[i], vissim_rotations[i])
+            vissim_velocity = BridgeHelper.get_vissim_velocity(carla_actor.get_velocity())
+            self.vissim.synchronize_vehicle(vissim_actor_id, vissim_transform, vissim_velocity)
 
     def close(self):
         """
@@ -15,6 +15,8 @@ import logging
 import math
 import random
 
+import numpy as np
+
 import carla  # pylint: disable=import-error
 
 # ==================================================================================================
@@ -80,6 +82,62 @@ class BridgeHelper(object):
 
         return out_transform
 
+    @staticmethod
+    def get_carla_transforms(in_vissim_locations, in_vissim_rotations, extents=None):
+        """
+        Returns carla transforms based on vissim transforms, for several actors at once. Array
+        version of get_carla_transform.
+
+            :param in_vissim_locations: (N, 3) array with the vissim locations (x, y, z).
+            :param in_vissim_rotations: (N, 3) array with the vissim rotations (pitch, yaw, roll).
+            :param extents: (N, 3) array with the extents of the actors, or None.
+            :return: tuple with the (N, 3) arrays of carla locations and rotations.
+        """
+        out_locations = np.array(in_vissim_locations, dtype=np.float64).reshape(-1, 3)
+        out_rotations = np.array(in_vissim_rotations, dtype=np.float64).reshape(-1, 3)
+
+        # From front-center-bumper to center (vissim reference system).
+        if extents is not None:
+            extent_x = np.asarray(extents, dtype=np.float64).reshape(-1, 3)[:, 0]
+            yaw = np.radians(out_rotations[:, 1])
+            pitch = np.radians(out_rotations[:, 0])
+            out_locations -= np.column_stack((np.cos(yaw), np.sin(yaw), np.sin(pitch))) * \
+                extent_x[:, np.newaxis]
+
+        # Transform to carla reference system (left-handed system).
+        out_locations[:, 1] *= -1
+        out_rotations[:, 1] *= -1
+
+        return out_locations, out_rotations
+
+    @staticmethod
+    def get_vissim_transforms(in_carla_locations, in_carla_rotations, extents=None):
+        """
+        Returns vissim transforms based on carla transforms, for several actors at once. Array
+        version of get_vissim_transform.
+
+            :param in_carla_locations: (N, 3) array with the carla locations (x, y, z).
+            :param in_carla_rotations: (N, 3) array with the carla rotations (pitch, yaw, roll).
+            :param extents: (N, 3) array with the extents of the actors, or None.
+            :return: tuple with the (N, 3) arrays of vissim locations and rotations.
+        """
+        out_locations = np.array(in_carla_locations, dtype=np.float64).reshape(-1, 3)
+        out_rotations = np.array(in_carla_rotations, dtype=np.float64).reshape(-1, 3)
+
+        # From center to front-center-bumper (carla reference system).
+        if extents is not None:
+            extent_x = np.asarray(extents, dtype=np.float64).reshape(-1, 3)[:, 0]
+            yaw = np.radians(-1 * out_rotations[:, 1])
+            pitch = np.radians(out_rotations[:, 0])
+            out_locations += np.column_stack((np.cos(yaw), -np.sin(yaw), -np.sin(pitch))) * \
+                extent_x[:, np.newaxis]
+
+        # Transform to vissim reference system (right-handed system).
+        out_locations[:, 1] *= -1
+        out_rotations[:, 1] *= -1
+
+        return out_locations, out_rotations
+
     @staticmethod
     def _flip_y(in_vector):
         """
@@ -14,9 +14,13 @@ Script to integrate CARLA and SUMO simulations
 # ==================================================================================================
 
 import argparse
+import collections
 import logging
+import threading
 import time
 
+import numpy as np
+
 # ==================================================================================================
 # -- find carla module -----------------------------------------------------------------------------
 # ==================================================================================================
@@ -46,6 +50,9 @@ else:
 # -- sumo integration imports ----------------------------------------------------------------------
 # ==================================================================================================
 
+import carla  # pylint: disable=import-error, wrong-import-position
+
+from sumo_integration.area_of_interest import AreaOfInterest  # pylint: disable=wrong-import-position
 from sumo_integration.bridge_helper import BridgeHelper  # pylint: disable=wrong-import-position
 from sumo_integration.carla_simulation import CarlaSimulation  # pylint: disable=wrong-import-position
 from sumo_integration.constants import INVALID_ACTOR_ID  # pylint: disable=wrong-import-position
@@ -56,6 +63,59 @@ from sumo_integration.sumo_simulation import SumoSimulation  # pylint: disable=w
 # ==================================================================================================
 
 
+def _get_transform_row(transform):
+    """
+    Returns the given transform as a (x, y, z, pitch, yaw, roll) tuple.
+    """
+    return (transform.location.x, transform.location.y, transform.location.z,
+            transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll)
+
+
+def _get_extent_row(actor):
+    """
+    Returns the extent of the bounding box of the given actor as a (x, y, z) tuple.
+    """
+    extent = actor.bounding_box.extent
+    return (extent.x, extent.y, extent.z)
+
+
+def _make_transform(location, rotation):
+    """
+    Returns a carla transform from the (x, y, z) location and (pitch, yaw, roll) rotation arrays.
+    """
+    return carla.Transform(carla.Location(*location.tolist()), carla.Rotation(*rotation.tolist()))
+
+
+class _SumoStepWorker(object):
+    """
+    Runs a sumo step on a worker thread. Errors are raised again on join.
+    """
+    def __init__(self, sumo_simulation):
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(sumo_simulation, ))
+        self._thread.daemon = True
+
+    def _run(self, sumo_simulation):
+        try:
+            sumo_simulation.tick()
+        except Exception as error:  # pylint: disable=broad-except
+            self._error = error
+
+    def start(self):
+        """
+        Starts the sumo step.
+        """
+        self._thread.start()
+
+    def join(self):
+        """
+        Waits for the sumo step to finish.
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
 class SimulationSynchronization(object):
     """
     SimulationSynchronization class is responsible for the synchronization of sumo and carla
@@ -66,15 +126,29 @@ class SimulationSynchronization(object):
                  carla_simulation,
                  tls_manager='none',
                  sync_vehicle_color=False,
-                 sync_vehicle_lights=False):
+                 sync_vehicle_lights=False,
+                 pipelined=False,
+                 area_of_interest=None):
 
         self.sumo = sumo_simulation
         self.carla = carla_simulation
 
+        # Pipelined stepping (see tick). Whether the sumo step of the next tick is already done.
+        self.pipelined = pipelined
+        self._sumo_stepped = False
+
+        # If set, only the sumo actors inside the area of interest are mirrored in carla.
+        self.area_of_interest = area_of_interest
+
         self.tls_manager = tls_manager
         self.sync_vehicle_color = sync_vehicle_color
         self.sync_vehicle_lights = sync_vehicle_lights
 
+        # Last state pushed to the managed simulation of each landmark, and counters of the
+        # traffic light sync (steps, landmarks checked and transitions pushed).
+        self._synced_tl_states = {}  # {landmark_id: state}
+        self.tl_sync_counters = collections.Counter()
+
         if tls_manager == 'carla':
             self.sumo.switch_off_traffic_lights()
         elif tls_manager == 'sumo':
@@ -98,17 +172,49 @@ class SimulationSynchronization(object):
 
     def tick(self):
         """
-        Tick to simulation synchronization
-        """
-        # -----------------
-        # sumo-->carla sync
-        # -----------------
-        self.sumo.tick()
+        Tick to simulation synchronization.
 
+        In strict mode both simulations are stepped in series: sumo, sumo-->carla sync, carla and
+        carla-->sumo sync. In pipelined mode the sumo step k+1 runs on a worker thread while carla
+        runs the step k. This comes with a one-step lag: the carla-->sumo updates of the step k
+        are only seen by sumo in the step k+2. traci is never used by both threads at once, and the
+        worker has finished when this method returns.
+        """
+        if not self.pipelined:
+            self.sumo.tick()
+            self._sync_sumo_to_carla()
+            self.carla.tick()
+            self._sync_carla_to_sumo()
+            return
+
+        # The first step of sumo is run in series, the next ones are started on the previous tick.
+        if not self._sumo_stepped:
+            self.sumo.tick()
+
+        self._sync_sumo_to_carla()
+
+        sumo_worker = _SumoStepWorker(self.sumo)
+        sumo_worker.start()
+        try:
+            self.carla.tick()
+        finally:
+            sumo_worker.join()
+        self._sumo_stepped = True
+
+        self._sync_carla_to_sumo()
+
+    def _sync_sumo_to_carla(self):
+        """
+        Updates carla with the sumo state of the current step.
+        """
         # Spawning new sumo actors in carla (i.e, not controlled by carla).
         sumo_spawned_actors = self.sumo.spawned_actors - set(self.carla2sumo_ids.values())
         for sumo_actor_id in sumo_spawned_actors:
             self.sumo.subscribe(sumo_actor_id)
+            if self.area_of_interest is not None:
+                # Only tracked in sumo until it enters the area of interest.
+                continue
+
             sumo_actor = self.sumo.get_actor(sumo_actor_id)
 
             carla_blueprint = BridgeHelper.get_carla_blueprint(sumo_actor, self.sync_vehicle_color)
@@ -127,37 +233,88 @@ class SimulationSynchronization(object):
             if sumo_actor_id in self.sumo2carla_ids:
                 self.carla.destroy_actor(self.sumo2carla_ids.pop(sumo_actor_id))
 
-        # Updating sumo actors in carla.
+        # Updating sumo actors in carla, all of them in a single batch. The state of the sumo
+        # actors is retrieved and converted at once.
+        sumo_frame = self.sumo.get_actor_frame()
+        carla_locations, carla_rotations = BridgeHelper.get_carla_transforms(
+            sumo_frame.locations, sumo_frame.rotations, sumo_frame.extents)
+
+        if self.area_of_interest is not None:
+            self._update_area_of_interest(sumo_frame, carla_locations, carla_rotations)
+
+        carla_updates = []
         for sumo_actor_id in self.sumo2carla_ids:
             carla_actor_id = self.sumo2carla_ids[sumo_actor_id]
 
-            sumo_actor = self.sumo.get_actor(sumo_actor_id)
-            carla_actor = self.carla.get_actor(carla_actor_id)
+            sumo_index = sumo_frame.get_index(sumo_actor_id)
+            if sumo_index < 0:
+                continue
 
-            carla_transform = BridgeHelper.get_carla_transform(sumo_actor.transform,
-                                                               sumo_actor.extent)
+            carla_transform = _make_transform(carla_locations[sumo_index],
+                                              carla_rotations[sumo_index])
             if self.sync_vehicle_lights:
-                carla_lights = BridgeHelper.get_carla_lights_state(carla_actor.get_light_state(),
-                                                                   sumo_actor.signals)
+                carla_actor = self.carla.get_actor(carla_actor_id)
+                if carla_actor is None:
+                    continue
+                carla_lights = BridgeHelper.get_carla_lights_state(
+                    carla_actor.get_light_state(), int(sumo_frame.signals[sumo_index]))
             else:
                 carla_lights = None
 
-            self.carla.synchronize_vehicle(carla_actor_id, carla_transform, carla_lights)
+            carla_updates.append((carla_actor_id, carla_transform, carla_lights))
+
+        self.carla.synchronize_vehicles(carla_updates)
 
         # Updates traffic lights in carla based on sumo information.
         if self.tls_manager == 'sumo':
-            common_landmarks = self.sumo.traffic_light_ids & self.carla.traffic_light_ids
-            for landmark_id in common_landmarks:
-                sumo_tl_state = self.sumo.get_traffic_light_state(landmark_id)
-                carla_tl_state = BridgeHelper.get_carla_traffic_light_state(sumo_tl_state)
+            self._sync_traffic_lights(self.sumo, self.carla,
+                                      BridgeHelper.get_carla_traffic_light_state)
+
+    def _update_area_of_interest(self, sumo_frame, carla_locations, carla_rotations):
+        """
+        Spawns in carla the sumo actors entering the area of interest and destroys the ones
+        leaving it, each in a single batch.
+        """
+        center = self.area_of_interest.get_ego_location(self.carla, self.carla2sumo_ids)
+        if center is None:
+            return
+
+        carla_controlled = set(self.carla2sumo_ids.values())
+        sumo_actor_ids = [
+            sumo_actor_id for sumo_actor_id in sumo_frame.actor_ids
+            if sumo_actor_id not in carla_controlled
+        ]
+        sumo_indices = sumo_frame.get_indices(sumo_actor_ids)
+        entering, leaving = self.area_of_interest.update(sumo_actor_ids,
+                                                         carla_locations[sumo_indices], center,
+                                                         self.sumo2carla_ids)
+
+        self.carla.destroy_actors(
+            [self.sumo2carla_ids.pop(sumo_actor_id) for sumo_actor_id in leaving])
+
+        spawns = []
+        for sumo_actor_id in entering:
+            sumo_actor = sumo_frame.get_actor(sumo_actor_id)
 
-                self.carla.synchronize_traffic_light(landmark_id, carla_tl_state)
+            carla_blueprint = BridgeHelper.get_carla_blueprint(sumo_actor, self.sync_vehicle_color)
+            if carla_blueprint is not None:
+                sumo_index = sumo_frame.get_index(sumo_actor_id)
+                carla_transform = _make_transform(carla_locations[sumo_index],
+                                                  carla_rotations[sumo_index])
+                spawns.append((sumo_actor_id, carla_blueprint, carla_transform))
+            else:
+                self.sumo.unsubscribe(sumo_actor_id)
 
-        # -----------------
-        # carla-->sumo sync
-        # -----------------
-        self.carla.tick()
+        carla_actor_ids = self.carla.spawn_actors([(blueprint, transform)
+                                                   for _, blueprint, transform in spawns])
+        for (sumo_actor_id, _, _), carla_actor_id in zip(spawns, carla_actor_ids):
+            if carla_actor_id != INVALID_ACTOR_ID:
+                self.sumo2carla_ids[sumo_actor_id] = carla_actor_id
 
+    def _sync_carla_to_sumo(self):
+        """
+        Updates sumo with the carla state of the current step.
+        """
         # Spawning new carla actors (not controlled by sumo)
         carla_spawned_actors = self.carla.spawned_actors - set(self.sumo2carla_ids.values())
         for carla_actor_id in carla_spawned_actors:
@@ -176,20 +333,29 @@ class SimulationSynchronization(object):
             if carla_actor_id in self.carla2sumo_ids:
                 self.sumo.destroy_actor(self.carla2sumo_ids.pop(carla_actor_id))
 
-        # Updating carla actors in sumo.
-        for carla_actor_id in self.carla2sumo_ids:
-            sumo_actor_id = self.carla2sumo_ids[carla_actor_id]
+        # Updating carla actors in sumo. The sumo signals are only needed to sync the lights.
+        if self.sync_vehicle_lights:
+            sumo_frame = self.sumo.get_actor_frame()
 
-            carla_actor = self.carla.get_actor(carla_actor_id)
-            sumo_actor = self.sumo.get_actor(sumo_actor_id)
+        carla_actors = [(carla_actor_id, self.carla.get_actor(carla_actor_id))
+                        for carla_actor_id in self.carla2sumo_ids]
+        carla_transforms = np.array([
+            _get_transform_row(carla_actor.get_transform()) for _, carla_actor in carla_actors
+        ]).reshape(-1, 6)
+        sumo_locations, sumo_rotations = BridgeHelper.get_sumo_transforms(
+            carla_transforms[:, :3], carla_transforms[:, 3:],
+            [_get_extent_row(carla_actor) for _, carla_actor in carla_actors])
+
+        for i, (carla_actor_id, _) in enumerate(carla_actors):
+            sumo_actor_id = self.carla2sumo_ids[carla_actor_id]
 
-            sumo_transform = BridgeHelper.get_sumo_transform(carla_actor.get_transform(),
-                                                             carla_actor.bounding_box.extent)
+            sumo_transform = _make_transform(sumo_locations[i], sumo_rotations[i])
             if self.sync_vehicle_lights:
                 carla_lights = self.carla.get_actor_light_state(carla_actor_id)
-                if carla_lights is not None:
-                    sumo_lights = BridgeHelper.get_sumo_lights_state(sumo_actor.signals,
-                                                                     carla_lights)
+                sumo_index = sumo_frame.get_index(sumo_actor_id)
+                if carla_lights is not None and sumo_index >= 0:
+                    sumo_lights = BridgeHelper.get_sumo_lights_state(
+                        int(sumo_frame.signals[sumo_index]), carla_lights)
                 else:
                     sumo_lights = None
             else:
@@ -199,13 +365,35 @@ class SimulationSynchronization(object):
 
         # Updates traffic lights in sumo based on carla information.
         if self.tls_manager == 'carla':
-            common_landmarks = self.sumo.traffic_light_ids & self.carla.traffic_light_ids
-            for landmark_id in common_landmarks:
-                carla_tl_state = self.carla.get_traffic_light_state(landmark_id)
-                sumo_tl_state = BridgeHelper.get_sumo_traffic_light_state(carla_tl_state)
+            self._sync_traffic_lights(self.carla, self.sumo,
+                                      BridgeHelper.get_sumo_traffic_light_state)
 
-                # Updates all the sumo links related to this landmark.
-                self.sumo.synchronize_traffic_light(landmark_id, sumo_tl_state)
+    def _sync_traffic_lights(self, source, target, convert_state):
+        """
+        Pushes the traffic light transitions of the source simulation to the target simulation.
+
+        Only the landmarks whose state changed since they were last synced are pushed, all of them
+        at once. The lights of the target simulation are switched off (see __init__), so nothing
+        else changes them.
+
+            :param source: simulation managing the traffic lights.
+            :param target: simulation to be updated.
+            :param convert_state: BridgeHelper method converting the source states to the target.
+        """
+        transitions = {}
+        common_landmarks = source.traffic_light_ids & target.traffic_light_ids
+        for landmark_id in common_landmarks:
+            state = convert_state(source.get_traffic_light_state(landmark_id))
+            if self._synced_tl_states.get(landmark_id) != state:
+                transitions[landmark_id] = state
+
+        if transitions:
+            target.synchronize_traffic_lights(transitions)
+            self._synced_tl_states.update(transitions)
+
+        self.tl_sync_counters['steps'] += 1
+        self.tl_sync_counters['checked'] += len(common_landmarks)
+        self.tl_sync_counters['pushed'] += len(transitions)
 
     def close(self):
         """
@@ -237,8 +425,17 @@ def synchronization_loop(args):
                                      args.sumo_port, args.sumo_gui, args.client_order)
     carla_simulation = CarlaSimulation(args.carla_host, args.carla_port, args.step_length)
 
+    area_of_interest = None
+    if args.aoi_radius is not None:
+        area_of_interest = AreaOfInterest(args.aoi_radius, args.aoi_hysteresis,
+                                          args.aoi_max_actors, args.aoi_role_name)
+
     synchronization = SimulationSynchronization(sumo_simulation, carla_simulation, args.tls_manager,
-                                                args.sync_vehicle_color, args.sync_vehicle_lights)
+                                                args.sync_vehicle_color, args.sync_vehicle_lights,
+                                                args.pipelined, area_of_interest)
+
+    # Simulated time against the time spent ticking, without the sleeps to keep the real-time.
+    steps, tick_time = 0, 0.0
     try:
         while True:
             start = time.time()
@@ -247,6 +444,7 @@ def synchronization_loop(args):
 
             end = time.time()
             elapsed = end - start
+            steps, tick_time = steps + 1, tick_time + elapsed
             if elapsed < args.step_length:
                 time.sleep(args.step_length - elapsed)
 
@@ -254,6 +452,17 @@ def synchronization_loop(args):
         logging.info('Cancelled by user.')
 
     finally:
+        if tick_time > 0.0:
+            logging.info('Real-time factor (%s mode): %.2f, %d steps of %.3f s ticked in %.2f s',
+                         'pipelined' if args.pipelined else 'strict',
+                         steps * args.step_length / tick_time, steps, args.step_length, tick_time)
+
+        counters = synchronization.tl_sync_counters
+        if counters['steps'] > 0:
+            logging.info('Traffic lights: %d transitions pushed in %d steps (%.3f per step)',
+                         counters['pushed'], counters['steps'],
+                         counters['pushed'] / float(counters['steps']))
+
         logging.info('Cleaning synchronization')
 
         synchronization.close()
@@ -304,6 +513,32 @@ if __name__ == '__main__':
                            choices=['none', 'sumo', 'carla'],
                            help="select traffic light manager (default: none)",
                            default='none')
+    argparser.add_argument('--pipelined',
+                           action='store_true',
+                           help='step sumo while carla is stepping, the carla updates reach sumo '
+                           'one step later (default: False, strict serial stepping)')
+    argparser.add_argument('--aoi-radius',
+                           metavar='R',
+                           default=None,
+                           type=float,
+                           help='only mirror in carla the sumo vehicles closer than R meters to '
+                           'the ego vehicle (default: None, all the vehicles are mirrored)')
+    argparser.add_argument('--aoi-hysteresis',
+                           metavar='H',
+                           default=20.0,
+                           type=float,
+                           help='vehicles leave the area of interest farther than R + H meters '
+                           '(default: 20.0)')
+    argparser.add_argument('--aoi-max-actors',
+                           metavar='N',
+                           default=None,
+                           type=int,
+                           help='maximum number of sumo vehicles in the area of interest '
+                           '(default: None, no limit)')
+    argparser.add_argument('--aoi-role-name',
+                           metavar='NAME',
+                           default='hero',
+                           help='role name of the ego vehicle in carla (default: hero)')
     argparser.add_argument('--debug', action='store_true', help='enable debug messages')
     arguments = argparser.parse_args()
 
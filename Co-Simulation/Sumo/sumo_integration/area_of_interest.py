@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+""" This module selects the sumo actors mirrored in carla around the ego vehicle. """
+
+# ==================================================================================================
+# -- imports ---------------------------------------------------------------------------------------
+# ==================================================================================================
+
+import logging
+
+import numpy as np
+
+# ==================================================================================================
+# -- area of interest ------------------------------------------------------------------------------
+# ==================================================================================================
+
+
+class AreaOfInterest(object):
+    """
+    AreaOfInterest decides which sumo actors are mirrored in carla, based on their distance to the
+    ego vehicle (the carla vehicle with the given role name).
+
+    Actors enter the area when they are closer than the radius, and leave it when they are farther
+    than the radius plus the hysteresis, so that actors around the border are not spawned and
+    destroyed every step. The closest actors are taken first when the actor budget is reached.
+    """
+    def __init__(self, radius, hysteresis=20.0, max_actors=None, role_name='hero'):
+        self.radius = radius
+        self.hysteresis = hysteresis
+        self.max_actors = max_actors
+        self.role_name = role_name
+
+        self._ego_id = None
+        self._missing_ego_logged = False
+
+    def get_ego_location(self, carla_simulation, carla_actor_ids):
+        """
+        Returns the carla location of the ego vehicle, or None if it is not alive.
+
+            :param carla_simulation: carla simulation.
+            :param carla_actor_ids: ids of the candidate carla actors (i.e., controlled by carla).
+        """
+        if self._ego_id not in carla_actor_ids:
+            self._ego_id = None
+            for actor_id in carla_actor_ids:
+                actor = carla_simulation.get_actor(actor_id)
+                if actor is not None and actor.attributes.get('role_name') == self.role_name:
+                    self._ego_id = actor_id
+                    self._missing_ego_logged = False
+                    break
+
+        if self._ego_id is None:
+            if not self._missing_ego_logged:
+                logging.warning('No carla vehicle with role name %s, the area of interest is not '
+                                'updated', self.role_name)
+                self._missing_ego_logged = True
+            return None
+
+        return carla_simulation.get_actor(self._ego_id).get_location()
+
+    def update(self, actor_ids, locations, center, inside_ids):
+        """
+        Returns the actors entering and leaving the area of interest.
+
+            :param actor_ids: list of the candidate actor ids.
+            :param locations: (N, 3) array with the location of the candidate actors.
+            :param center: location of the ego vehicle.
+            :param inside_ids: set of the actor ids currently inside the area.
+            :return: tuple with the list of actor ids entering the area, closest first, and the list
+                of actor ids leaving it.
+        """
+        locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+        distances = np.hypot(locations[:, 0] - center.x, locations[:, 1] - center.y)
+        inside = np.array([actor_id in inside_ids for actor_id in actor_ids], dtype=bool)
+
+        leaving = inside & (distances > self.radius + self.hysteresis)
+        candidates = np.flatnonzero(~inside & (distances <= self.radius))
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+
+        if self.max_actors is not None:
+            budget = self.max_actors - (len(inside_ids) - np.count_nonzero(leaving))
+            candidates = candidates[:max(budget, 0)]
+
+        return ([actor_ids[i] for i in candidates], [actor_ids[i] for i in np.flatnonzero(leaving)])
@@ -17,6 +17,8 @@ import math
 import os
 import random
 
+import numpy as np
+
 import carla  # pylint: disable=import-error
 import traci  # pylint: disable=import-error
 
@@ -95,6 +97,62 @@ class BridgeHelper(object):
 
         return out_transform
 
+    @staticmethod
+    def get_carla_transforms(in_sumo_locations, in_sumo_rotations, extents):
+        """
+        Returns carla transforms based on sumo transforms, for several actors at once. Array
+        version of get_carla_transform.
+
+            :param in_sumo_locations: (N, 3) array with the sumo locations (x, y, z).
+            :param in_sumo_rotations: (N, 3) array with the sumo rotations (pitch, yaw, roll).
+            :param extents: (N, 3) array with the extents of the actors.
+            :return: tuple with the (N, 3) arrays of carla locations and rotations.
+        """
+        offset = BridgeHelper.offset
+        in_locations = np.asarray(in_sumo_locations, dtype=np.float64).reshape(-1, 3)
+        in_rotations = np.asarray(in_sumo_rotations, dtype=np.float64).reshape(-1, 3)
+        extent_x = np.asarray(extents, dtype=np.float64).reshape(-1, 3)[:, 0]
+
+        # From front-center-bumper to center (sumo reference system), applying the offset
+        # sumo-carla net and transforming to carla reference system (left-handed system).
+        yaw = np.radians(-1 * in_rotations[:, 1] + 90)
+        pitch = np.radians(in_rotations[:, 0])
+        out_locations = np.column_stack(
+            (in_locations[:, 0] - np.cos(yaw) * extent_x - offset[0],
+             -(in_locations[:, 1] - np.sin(yaw) * extent_x - offset[1]),
+             in_locations[:, 2] - np.sin(pitch) * extent_x))
+        out_rotations = in_rotations - (0, 90, 0)
+
+        return out_locations, out_rotations
+
+    @staticmethod
+    def get_sumo_transforms(in_carla_locations, in_carla_rotations, extents):
+        """
+        Returns sumo transforms based on carla transforms, for several actors at once. Array
+        version of get_sumo_transform.
+
+            :param in_carla_locations: (N, 3) array with the carla locations (x, y, z).
+            :param in_carla_rotations: (N, 3) array with the carla rotations (pitch, yaw, roll).
+            :param extents: (N, 3) array with the extents of the actors.
+            :return: tuple with the (N, 3) arrays of sumo locations and rotations.
+        """
+        offset = BridgeHelper.offset
+        in_locations = np.asarray(in_carla_locations, dtype=np.float64).reshape(-1, 3)
+        in_rotations = np.asarray(in_carla_rotations, dtype=np.float64).reshape(-1, 3)
+        extent_x = np.asarray(extents, dtype=np.float64).reshape(-1, 3)[:, 0]
+
+        # From center to front-center-bumper (carla reference system), applying the offset
+        # carla-sumo net and transforming to sumo reference system.
+        yaw = np.radians(-1 * in_rotations[:, 1])
+        pitch = np.radians(in_rotations[:, 0])
+        out_locations = np.column_stack(
+            (in_locations[:, 0] + np.cos(yaw) * extent_x + offset[0],
+             -(in_locations[:, 1] - np.sin(yaw) * extent_x - offset[1]),
+             in_locations[:, 2] - np.sin(pitch) * extent_x))
+        out_rotations = in_rotations + (0, 90, 0)
+
+        return out_locations, out_rotations
+
     @staticmethod
     def _get_recommended_carla_blueprint(sumo_actor):
         """
@@ -17,6 +17,50 @@ import carla  # pylint: disable=import-error
 
 from .constants import INVALID_ACTOR_ID, SPAWN_OFFSET_Z
 
+# ==================================================================================================
+# -- actor tracker ---------------------------------------------------------------------------------
+# ==================================================================================================
+
+
+class ActorTracker(object):
+    """
+    ActorTracker keeps the set of alive actors of a given type from the world snapshots. The world
+    is only queried for the actors that appear in a snapshot for the first time, all at once.
+    """
+    def __init__(self, world, type_prefix='vehicle.'):
+        self.world = world
+        self.type_prefix = type_prefix
+
+        self.actor_ids = set()  # Alive actors of the tracked type.
+        self._seen_ids = set()  # All the actors of the last snapshot, of any type.
+
+    def update(self, snapshot):
+        """
+        Updates the tracked actors with a world snapshot.
+
+            :param snapshot: carla.WorldSnapshot of the current frame.
+            :return: tuple with the sets of spawned and destroyed actor ids, and the list of the
+                spawned actors.
+        """
+        current_ids = set([actor_snapshot.id for actor_snapshot in snapshot])
+
+        new_actors = []
+        new_ids = current_ids.difference(self._seen_ids)
+        if new_ids:
+            new_actors = [
+                actor for actor in self.world.get_actors(list(new_ids))
+                if actor.type_id.startswith(self.type_prefix)
+            ]
+
+        spawned_ids = set([actor.id for actor in new_actors])
+        destroyed_ids = self.actor_ids.difference(current_ids)
+
+        self.actor_ids = self.actor_ids.difference(destroyed_ids).union(spawned_ids)
+        self._seen_ids = current_ids
+
+        return spawned_ids, destroyed_ids, new_actors
+
+
 # ==================================================================================================
 # -- carla simulation ------------------------------------------------------------------------------
 # ==================================================================================================
@@ -34,8 +78,11 @@ class CarlaSimulation(object):
         self.blueprint_library = self.world.get_blueprint_library()
         self.step_length = step_length
 
+        # Actor objects already retrieved from carla, to avoid querying the world every step.
+        self._actors = {}  # {actor_id: actor}
+
         # The following sets contain updated information for the current frame.
-        self._active_actors = set()
+        self._actor_tracker = ActorTracker(self.world, 'vehicle.')
         self.spawned_actors = set()
         self.destroyed_actors = set()
 
@@ -54,8 +101,15 @@ class CarlaSimulation(object):
     def get_actor(self, actor_id):
         """
         Accessor for carla actor.
+
+        The actors are only retrieved from the world the first time they are requested.
         """
-        return self.world.get_actor(actor_id)
+        actor = self._actors.get(actor_id)
+        if actor is None:
+            actor = self.world.get_actor(actor_id)
+            if actor is not None:
+                self._actors[actor_id] = actor
+        return actor
 
     # This is a workaround to fix synchronization issues when other carla clients remove an actor in
     # carla without waiting for tick (e.g., running sumo co-simulation and manual control at the
@@ -123,11 +177,46 @@ class CarlaSimulation(object):
         """
         Destroys the given actor.
         """
-        actor = self.world.get_actor(actor_id)
+        actor = self.get_actor(actor_id)
+        self._actors.pop(actor_id, None)
         if actor is not None:
             return actor.destroy()
         return False
 
+    def spawn_actors(self, spawns):
+        """
+        Spawns several actors at once, sending a single batch of commands.
+
+            :param spawns: list of (blueprint, transform) tuples.
+            :return: list with the actor id of each spawn, INVALID_ACTOR_ID for the failed ones.
+        """
+        batch = []
+        for blueprint, transform in spawns:
+            transform = carla.Transform(transform.location + carla.Location(0, 0, SPAWN_OFFSET_Z),
+                                        transform.rotation)
+            batch.append(
+                carla.command.SpawnActor(blueprint, transform).then(
+                    carla.command.SetSimulatePhysics(carla.command.FutureActor, False)))
+
+        actor_ids = []
+        for response in (self.client.apply_batch_sync(batch, False) if batch else []):
+            if response.error:
+                logging.error('Spawn carla actor failed. %s', response.error)
+                actor_ids.append(INVALID_ACTOR_ID)
+            else:
+                actor_ids.append(response.actor_id)
+        return actor_ids
+
+    def destroy_actors(self, actor_ids):
+        """
+        Destroys several actors at once, sending a single batch of commands.
+        """
+        for actor_id in actor_ids:
+            self._actors.pop(actor_id, None)
+        if actor_ids:
+            self.client.apply_batch(
+                [carla.command.DestroyActor(actor_id) for actor_id in actor_ids])
+
     def synchronize_vehicle(self, vehicle_id, transform, lights=None):
         """
         Updates vehicle state.
@@ -137,7 +226,7 @@ class CarlaSimulation(object):
             :param lights: new vehicle light state.
             :return: True if successfully updated. Otherwise, False.
         """
-        vehicle = self.world.get_actor(vehicle_id)
+        vehicle = self.get_actor(vehicle_id)
         if vehicle is None:
             return False
 
@@ -146,6 +235,25 @@ class CarlaSimulation(object):
             vehicle.set_light_state(carla.VehicleLightState(lights))
         return True
 
+    def synchronize_vehicles(self, updates):
+        """
+        Updates the state of several vehicles at once, sending a single batch of commands.
+
+            :param updates: list of (vehicle_id, transform, lights) tuples. The lights can be None
+                to leave the light state of the vehicle untouched.
+            :return: number of commands sent.
+        """
+        batch = []
+        for vehicle_id, transform, lights in updates:
+            batch.append(carla.command.ApplyTransform(vehicle_id, transform))
+            if lights is not None:
+                batch.append(
+                    carla.command.SetVehicleLightState(vehicle_id, carla.VehicleLightState(lights)))
+
+        if batch:
+            self.client.apply_batch(batch)
+        return len(batch)
+
     def synchronize_traffic_light(self, landmark_id, state):
         """
         Updates traffic light state.
@@ -162,18 +270,36 @@ class CarlaSimulation(object):
         traffic_light.set_state(state)
         return True
 
+    def synchronize_traffic_lights(self, states):
+        """
+        Updates the state of several traffic lights at once.
+
+        There is no batch command for the traffic lights, so each one is still a request to the
+        server. Unknown landmarks are skipped.
+
+            :param states: dict with the new traffic light state of each landmark id.
+            :return: number of traffic lights updated.
+        """
+        updated = 0
+        for landmark_id, state in states.items():
+            if self.synchronize_traffic_light(landmark_id, state):
+                updated += 1
+        return updated
+
     def tick(self):
         """
         Tick to carla simulation.
         """
         self.world.tick()
 
-        # Update data structures for the current frame.
-        current_actors = set(
-            [vehicle.id for vehicle in self.world.get_actors().filter('vehicle.*')])
-        self.spawned_actors = current_actors.difference(self._active_actors)
-        self.destroyed_actors = self._active_actors.difference(current_actors)
-        self._active_actors = current_actors
+        # Update data structures for the current frame, from the actors of the new snapshot.
+        self.spawned_actors, self.destroyed_actors, spawned = self._actor_tracker.update(
+            self.world.get_snapshot())
+
+        for actor in spawned:
+            self._actors[actor.id] = actor
+        for actor_id in self.destroyed_actors:
+            self._actors.pop(actor_id, None)
 
     def close(self):
         """
@@ -16,6 +16,8 @@ import enum
 import logging
 import os
 
+import numpy as np
+
 import carla  # pylint: disable=import-error
 import sumolib  # pylint: disable=import-error
 import traci  # pylint: disable=import-error
@@ -101,6 +103,80 @@ class SumoActorClass(enum.Enum):
 
 SumoActor = collections.namedtuple('SumoActor', 'type_id vclass transform signals extent color')
 
+
+class SumoActorFrame(object):
+    """
+    SumoActorFrame holds the state of all the subscribed sumo actors in a given step, one row per
+    actor:
+
+        * locations: (N, 3) array with the front-center-bumper position (x, y, z).
+        * rotations: (N, 3) array with the slope, angle and roll (always 0) of the actors.
+        * extents: (N, 3) array with the half length, width and height of the actors.
+        * signals: (N,) array with the signals bitmask.
+        * vclasses: (N,) array with the vehicle class names.
+    """
+    def __init__(self, results):
+        # Vehicles that are not in the network yet (e.g., just added) do not report all the
+        # variables and are left out of the frame.
+        results = [(actor_id, values) for actor_id, values in results.items()
+                   if traci.constants.VAR_POSITION3D in values]
+
+        self.actor_ids = [actor_id for actor_id, _ in results]
+        self._index = {actor_id: i for i, actor_id in enumerate(self.actor_ids)}
+
+        self.type_ids = [values[traci.constants.VAR_TYPE] for _, values in results]
+        self.colors = [values[traci.constants.VAR_COLOR] for _, values in results]
+        self.vclasses = np.array(
+            [values[traci.constants.VAR_VEHICLECLASS] for _, values in results], dtype=object)
+
+        self.locations = np.array([values[traci.constants.VAR_POSITION3D] for _, values in results],
+                                  dtype=np.float64).reshape(-1, 3)
+        self.rotations = np.zeros((len(results), 3))
+        self.rotations[:, 0] = [values[traci.constants.VAR_SLOPE] for _, values in results]
+        self.rotations[:, 1] = [values[traci.constants.VAR_ANGLE] for _, values in results]
+        self.extents = 0.5 * np.array([(values[traci.constants.VAR_LENGTH],
+                                        values[traci.constants.VAR_WIDTH],
+                                        values[traci.constants.VAR_HEIGHT])
+                                       for _, values in results], dtype=np.float64).reshape(-1, 3)
+        self.signals = np.array([values[traci.constants.VAR_SIGNALS] for _, values in results],
+                                dtype=np.int64)
+
+    def __len__(self):
+        return len(self.actor_ids)
+
+    def __contains__(self, actor_id):
+        return actor_id in self._index
+
+    def get_index(self, actor_id):
+        """
+        Returns the row of the given actor, or -1 if the actor is not in the frame.
+        """
+        return self._index.get(actor_id, -1)
+
+    def get_indices(self, actor_ids):
+        """
+        Returns an array with the rows of the given actors, -1 for the ones not in the frame.
+        """
+        return np.array([self._index.get(actor_id, -1) for actor_id in actor_ids], dtype=np.int64)
+
+    def get_actor(self, actor_id):
+        """
+        Returns the SumoActor of the given actor, or None if the actor is not in the frame.
+        """
+        i = self.get_index(actor_id)
+        if i < 0:
+            return None
+
+        location, rotation, extent = self.locations[i], self.rotations[i], self.extents[i]
+        transform = carla.Transform(
+            carla.Location(float(location[0]), float(location[1]), float(location[2])),
+            carla.Rotation(float(rotation[0]), float(rotation[1]), float(rotation[2])))
+
+        return SumoActor(self.type_ids[i], SumoActorClass(self.vclasses[i]), transform,
+                         int(self.signals[i]),
+                         carla.Vector3D(float(extent[0]), float(extent[1]), float(extent[2])),
+                         self.colors[i])
+
 # ==================================================================================================
 # -- sumo traffic lights ---------------------------------------------------------------------------
 # ==================================================================================================
@@ -257,6 +333,25 @@ class SumoTLManager(object):
             traci.trafficlight.setLinkState(tlid, link_index, state)
         return True
 
+    def set_states(self, landmark_states):
+        """
+        Updates the state of the signals associated with several landmarks. The signals of each
+        traffic light are updated with a single request, instead of one per link.
+
+            :param landmark_states: dict with the new state of each landmark id.
+        """
+        link_states = {}  # {tlid: {link_index: state}}
+        for landmark_id, state in landmark_states.items():
+            for tlid, link_index in self.get_all_associated_signals(landmark_id):
+                link_states.setdefault(tlid, {})[link_index] = state
+
+        for tlid, states in link_states.items():
+            full_state = list(traci.trafficlight.getRedYellowGreenState(tlid))
+            for link_index, state in states.items():
+                full_state[link_index] = state
+            traci.trafficlight.setRedYellowGreenState(tlid, ''.join(full_state))
+        return True
+
     def switch_off(self):
         """
         Switch off all traffic lights.
@@ -414,6 +509,13 @@ class SumoSimulation(object):
 
         return SumoActor(type_id, vclass, transform, signals, extent, color)
 
+    @staticmethod
+    def get_actor_frame():
+        """
+        Returns a SumoActorFrame with all the subscribed actors, retrieved in a single request.
+        """
+        return SumoActorFrame(traci.vehicle.getAllSubscriptionResults())
+
     def spawn_actor(self, type_id, color=None):
         """
         Spawns a new actor.
@@ -498,6 +600,14 @@ class SumoSimulation(object):
         """
         self.traffic_light_manager.set_state(landmark_id, state)
 
+    def synchronize_traffic_lights(self, states):
+        """
+        Updates the state of several traffic lights at once.
+
+            :param states: dict with the new traffic light state of each landmark id.
+        """
+        self.traffic_light_manager.set_states(states)
+
     def tick(self):
         """
         Tick to sumo simulation.
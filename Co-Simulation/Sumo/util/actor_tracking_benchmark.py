@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2020 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+Script to benchmark how the carla side of the co-simulation finds the spawned and destroyed
+vehicles every step. The full actor list transfer done before is compared against the tracking of
+the world snapshots, on a stub world where vehicles keep spawning and being destroyed. No carla
+server is needed. Besides the time, the number of actors transferred by the world per step is
+reported, as that is what the server round-trips depend on.
+"""
+
+# ==================================================================================================
+# -- imports ---------------------------------------------------------------------------------------
+# ==================================================================================================
+
+import argparse
+import fnmatch
+import random
+import time
+
+# ==================================================================================================
+# -- find carla module -----------------------------------------------------------------------------
+# ==================================================================================================
+
+import glob
+import os
+import sys
+
+try:
+    sys.path.append(
+        glob.glob('../../../PythonAPI/carla/dist/carla-*%d.%d-%s.egg' %
+                  (sys.version_info.major, sys.version_info.minor,
+                   'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from sumo_integration.carla_simulation import ActorTracker  # pylint: disable=wrong-import-position
+
+# ==================================================================================================
+# -- stub world ------------------------------------------------------------------------------------
+# ==================================================================================================
+
+
+class StubActor(object):
+    def __init__(self, actor_id, type_id):
+        self.id = actor_id
+        self.type_id = type_id
+
+
+class StubActorList(list):
+    def filter(self, wildcard_pattern):
+        return StubActorList([a for a in self if fnmatch.fnmatch(a.type_id, wildcard_pattern)])
+
+
+class StubActorSnapshot(object):
+    def __init__(self, actor_id):
+        self.id = actor_id
+
+
+class StubWorld(object):
+    """
+    World with a fixed number of actors, a part of them vehicles. Every tick some vehicles are
+    destroyed and the same number are spawned. The actors sent by get_actors are counted.
+    """
+    def __init__(self, num_actors, vehicle_ratio, churn, seed=0):
+        self._random = random.Random(seed)
+        self._next_id = 1
+        self.churn = churn
+        self.transferred = 0
+        self.actors = {}
+
+        for _ in range(num_actors):
+            self._spawn('vehicle.tesla.model3' if self._random.random() < vehicle_ratio else
+                        'traffic.traffic_light')
+
+    def _spawn(self, type_id):
+        self.actors[self._next_id] = StubActor(self._next_id, type_id)
+        self._next_id += 1
+
+    def tick(self):
+        vehicle_ids = [a.id for a in self.actors.values() if a.type_id.startswith('vehicle.')]
+        for actor_id in self._random.sample(vehicle_ids, min(self.churn, len(vehicle_ids))):
+            del self.actors[actor_id]
+        for _ in range(self.churn):
+            self._spawn('vehicle.tesla.model3')
+
+    def get_snapshot(self):
+        return [StubActorSnapshot(actor_id) for actor_id in self.actors]
+
+    def get_actors(self, actor_ids=None):
+        if actor_ids is None:
+            actors = list(self.actors.values())
+        else:
+            actors = [self.actors[actor_id] for actor_id in actor_ids if actor_id in self.actors]
+        self.transferred += len(actors)
+        return StubActorList(actors)
+
+
+# ==================================================================================================
+# -- benchmark -------------------------------------------------------------------------------------
+# ==================================================================================================
+
+
+def benchmark(args):
+    """
+    Runs both trackings on the same stub world and checks that they agree.
+    """
+    world = StubWorld(args.actors, args.vehicle_ratio, args.churn)
+    tracker = ActorTracker(world, 'vehicle.')
+    active_actors = set()
+
+    actor_list_time, snapshot_time = 0.0, 0.0
+    actor_list_transferred, snapshot_transferred = 0, 0
+    for _ in range(args.steps):
+        world.tick()
+
+        # Full actor list, as done before.
+        world.transferred = 0
+        start = time.time()
+        current_actors = set([vehicle.id for vehicle in world.get_actors().filter('vehicle.*')])
+        spawned_actors = current_actors.difference(active_actors)
+        destroyed_actors = active_actors.difference(current_actors)
+        active_actors = current_actors
+        actor_list_time += time.time() - start
+        actor_list_transferred += world.transferred
+
+        # Snapshot tracking.
+        world.transferred = 0
+        start = time.time()
+        spawned_ids, destroyed_ids, _ = tracker.update(world.get_snapshot())
+        snapshot_time += time.time() - start
+        snapshot_transferred += world.transferred
+
+        assert spawned_ids == spawned_actors and destroyed_ids == destroyed_actors
+
+    steps = float(args.steps)
+    print('{} actors, {} vehicles spawned and destroyed per step'.format(args.actors, args.churn))
+    print('  actor list:        {:7.3f} ms/step  {:8.1f} actors transferred/step'.format(
+        1000.0 * actor_list_time / steps, actor_list_transferred / steps))
+    print('  snapshot tracking: {:7.3f} ms/step  {:8.1f} actors transferred/step'.format(
+        1000.0 * snapshot_time / steps, snapshot_transferred / steps))
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--actors',
+                           default=2000,
+                           type=int,
+                           help='number of actors of the world (default: 2000)')
+    argparser.add_argument('--vehicle-ratio',
+                           default=0.8,
+                           type=float,
+                           help='ratio of the actors that are vehicles (default: 0.8)')
+    argparser.add_argument('--churn',
+                           default=5,
+                           type=int,
+                           help='vehicles spawned and destroyed per step (default: 5)')
+    argparser.add_argument('--steps',
+                           default=200,
+                           type=int,
+                           help='number of steps (default: 200)')
+    arguments = argparser.parse_args()
+
+    benchmark(arguments)
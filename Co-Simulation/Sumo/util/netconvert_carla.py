@@ -17,7 +17,10 @@ the net and inserts, manually, the traffic light landmarks retrieved from the op
 import argparse
 import bisect
 import collections
+import hashlib
 import logging
+import pickle
+import re
 import shutil
 import subprocess
 import tempfile
@@ -161,7 +164,27 @@ class SumoTopology(object):
 def build_topology(sumo_net):
     """
     Builds sumo topology.
+
+    The connections are visited once, from the outgoing connections of each edge. The lane keys
+    (edge id, lane index) and the parsed opendrive ids are interned, so that each one is only built
+    once and shared by all the structures.
     """
+    lane_keys = {}  # {sumo_lane: (sumo_edge_id, sumo_lane_index)}
+    odr_keys = {}  # {odr_id: (odr_road_id, odr_lane_id)}
+
+    def get_lane_key(lane):
+        key = lane_keys.get(lane)
+        if key is None:
+            key = lane_keys[lane] = (lane.getEdge().getID(), lane.getIndex())
+        return key
+
+    def get_odr_key(odr_id):
+        key = odr_keys.get(odr_id)
+        if key is None:
+            odr_road_id, odr_lane_id = odr_id.split('_')
+            key = odr_keys[odr_id] = (odr_road_id, int(odr_lane_id))
+        return key
+
     # --------------------------
     # OpenDrive->Sumo mapped ids
     # --------------------------
@@ -180,10 +203,7 @@ def build_topology(sumo_net):
                 logging.warning('[Building topology] Sumo net contains joined opendrive roads.')
 
             for odr_id in lane.getParam('origId').split():
-                odr_road_id, odr_lane_id = odr_id.split('_')
-                if (odr_road_id, int(odr_lane_id)) not in odr2sumo_ids:
-                    odr2sumo_ids[(odr_road_id, int(odr_lane_id))] = set()
-                odr2sumo_ids[(odr_road_id, int(odr_lane_id))].add((edge.getID(), lane.getIndex()))
+                odr2sumo_ids.setdefault(get_odr_key(odr_id), set()).add(get_lane_key(lane))
 
     # -----------
     # Connections
@@ -197,18 +217,12 @@ def build_topology(sumo_net):
     paths = {}
 
     for from_edge in sumo_net.getEdges():
-        for to_edge in sumo_net.getEdges():
-            connections = from_edge.getConnections(to_edge)
+        for connections in from_edge.getOutgoing().values():
             for connection in connections:
-                from_ = connection.getFromLane()
-                to_ = connection.getToLane()
-                from_edge_id, from_lane_index = from_.getEdge().getID(), from_.getIndex()
-                to_edge_id, to_lane_index = to_.getEdge().getID(), to_.getIndex()
-
-                if (from_edge_id, from_lane_index) not in topology:
-                    topology[(from_edge_id, from_lane_index)] = set()
+                from_key = get_lane_key(connection.getFromLane())
+                to_key = get_lane_key(connection.getToLane())
 
-                topology[(from_edge_id, from_lane_index)].add((to_edge_id, to_lane_index))
+                topology.setdefault(from_key, set()).add(to_key)
 
                 # Checking if the connection is an opendrive path.
                 conn_odr_ids = connection.getParam('origId')
@@ -218,15 +232,52 @@ def build_topology(sumo_net):
                             '[Building topology] Sumo net contains joined opendrive paths.')
 
                     for odr_id in conn_odr_ids.split():
+                        paths.setdefault(get_odr_key(odr_id), set()).add((from_key, to_key))
 
-                        odr_road_id, odr_lane_id = odr_id.split('_')
-                        if (odr_road_id, int(odr_lane_id)) not in paths:
-                            paths[(odr_road_id, int(odr_lane_id))] = set()
+    return SumoTopology(topology, paths, odr2sumo_ids)
 
-                        paths[(odr_road_id, int(odr_lane_id))].add(
-                            ((from_edge_id, from_lane_index), (to_edge_id, to_lane_index)))
 
-    return SumoTopology(topology, paths, odr2sumo_ids)
+# Version of the topology cache files. To be increased when SumoTopology changes.
+TOPOLOGY_CACHE_VERSION = 1
+
+
+def _get_net_hash(net_file):
+    """
+    Returns the hash of a sumo net file. The xml comments are left out, as netconvert writes there
+    the date and the input files.
+    """
+    with open(net_file, 'rb') as f:
+        content = f.read()
+    return hashlib.sha1(re.sub(br'<!--.*?-->', b'', content, flags=re.DOTALL)).hexdigest()
+
+
+def load_topology(net_file, cache_dir=None):
+    """
+    Returns the sumo topology of the given sumo net.
+
+        :param net_file: sumo net file (*.net.xml)
+        :param cache_dir: directory to cache the topology, keyed by the hash of the net file. If
+            None, the topology is always built.
+        :returns: SumoTopology.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, '{}.v{}.topology.pkl'.format(
+            _get_net_hash(net_file), TOPOLOGY_CACHE_VERSION))
+        if os.path.exists(cache_file):
+            logging.debug('Loading sumo topology from cache: %s', cache_file)
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+
+    sumo_topology = build_topology(sumolib.net.readNet(net_file))
+
+    if cache_file is not None:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_file, 'wb') as f:
+            pickle.dump(sumo_topology, f, pickle.HIGHEST_PROTOCOL)
+
+    return sumo_topology
 
 
 # ==================================================================================================
@@ -362,7 +413,7 @@ class SumoTrafficLight(object):
 # ==================================================================================================
 
 
-def _netconvert_carla_impl(xodr_file, output, tmpdir, guess_tls=False):
+def _netconvert_carla_impl(xodr_file, output, tmpdir, guess_tls=False, topology_cache=None):
     """
     Implements netconvert carla.
     """
@@ -396,8 +447,7 @@ def _netconvert_carla_impl(xodr_file, output, tmpdir, guess_tls=False):
     # --------
     # Sumo net
     # --------
-    sumo_net = sumolib.net.readNet(tmp_sumo_net)
-    sumo_topology = build_topology(sumo_net)
+    sumo_topology = load_topology(tmp_sumo_net, topology_cache)
 
     # ---------
     # Carla map
@@ -507,18 +557,19 @@ def _netconvert_carla_impl(xodr_file, output, tmpdir, guess_tls=False):
     tree.write(output, pretty_print=True, encoding='UTF-8', xml_declaration=True)
 
 
-def netconvert_carla(xodr_file, output, guess_tls=False):
+def netconvert_carla(xodr_file, output, guess_tls=False, topology_cache=None):
     """
     Generates sumo net.
 
         :param xodr_file: opendrive file (*.xodr)
         :param output: output file (*.net.xml)
         :param guess_tls: guess traffic lights at intersections.
+        :param topology_cache: directory to cache the topology of the sumo nets (optional).
         :returns: path to the generated sumo net.
     """
     try:
         tmpdir = tempfile.mkdtemp()
-        _netconvert_carla_impl(xodr_file, output, tmpdir, guess_tls)
+        _netconvert_carla_impl(xodr_file, output, tmpdir, guess_tls, topology_cache)
 
     finally:
         if os.path.exists(tmpdir):
@@ -536,6 +587,11 @@ if __name__ == '__main__':
     argparser.add_argument('--guess-tls',
                            action='store_true',
                            help='guess traffic lights at intersections (default: False)')
+    argparser.add_argument('--topology-cache',
+                           metavar='DIR',
+                           default=None,
+                           type=str,
+                           help='directory to cache the topology of the sumo nets (default: None)')
     args = argparser.parse_args()
 
-    netconvert_carla(args.xodr_file, args.output, args.guess_tls)
+    netconvert_carla(args.xodr_file, args.output, args.guess_tls, args.topology_cache)
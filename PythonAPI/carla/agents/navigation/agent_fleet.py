@@ -0,0 +1,115 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module steps many agents at once against a shared world perception and
+sends all their controls to the server in a single batch.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import carla
+
+from agents.navigation.lane_change_index import LaneChangeIndex
+from agents.navigation.traffic_light_index import TrafficLightIndex
+from agents.navigation.world_perception import WorldPerception
+
+
+class AgentFleet(object):
+    """
+    AgentFleet runs the run_step() of a group of BasicAgent (or subclasses) every tick.
+    The world is read once into a WorldPerception shared by all the agents, which also share one
+    TrafficLightIndex and one LaneChangeIndex of the map. The resulting controls are applied with one client.apply_batch
+    call instead of one apply_control per vehicle.
+    """
+
+    def __init__(self, client, agents=None, map_inst=None, num_workers=0):
+        """
+            :param client: carla.Client used to send the batch of controls
+            :param agents: list of agents to step, more can be added with add_agent
+            :param map_inst: carla.Map instance to avoid the expensive call of getting it.
+            :param num_workers: if greater than 0, the agents are stepped by a pool of this many threads
+        """
+        self._client = client
+        self._world = client.get_world()
+        self._map = map_inst if map_inst else self._world.get_map()
+        self._perception = WorldPerception(self._world, self._map)
+        self._traffic_light_index = TrafficLightIndex(self._world, self._map)
+        self._lane_change_index = LaneChangeIndex(self._map)
+        self._agents = []
+        self._executor = ThreadPoolExecutor(max_workers=num_workers) if num_workers > 0 else None
+        self.last_step_time = 0.0
+
+        for agent in agents or []:
+            self.add_agent(agent)
+
+    def __len__(self):
+        return len(self._agents)
+
+    def add_agent(self, agent):
+        """
+        Adds an agent to the fleet and makes it read the shared perception and map indices
+
+            :param agent: BasicAgent or subclass
+        """
+        agent.set_perception(self._perception)
+        agent.set_traffic_light_index(self._traffic_light_index)
+        agent.set_lane_change_index(self._lane_change_index)
+        self._agents.append(agent)
+
+    def remove_agent(self, agent):
+        """
+        Removes an agent from the fleet, which goes back to querying the actors itself
+
+            :param agent: BasicAgent or subclass
+        """
+        self._agents.remove(agent)
+        agent.set_perception(None)
+        agent.set_traffic_light_index(None)
+        agent.set_lane_change_index(None)
+
+    def get_agents(self):
+        """Returns the list of agents of the fleet"""
+        return list(self._agents)
+
+    def get_perception(self):
+        """Returns the WorldPerception shared by the agents"""
+        return self._perception
+
+    def run_step(self, snapshot=None, apply=True):
+        """
+        Executes one step of navigation of every agent.
+
+            :param snapshot: carla.WorldSnapshot of the current tick, the latest one of the world if not given
+            :param apply: if True, the controls are sent to the server in a single batch
+            :return: list of carla.VehicleControl, in the order of the agents
+        """
+        start = time.time()
+        self._perception.update(snapshot)
+
+        if self._executor is not None and len(self._agents) > 1:
+            controls = list(self._executor.map(lambda agent: agent.run_step(), self._agents))
+        else:
+            controls = [agent.run_step() for agent in self._agents]
+
+        if apply and controls:
+            # pylint: disable=protected-access
+            self._client.apply_batch([
+                carla.command.ApplyVehicleControl(agent._vehicle.id, control)
+                for agent, control in zip(self._agents, controls)])
+
+        self.last_step_time = time.time() - start
+        return controls
+
+    def done(self):
+        """Returns the agents that have reached their destination"""
+        return [agent for agent in self._agents if agent.done()]
+
+    def close(self):
+        """Stops the worker threads, if any"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -9,14 +9,18 @@ waypoints and avoiding other vehicles. The agent also responds to traffic lights
 It can also make use of the global route planner to follow a specifed route
 """
 
+import numpy as np
+
 import carla
-from shapely.geometry import Polygon
 
 from agents.navigation.local_planner import LocalPlanner, RoadOption
 from agents.navigation.global_route_planner import GlobalRoutePlanner
 from agents.tools.misc import (get_speed, is_within_distance,
                                get_trafficlight_trigger_location,
-                               compute_distance)
+                               compute_distance, compute_obb_vertices,
+                               polygons_intersect, compute_distances,
+                               compute_forward_vectors, is_within_distances,
+                               get_snapshot_arrays)
 
 
 class BasicAgent(object):
@@ -50,6 +54,11 @@ class BasicAgent(object):
         else:
             self._map = self._world.get_map()
         self._last_traffic_light = None
+        self._perception = None
+        self._traffic_light_index = None
+        self._lane_change_index = None
+        self._waypoint_cache = {}  # Waypoints of the actors during the current frame, when there is no perception
+        self._waypoint_cache_frame = None
 
         # Base parameters
         self._ignore_traffic_lights = False
@@ -63,6 +72,7 @@ class BasicAgent(object):
         self._speed_ratio = 1
         self._max_brake = 0.5
         self._offset = 0
+        self._route_cache_dir = None
 
         # Change parameters according to the dictionary
         opt_dict['target_speed'] = target_speed
@@ -86,6 +96,8 @@ class BasicAgent(object):
             self._max_brake = opt_dict['max_brake']
         if 'offset' in opt_dict:
             self._offset = opt_dict['offset']
+        if 'route_cache_dir' in opt_dict:
+            self._route_cache_dir = opt_dict['route_cache_dir']
 
         # Initialize the planners
         self._local_planner = LocalPlanner(self._vehicle, opt_dict=opt_dict, map_inst=self._map)
@@ -94,9 +106,11 @@ class BasicAgent(object):
                 self._global_planner = grp_inst
             else:
                 print("Warning: Ignoring the given map as it is not a 'carla.Map'")
-                self._global_planner = GlobalRoutePlanner(self._map, self._sampling_resolution)
+                self._global_planner = GlobalRoutePlanner(
+                    self._map, self._sampling_resolution, cache_dir=self._route_cache_dir)
         else:
-            self._global_planner = GlobalRoutePlanner(self._map, self._sampling_resolution)
+            self._global_planner = GlobalRoutePlanner(
+                self._map, self._sampling_resolution, cache_dir=self._route_cache_dir)
 
         # Get the static elements of the scene
         self._lights_list = self._world.get_actors().filter("*traffic_light*")
@@ -130,6 +144,84 @@ class BasicAgent(object):
         """
         self._local_planner.follow_speed_limits(value)
 
+    def set_perception(self, perception):
+        """
+        Makes the agent read the state of the actors from a WorldPerception shared by several
+        agents, instead of querying every actor. The perception has to be updated every tick.
+
+            :param perception (WorldPerception): snapshot of the world, None to query the actors again
+        """
+        self._perception = perception
+        self._local_planner.set_perception(perception)
+
+    def set_traffic_light_index(self, traffic_light_index):
+        """
+        Makes the agent check the traffic lights through a TrafficLightIndex shared by several
+        agents, so that only the lights on the road of the vehicle are considered.
+
+            :param traffic_light_index (TrafficLightIndex): index of the map, None to check all the lights
+        """
+        self._traffic_light_index = traffic_light_index
+
+    def set_lane_change_index(self, lane_change_index):
+        """
+        Makes the agent generate its lane changes from a LaneChangeIndex shared by several agents,
+        instead of walking the map waypoint by waypoint every time a maneuver is considered.
+
+            :param lane_change_index (LaneChangeIndex): index of the map, None to walk the map again
+        """
+        self._lane_change_index = lane_change_index
+
+    def _get_transform(self, actor):
+        """Returns the transform of an actor, from the perception if there is one"""
+        if self._perception is not None and actor in self._perception:
+            return self._perception.get_transform(actor)
+        return actor.get_transform()
+
+    def _get_location(self, actor):
+        """Returns the location of an actor, from the perception if there is one"""
+        if self._perception is not None and actor in self._perception:
+            return self._perception.get_location(actor)
+        return actor.get_location()
+
+    def _get_actor_arrays(self, actors):
+        """
+        Returns the (N, 3) locations and (N, 3) rotations (pitch, yaw, roll) of a list of actors,
+        from the perception if there is one, or read at once from the world snapshot otherwise
+        """
+        if self._perception is not None and all(actor in self._perception for actor in actors):
+            rows = self._perception.get_rows(actors)
+            return self._perception.locations[rows], self._perception.rotations[rows]
+        _, locations, rotations, _ = get_snapshot_arrays(
+            self._world.get_snapshot(), [actor.id for actor in actors])
+        return locations, rotations
+
+    def _get_speed(self, actor):
+        """Returns the speed of an actor in Km/h, from the perception if there is one"""
+        if self._perception is not None and actor in self._perception:
+            return self._perception.get_speed(actor)
+        return get_speed(actor)
+
+    def _get_waypoint(self, actor, lane_type=carla.LaneType.Driving):
+        """Returns the waypoint of an actor, shared through the perception or cached for the current frame"""
+        if self._perception is not None and actor in self._perception:
+            return self._perception.get_waypoint(actor, lane_type)
+        # Keyed by the world frame, so that every entry point sees the waypoints of the current one
+        frame = self._world.get_snapshot().frame
+        if frame != self._waypoint_cache_frame:
+            self._waypoint_cache = {}
+            self._waypoint_cache_frame = frame
+        key = (actor.id, lane_type)
+        if key not in self._waypoint_cache:
+            self._waypoint_cache[key] = self._map.get_waypoint(actor.get_location(), lane_type=lane_type)
+        return self._waypoint_cache[key]
+
+    def _get_light_state(self, traffic_light):
+        """Returns the state of a traffic light, from the perception if there is one"""
+        if self._perception is not None:
+            return self._perception.get_traffic_light_state(traffic_light)
+        return traffic_light.state
+
     def get_local_planner(self):
         """Get method for protected member local planner"""
         return self._local_planner
@@ -190,20 +282,25 @@ class BasicAgent(object):
         """Execute one step of navigation."""
         hazard_detected = False
 
-        # Retrieve all relevant actors
-        vehicle_list = self._world.get_actors().filter("*vehicle*")
+        vehicle_speed = self._get_speed(self._vehicle) / 3.6
+        max_vehicle_distance = self._base_vehicle_threshold + self._speed_ratio * vehicle_speed
 
-        vehicle_speed = get_speed(self._vehicle) / 3.6
+        # Retrieve all relevant actors
+        if self._perception is not None:
+            vehicle_list = self._perception.vehicles_near(
+                self._get_location(self._vehicle), max_vehicle_distance, exclude=self._vehicle)
+        else:
+            vehicle_list = self._world.get_actors().filter("*vehicle*")
 
         # Check for possible vehicle obstacles
-        max_vehicle_distance = self._base_vehicle_threshold + self._speed_ratio * vehicle_speed
         affected_by_vehicle, _, _ = self._vehicle_obstacle_detected(vehicle_list, max_vehicle_distance)
         if affected_by_vehicle:
             hazard_detected = True
 
         # Check if the vehicle is affected by a red traffic light
         max_tlight_distance = self._base_tlight_threshold + self._speed_ratio * vehicle_speed
-        affected_by_tlight, _ = self._affected_by_traffic_light(self._lights_list, max_tlight_distance)
+        lights_list = None if self._traffic_light_index is not None else self._lights_list
+        affected_by_tlight, _ = self._affected_by_traffic_light(lights_list, max_tlight_distance)
         if affected_by_tlight:
             hazard_detected = True
 
@@ -256,35 +353,47 @@ class BasicAgent(object):
         Method to check if there is a red light affecting the vehicle.
 
             :param lights_list (list of carla.TrafficLight): list containing TrafficLight objects.
-                If None, all traffic lights in the scene are used
+                If None, the lights of the traffic light index are used, or all the traffic lights
+                in the scene if the agent has no index
             :param max_distance (float): max distance for traffic lights to be considered relevant.
                 If None, the base threshold value is used
         """
         if self._ignore_traffic_lights:
             return (False, None)
 
-        if not lights_list:
-            lights_list = self._world.get_actors().filter("*traffic_light*")
+        if not lights_list and self._traffic_light_index is None:
+            if self._perception is not None:
+                lights_list = self._perception.get_traffic_lights()
+            else:
+                lights_list = self._world.get_actors().filter("*traffic_light*")
 
         if not max_distance:
             max_distance = self._base_tlight_threshold
 
         if self._last_traffic_light:
-            if self._last_traffic_light.state != carla.TrafficLightState.Red:
+            if self._get_light_state(self._last_traffic_light) != carla.TrafficLightState.Red:
                 self._last_traffic_light = None
             else:
                 return (True, self._last_traffic_light)
 
-        ego_vehicle_location = self._vehicle.get_location()
-        ego_vehicle_waypoint = self._map.get_waypoint(ego_vehicle_location)
+        ego_vehicle_location = self._get_location(self._vehicle)
+        ego_vehicle_waypoint = self._get_waypoint(self._vehicle)
 
-        for traffic_light in lights_list:
-            if traffic_light.id in self._lights_map:
-                trigger_wp = self._lights_map[traffic_light.id]
-            else:
-                trigger_location = get_trafficlight_trigger_location(traffic_light)
-                trigger_wp = self._map.get_waypoint(trigger_location)
-                self._lights_map[traffic_light.id] = trigger_wp
+        if not lights_list:
+            # The index already filters the lights by road, distance and direction
+            candidates = self._traffic_light_index.candidates(ego_vehicle_waypoint, ego_vehicle_location, max_distance)
+        else:
+            candidates = []
+            for traffic_light in lights_list:
+                if traffic_light.id in self._lights_map:
+                    trigger_wp = self._lights_map[traffic_light.id]
+                else:
+                    trigger_location = get_trafficlight_trigger_location(traffic_light)
+                    trigger_wp = self._map.get_waypoint(trigger_location)
+                    self._lights_map[traffic_light.id] = trigger_wp
+                candidates.append((traffic_light, trigger_wp))
+
+        for traffic_light, trigger_wp in candidates:
 
             if trigger_wp.transform.location.distance(ego_vehicle_location) > max_distance:
                 continue
@@ -299,10 +408,10 @@ class BasicAgent(object):
             if dot_ve_wp < 0:
                 continue
 
-            if traffic_light.state != carla.TrafficLightState.Red:
+            if self._get_light_state(traffic_light) != carla.TrafficLightState.Red:
                 continue
 
-            if is_within_distance(trigger_wp.transform, self._vehicle.get_transform(), max_distance, [0, 90]):
+            if is_within_distance(trigger_wp.transform, self._get_transform(self._vehicle), max_distance, [0, 90]):
                 self._last_traffic_light = traffic_light
                 return (True, traffic_light)
 
@@ -317,43 +426,44 @@ class BasicAgent(object):
             :param max_distance: max freespace to check for obstacles.
                 If None, the base threshold value is used
         """
-        def get_route_polygon():
-            route_bb = []
+        def get_route_quads():
             extent_y = self._vehicle.bounding_box.extent.y
             r_ext = extent_y + self._offset
             l_ext = -extent_y + self._offset
-            r_vec = ego_transform.get_right_vector()
-            p1 = ego_location + carla.Location(r_ext * r_vec.x, r_ext * r_vec.y)
-            p2 = ego_location + carla.Location(l_ext * r_vec.x, l_ext * r_vec.y)
-            route_bb.extend([[p1.x, p1.y, p1.z], [p2.x, p2.y, p2.z]])
-
-            for wp, _ in self._local_planner.get_plan():
-                if ego_location.distance(wp.transform.location) > max_distance:
-                    break
 
-                r_vec = wp.transform.get_right_vector()
-                p1 = wp.transform.location + carla.Location(r_ext * r_vec.x, r_ext * r_vec.y)
-                p2 = wp.transform.location + carla.Location(l_ext * r_vec.x, l_ext * r_vec.y)
-                route_bb.extend([[p1.x, p1.y, p1.z], [p2.x, p2.y, p2.z]])
+            # Ego location followed by the plan waypoints up to the max distance
+            plan = self._local_planner.get_plan()
+            count = plan.count_within(ego_location, max_distance)
+            r_vec = ego_transform.get_right_vector()
+            locations = np.vstack([[ego_location.x, ego_location.y], plan.locations()[:count, 0:2]])
+            right_vectors = np.vstack([[r_vec.x, r_vec.y], plan.right_vectors()[:count]])
 
             # Two points don't create a polygon, nothing to check
-            if len(route_bb) < 3:
+            if len(locations) < 2:
                 return None
 
-            return Polygon(route_bb)
+            # One quad per plan step: right and left points of a step, then left and right of the next one
+            right_points = locations + r_ext * right_vectors
+            left_points = locations + l_ext * right_vectors
+            return np.stack([right_points[:-1], right_points[1:], left_points[1:], left_points[:-1]], axis=1)
 
         if self._ignore_vehicles:
             return (False, None, -1)
 
         if not vehicle_list:
-            vehicle_list = self._world.get_actors().filter("*vehicle*")
+            if self._perception is not None:
+                vehicle_list = self._perception.vehicles_near(
+                    self._get_location(self._vehicle), max_distance or self._base_vehicle_threshold,
+                    exclude=self._vehicle)
+            else:
+                vehicle_list = self._world.get_actors().filter("*vehicle*")
 
         if not max_distance:
             max_distance = self._base_vehicle_threshold
 
-        ego_transform = self._vehicle.get_transform()
+        ego_transform = self._get_transform(self._vehicle)
         ego_location = ego_transform.location
-        ego_wpt = self._map.get_waypoint(ego_location)
+        ego_wpt = self._get_waypoint(self._vehicle)
 
         # Get the right offset
         if ego_wpt.lane_id < 0 and lane_offset != 0:
@@ -368,49 +478,66 @@ class BasicAgent(object):
         use_bbs = self._use_bbs_detection or opposite_invasion or ego_wpt.is_junction
 
         # Get the route bounding box
-        route_polygon = get_route_polygon()
-
-        for target_vehicle in vehicle_list:
-            if target_vehicle.id == self._vehicle.id:
-                continue
-
-            target_transform = target_vehicle.get_transform()
-            if target_transform.location.distance(ego_location) > max_distance:
+        route_quads = get_route_quads()
+
+        # Vehicles further than the max distance are discarded at once
+        targets = [v for v in vehicle_list if v.id != self._vehicle.id]
+        locations, rotations = self._get_actor_arrays(targets)
+        close = np.flatnonzero(compute_distances(locations, ego_location) <= max_distance).tolist()
+        targets = [targets[i] for i in close]
+        locations, rotations = locations[close], rotations[close]
+        target_wpts = [self._get_waypoint(v, lane_type=carla.LaneType.Any) for v in targets]
+
+        # The bounding boxes of all the targets are checked against the route at once
+        obstacles = {}
+        bbs_checked = set()
+        if route_quads is not None:
+            bbs_targets = [(v, self._get_transform(v))
+                           for v, w in zip(targets, target_wpts) if use_bbs or w.is_junction]
+            if bbs_targets:
+                centers, yaws, extents = [], [], []
+                for target_vehicle, target_transform in bbs_targets:
+                    target_bb = target_vehicle.bounding_box
+                    center = target_transform.transform(target_bb.location)
+                    centers.append([center.x, center.y])
+                    yaws.append(target_transform.rotation.yaw + target_bb.rotation.yaw)
+                    extents.append([target_bb.extent.x, target_bb.extent.y])
+                target_vertices = compute_obb_vertices(centers, yaws, extents)
+                hits = polygons_intersect(route_quads, target_vertices).any(axis=0)
+                for (target_vehicle, target_transform), hit in zip(bbs_targets, hits.tolist()):
+                    bbs_checked.add(target_vehicle.id)
+                    if hit:
+                        obstacles[target_vehicle.id] = compute_distance(target_transform.location, ego_location)
+
+        # Simplified approach, using only the plan waypoints (similar to TM), for the rest of the targets
+        next_wpt = None
+        lane_targets = []
+        for i, (target_vehicle, target_wpt) in enumerate(zip(targets, target_wpts)):
+            if target_vehicle.id in bbs_checked:
                 continue
-
-            target_wpt = self._map.get_waypoint(target_transform.location, lane_type=carla.LaneType.Any)
-
-            # General approach for junctions and vehicles invading other lanes due to the offset
-            if (use_bbs or target_wpt.is_junction) and route_polygon:
-
-                target_bb = target_vehicle.bounding_box
-                target_vertices = target_bb.get_world_vertices(target_vehicle.get_transform())
-                target_list = [[v.x, v.y, v.z] for v in target_vertices]
-                target_polygon = Polygon(target_list)
-
-                if route_polygon.intersects(target_polygon):
-                    return (True, target_vehicle, compute_distance(target_vehicle.get_location(), ego_location))
-
-            # Simplified approach, using only the plan waypoints (similar to TM)
-            else:
-
-                if target_wpt.road_id != ego_wpt.road_id or target_wpt.lane_id != ego_wpt.lane_id  + lane_offset:
+            if target_wpt.road_id != ego_wpt.road_id or target_wpt.lane_id != ego_wpt.lane_id  + lane_offset:
+                if next_wpt is None:
                     next_wpt = self._local_planner.get_incoming_waypoint_and_direction(steps=3)[0]
-                    if not next_wpt:
-                        continue
-                    if target_wpt.road_id != next_wpt.road_id or target_wpt.lane_id != next_wpt.lane_id  + lane_offset:
-                        continue
-
-                target_forward_vector = target_transform.get_forward_vector()
-                target_extent = target_vehicle.bounding_box.extent.x
-                target_rear_transform = target_transform
-                target_rear_transform.location -= carla.Location(
-                    x=target_extent * target_forward_vector.x,
-                    y=target_extent * target_forward_vector.y,
-                )
-
-                if is_within_distance(target_rear_transform, ego_front_transform, max_distance, [low_angle_th, up_angle_th]):
-                    return (True, target_vehicle, compute_distance(target_transform.location, ego_transform.location))
+                if not next_wpt:
+                    continue
+                if target_wpt.road_id != next_wpt.road_id or target_wpt.lane_id != next_wpt.lane_id  + lane_offset:
+                    continue
+            lane_targets.append(i)
+
+        # Distances and angles from the front of the ego to the rear of all those targets
+        target_extents = np.array([targets[i].bounding_box.extent.x for i in lane_targets]).reshape(-1, 1)
+        rear_locations = locations[lane_targets].copy()
+        rear_locations[:, 0:2] -= target_extents * compute_forward_vectors(rotations[lane_targets])[:, 0:2]
+        within = is_within_distances(rear_locations, ego_front_transform, max_distance, [low_angle_th, up_angle_th])
+        distances = compute_distances(rear_locations, ego_transform.location)
+        for i, hit, distance in zip(lane_targets, within.tolist(), distances.tolist()):
+            if hit:
+                obstacles[targets[i].id] = distance
+
+        # The first obstacle of the list is returned
+        for target_vehicle in targets:
+            if target_vehicle.id in obstacles:
+                return (True, target_vehicle, obstacles[target_vehicle.id])
 
         return (False, None, -1)
 
@@ -422,6 +549,13 @@ class BasicAgent(object):
         Use the different distances to fine-tune the maneuver.
         If the lane change is impossible, the returned path will be empty.
         """
+        if self._lane_change_index is not None:
+            plan = self._lane_change_index.lane_change_path(
+                waypoint, direction, distance_same_lane, distance_other_lane,
+                lane_change_distance, check, lane_changes)
+            if plan is not None:
+                return plan
+
         distance_same_lane = max(distance_same_lane, 0.1)
         distance_other_lane = max(distance_other_lane, 0.1)
         lane_change_distance = max(lane_change_distance, 0.1)
@@ -15,7 +15,7 @@ from agents.navigation.basic_agent import BasicAgent
 from agents.navigation.local_planner import RoadOption
 from agents.navigation.behavior_types import Cautious, Aggressive, Normal
 
-from agents.tools.misc import get_speed, positive, is_within_distance, compute_distance
+from agents.tools.misc import positive, is_within_distance, compute_distance, compute_distances
 
 class BehaviorAgent(BasicAgent):
     """
@@ -49,6 +49,7 @@ class BehaviorAgent(BasicAgent):
         self._incoming_waypoint = None
         self._min_speed = 5
         self._behavior = None
+        self._actors_info = None
         self._sampling_resolution = 4.5
 
         # Parameters for agent behavior
@@ -66,7 +67,7 @@ class BehaviorAgent(BasicAgent):
         This method updates the information regarding the ego
         vehicle based on the surrounding world.
         """
-        self._speed = get_speed(self._vehicle)
+        self._speed = self._get_speed(self._vehicle)
         self._speed_limit = self._vehicle.get_speed_limit()
         self._local_planner.set_speed(self._speed_limit)
         self._direction = self._local_planner.target_road_option
@@ -80,12 +81,64 @@ class BehaviorAgent(BasicAgent):
         if self._incoming_direction is None:
             self._incoming_direction = RoadOption.LANEFOLLOW
 
+    def _classify_actors(self, waypoint):
+        """
+        This method splits the actors of the world into vehicles, walkers and traffic lights
+        in a single pass, keeping the vehicles and walkers close to the ego sorted by distance.
+        The result is shared by all the managers of the step.
+
+            :param waypoint: current waypoint of the agent
+        """
+        location = waypoint.transform.location
+
+        if self._perception is not None:
+            vehicles = self._perception.vehicles_near(location, 45, exclude=self._vehicle)
+            walkers = self._perception.walkers_near(location, 10)
+            traffic_lights = self._perception.get_traffic_lights()
+        else:
+            vehicles, walkers, traffic_lights = [], [], []
+            for actor in self._world.get_actors():
+                type_id = actor.type_id
+                if type_id.startswith('vehicle.'):
+                    if actor.id != self._vehicle.id:
+                        vehicles.append(actor)
+                elif type_id.startswith('walker.pedestrian'):
+                    walkers.append(actor)
+                elif 'traffic_light' in type_id:
+                    traffic_lights.append(actor)
+            vehicles = self._actors_near(vehicles, location, 45)
+            walkers = self._actors_near(walkers, location, 10)
+
+        self._actors_info = {
+            'vehicles': vehicles,
+            'walkers': walkers,
+            'traffic_lights': traffic_lights
+        }
+
+    def _actors_near(self, actors, location, max_distance):
+        """
+        Returns the actors closer than max_distance to a location, sorted by distance
+
+            :param actors: list of actors
+            :param location: carla.Location
+            :param max_distance: radius of the search in meters
+        """
+        if not actors:
+            return []
+        distances = compute_distances(self._get_actor_arrays(actors)[0], location)
+        close = np.flatnonzero(distances < max_distance)
+        return [actors[i] for i in close[np.argsort(distances[close], kind='stable')].tolist()]
+
     def traffic_light_manager(self):
         """
         This method is in charge of behaviors for red lights.
         """
-        actor_list = self._world.get_actors()
-        lights_list = actor_list.filter("*traffic_light*")
+        if self._traffic_light_index is not None:
+            lights_list = None
+        elif self._actors_info is not None:
+            lights_list = self._actors_info['traffic_lights']
+        else:
+            lights_list = self._world.get_actors().filter("*traffic_light*")
         affected, _ = self._affected_by_traffic_light(lights_list)
 
         return affected
@@ -99,17 +152,12 @@ class BehaviorAgent(BasicAgent):
             :param vehicle_list: list of all the nearby vehicles
         """
 
-        left_turn = waypoint.left_lane_marking.lane_change
-        right_turn = waypoint.right_lane_marking.lane_change
-
-        left_wpt = waypoint.get_left_lane()
-        right_wpt = waypoint.get_right_lane()
-
         behind_vehicle_state, behind_vehicle, _ = self._vehicle_obstacle_detected(vehicle_list, max(
             self._behavior.min_proximity_threshold, self._speed_limit / 2), up_angle_th=180, low_angle_th=160)
-        if behind_vehicle_state and self._speed < get_speed(behind_vehicle):
-            if (right_turn == carla.LaneChange.Right or right_turn ==
-                    carla.LaneChange.Both) and waypoint.lane_id * right_wpt.lane_id > 0 and right_wpt.lane_type == carla.LaneType.Driving:
+        if behind_vehicle_state and self._speed < self._get_speed(behind_vehicle):
+            right_wpt = self._tailgating_side_lane(waypoint, 'right')
+            left_wpt = None if right_wpt else self._tailgating_side_lane(waypoint, 'left')
+            if right_wpt:
                 new_vehicle_state, _, _ = self._vehicle_obstacle_detected(vehicle_list, max(
                     self._behavior.min_proximity_threshold, self._speed_limit / 2), up_angle_th=180, lane_offset=1)
                 if not new_vehicle_state:
@@ -118,7 +166,7 @@ class BehaviorAgent(BasicAgent):
                     self._behavior.tailgate_counter = 200
                     self.set_destination(end_waypoint.transform.location,
                                          right_wpt.transform.location)
-            elif left_turn == carla.LaneChange.Left and waypoint.lane_id * left_wpt.lane_id > 0 and left_wpt.lane_type == carla.LaneType.Driving:
+            elif left_wpt:
                 new_vehicle_state, _, _ = self._vehicle_obstacle_detected(vehicle_list, max(
                     self._behavior.min_proximity_threshold, self._speed_limit / 2), up_angle_th=180, lane_offset=-1)
                 if not new_vehicle_state:
@@ -128,6 +176,32 @@ class BehaviorAgent(BasicAgent):
                     self.set_destination(end_waypoint.transform.location,
                                          left_wpt.transform.location)
 
+    def _tailgating_side_lane(self, waypoint, direction):
+        """
+        Returns the waypoint of the side lane the agent can move to when tailgated, None if there is none.
+        The side lane has to be a driving lane going in the same direction.
+
+            :param waypoint: current waypoint of the agent
+            :param direction: 'left' or 'right'
+        """
+        if self._lane_change_index is not None:
+            allowed = self._lane_change_index.can_change(waypoint, direction, same_direction=True)
+            if allowed is not None:
+                return self._lane_change_index.side_waypoint(waypoint, direction) if allowed else None
+
+        if direction == 'right':
+            right_turn = waypoint.right_lane_marking.lane_change
+            allowed = right_turn == carla.LaneChange.Right or right_turn == carla.LaneChange.Both
+            side_wpt = waypoint.get_right_lane() if allowed else None
+        else:
+            left_turn = waypoint.left_lane_marking.lane_change
+            allowed = left_turn == carla.LaneChange.Left
+            side_wpt = waypoint.get_left_lane() if allowed else None
+
+        if not side_wpt or waypoint.lane_id * side_wpt.lane_id <= 0 or side_wpt.lane_type != carla.LaneType.Driving:
+            return None
+        return side_wpt
+
     def collision_and_car_avoid_manager(self, waypoint):
         """
         This module is in charge of warning in case of a collision
@@ -140,9 +214,9 @@ class BehaviorAgent(BasicAgent):
             :return distance: distance to nearby vehicle
         """
 
-        vehicle_list = self._world.get_actors().filter("*vehicle*")
-        def dist(v): return v.get_location().distance(waypoint.transform.location)
-        vehicle_list = [v for v in vehicle_list if dist(v) < 45 and v.id != self._vehicle.id]
+        if self._actors_info is None:
+            self._classify_actors(waypoint)
+        vehicle_list = self._actors_info['vehicles']
 
         if self._direction == RoadOption.CHANGELANELEFT:
             vehicle_state, vehicle, distance = self._vehicle_obstacle_detected(
@@ -177,9 +251,13 @@ class BehaviorAgent(BasicAgent):
             :return distance: distance to nearby walker
         """
 
-        walker_list = self._world.get_actors().filter("*walker.pedestrian*")
-        def dist(w): return w.get_location().distance(waypoint.transform.location)
-        walker_list = [w for w in walker_list if dist(w) < 10]
+        if self._actors_info is None:
+            self._classify_actors(waypoint)
+        walker_list = self._actors_info['walkers']
+
+        # An empty list would make the detection fall back to all the vehicles of the world
+        if not walker_list:
+            return False, None, -1
 
         if self._direction == RoadOption.CHANGELANELEFT:
             walker_state, walker, distance = self._vehicle_obstacle_detected(walker_list, max(
@@ -204,7 +282,7 @@ class BehaviorAgent(BasicAgent):
             :return control: carla.VehicleControl
         """
 
-        vehicle_speed = get_speed(vehicle)
+        vehicle_speed = self._get_speed(vehicle)
         delta_v = max(1, (self._speed - vehicle_speed) / 3.6)
         ttc = distance / delta_v if delta_v != 0 else distance / np.nextafter(0., 1.)
 
@@ -249,8 +327,8 @@ class BehaviorAgent(BasicAgent):
         if self._behavior.tailgate_counter > 0:
             self._behavior.tailgate_counter -= 1
 
-        ego_vehicle_loc = self._vehicle.get_location()
-        ego_vehicle_wp = self._map.get_waypoint(ego_vehicle_loc)
+        ego_vehicle_wp = self._get_waypoint(self._vehicle)
+        self._classify_actors(ego_vehicle_wp)
 
         # 1: Red lights and stops behavior
         if self.traffic_light_manager():
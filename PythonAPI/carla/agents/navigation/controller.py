@@ -255,4 +255,168 @@ class PIDLateralController():
         self._k_p = K_P
         self._k_i = K_I
         self._k_d = K_D
-        self._dt = dt
\ No newline at end of file
+        self._dt = dt
+
+
+def _per_vehicle(value, num_vehicles):
+    """Returns a parameter given as a scalar or a sequence as an array with one value per vehicle"""
+    return np.array(np.broadcast_to(np.asarray(value, dtype=np.float64), (num_vehicles,)))
+
+
+class _PIDStateBank():
+    """PID terms of several controllers, with a ring buffer of the last errors of each one"""
+
+    def __init__(self, num_controllers, buffer_size, K_P=1.0, K_I=0.0, K_D=0.0, dt=0.03):
+        self.k_p = _per_vehicle(K_P, num_controllers)
+        self.k_i = _per_vehicle(K_I, num_controllers)
+        self.k_d = _per_vehicle(K_D, num_controllers)
+        self.dt = _per_vehicle(dt, num_controllers)
+        self.buffer = np.zeros((num_controllers, buffer_size))
+        self.buffer_sum = np.zeros(num_controllers)
+        self.previous = np.zeros(num_controllers)
+        self.count = 0
+        self.head = 0
+
+    def step(self, error):
+        """Returns the clipped PID output of every controller for its new error"""
+        self.buffer_sum += error - self.buffer[:, self.head]
+        self.buffer[:, self.head] = error
+        self.head = (self.head + 1) % self.buffer.shape[1]
+        if self.head == 0:
+            # Drop the rounding errors accumulated by the running sums once per lap
+            self.buffer_sum = self.buffer.sum(axis=1)
+        self.count += 1
+
+        if self.count >= 2:
+            _de = (error - self.previous) / self.dt
+            _ie = self.buffer_sum * self.dt
+        else:
+            _de = np.zeros_like(error)
+            _ie = np.zeros_like(error)
+        self.previous = error
+
+        return np.clip((self.k_p * error) + (self.k_d * _de) + (self.k_i * _ie), -1.0, 1.0)
+
+
+class VehiclePIDControllerBank():
+    """
+    VehiclePIDControllerBank holds the lateral and longitudinal PID controllers of several
+    vehicles in NumPy arrays, and computes the controls of all of them in a single step.
+    The error buffers are ring buffers with running sums, and each step gives the same
+    controls as one VehiclePIDController per vehicle.
+    """
+
+    def __init__(self, vehicles, args_lateral, args_longitudinal, offset=0, max_throttle=0.75, max_brake=0.3,
+                 max_steering=0.8, buffer_size=10):
+        """
+        Constructor method.
+
+        :param vehicles: list of actors to control
+        :param args_lateral: dictionary of arguments to set the lateral PID controllers (K_P, K_D, K_I, dt)
+        :param args_longitudinal: dictionary of arguments to set the longitudinal PID controllers (K_P, K_D, K_I, dt)
+        :param offset: distance to the center line, as in VehiclePIDController.
+        The parameters and limits can also be arrays with one value per vehicle.
+        :param buffer_size: number of past errors used by the integral terms
+        """
+        self._vehicles = list(vehicles)
+        num_vehicles = len(self._vehicles)
+
+        self.max_brake = _per_vehicle(max_brake, num_vehicles)
+        self.max_throt = _per_vehicle(max_throttle, num_vehicles)
+        self.max_steer = _per_vehicle(max_steering, num_vehicles)
+        self._offset = _per_vehicle(offset, num_vehicles)
+        self.past_steering = _per_vehicle([v.get_control().steer for v in self._vehicles], num_vehicles)
+
+        self._lon = _PIDStateBank(num_vehicles, buffer_size, **args_longitudinal)
+        self._lat = _PIDStateBank(num_vehicles, buffer_size, **args_lateral)
+
+    def __len__(self):
+        return len(self._vehicles)
+
+    def target_locations(self, waypoints):
+        """
+        Returns the (N, 2) locations the vehicles steer to, displaced to the side by the offset
+
+            :param waypoints: target waypoint of each vehicle
+        """
+        targets = np.empty((len(waypoints), 2))
+        for i, waypoint in enumerate(waypoints):
+            w_tran = waypoint.transform
+            if self._offset[i] != 0:
+                r_vec = w_tran.get_right_vector()
+                w_loc = w_tran.location + carla.Location(x=self._offset[i]*r_vec.x, y=self._offset[i]*r_vec.y)
+            else:
+                w_loc = w_tran.location
+            targets[i] = (w_loc.x, w_loc.y)
+        return targets
+
+    def compute(self, target_speeds, target_locations, speeds, locations, rotations):
+        """
+        Executes one step of both PID controllers of all the vehicles
+
+            :param target_speeds: (N,) desired speeds in Km/h
+            :param target_locations: (N, 2) locations to steer to
+            :param speeds: (N,) current speeds in Km/h
+            :param locations: (N, 2) current locations
+            :param rotations: (N, 2) current pitch and yaw in degrees
+            :return: tuple of (N,) arrays (throttle, brake, steer)
+        """
+        acceleration = self._lon.step(np.asarray(target_speeds, dtype=np.float64) - speeds)
+
+        # Signed angle between the forward vector and the vector to the target
+        pitch, yaw = np.radians(rotations[:, 0]), np.radians(rotations[:, 1])
+        v_vec = np.stack([np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw)], axis=1)
+        w_vec = np.asarray(target_locations, dtype=np.float64) - locations
+        wv_linalg = np.linalg.norm(w_vec, axis=1) * np.linalg.norm(v_vec, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_angle = np.clip(np.einsum('ij,ij->i', w_vec, v_vec) / wv_linalg, -1.0, 1.0)
+        _dot = np.where(wv_linalg == 0, 1.0, np.arccos(np.where(wv_linalg == 0, 1.0, cos_angle)))
+        _cross = v_vec[:, 0] * w_vec[:, 1] - v_vec[:, 1] * w_vec[:, 0]
+        _dot = np.where(_cross < 0, -_dot, _dot)
+        current_steering = self._lat.step(_dot)
+
+        throttle = np.where(acceleration >= 0.0, np.minimum(acceleration, self.max_throt), 0.0)
+        brake = np.where(acceleration >= 0.0, 0.0, np.minimum(np.abs(acceleration), self.max_brake))
+
+        # Steering regulation: changes cannot happen abruptly, can't steer too much.
+        current_steering = np.clip(current_steering, self.past_steering - 0.1, self.past_steering + 0.1)
+        steering = np.clip(current_steering, -self.max_steer, self.max_steer)
+        self.past_steering = steering
+
+        return throttle, brake, steering
+
+    def run_step(self, target_speeds, waypoints, perception=None):
+        """
+        Execute one step of control of all the vehicles, reading their state from a
+        WorldPerception if given, or from the vehicles otherwise.
+
+            :param target_speeds: desired speed of each vehicle, or a single one for all
+            :param waypoints: target waypoint of each vehicle
+            :param perception: WorldPerception of the current frame
+            :return: list of carla.VehicleControl
+        """
+        if perception is not None:
+            rows = perception.get_rows(self._vehicles)
+            speeds = 3.6 * perception.speeds[rows]
+            locations = perception.locations[rows, 0:2]
+            rotations = perception.rotations[rows, 0:2]
+        else:
+            transforms = [vehicle.get_transform() for vehicle in self._vehicles]
+            speeds = np.array([get_speed(vehicle) for vehicle in self._vehicles])
+            locations = np.array([(t.location.x, t.location.y) for t in transforms]).reshape(-1, 2)
+            rotations = np.array([(t.rotation.pitch, t.rotation.yaw) for t in transforms]).reshape(-1, 2)
+
+        target_speeds = np.broadcast_to(np.asarray(target_speeds, dtype=np.float64), (len(self._vehicles),))
+        throttle, brake, steer = self.compute(
+            target_speeds, self.target_locations(waypoints), speeds, locations, rotations)
+
+        controls = []
+        for i in range(len(self._vehicles)):
+            control = carla.VehicleControl()
+            control.throttle = float(throttle[i])
+            control.brake = float(brake[i])
+            control.steer = float(steer[i])
+            control.hand_brake = False
+            control.manual_gear_shift = False
+            controls.append(control)
+        return controls
@@ -9,11 +9,18 @@ This module provides GlobalRoutePlanner implementation.
 """
 
 import math
+import os
+from collections import OrderedDict
 import numpy as np
 import networkx as nx
 
 import carla
 from agents.navigation.local_planner import RoadOption
+from agents.navigation.route_graph_cache import (materialize, route_graph_cache_file,
+                                                 save_route_graph, load_route_graph)
+from agents.navigation.route_search import CSRRoadGraph, astar_routes
+from agents.navigation.topology_sampler import TopologySampler
+from agents.navigation.waypoint_index import WaypointIndex, waypoint_xyz, closest_index
 from agents.tools.misc import vector
 
 class GlobalRoutePlanner(object):
@@ -21,35 +28,170 @@ class GlobalRoutePlanner(object):
     This class provides a very high level route plan.
     """
 
-    def __init__(self, wmap, sampling_resolution):
+    def __init__(self, wmap, sampling_resolution, cache_dir=None, search_backend='networkx', route_cache_size=256,
+                 client_side_localization=False):
+        """
+            :param wmap: carla.Map of the world
+            :param sampling_resolution: distance between the waypoints of the graph edges
+            :param cache_dir: if given, the built graph is stored in this folder, keyed by the
+                OpenDRIVE content and the sampling resolution, and loaded by later planners.
+            :param search_backend: 'networkx' to search the routes with networkx, or 'csr' to use
+                a compact array copy of the graph with a faster A* returning the same routes.
+            :param route_cache_size: maximum number of searched routes kept in memory. Routes between
+                the same pair of lane segments reuse the stored nodes and turn decisions. Use 0 to disable it.
+            :param client_side_localization: if True, the origin and destination of the routes are matched
+                to the closest lane of the graph with a map-wide KD-tree instead of querying the map.
+        """
+        if search_backend not in ('networkx', 'csr'):
+            raise ValueError("Unknown search backend '{}', use 'networkx' or 'csr'".format(search_backend))
+
         self._sampling_resolution = sampling_resolution
         self._wmap = wmap
         self._topology = None
         self._graph = None
         self._id_map = None
         self._road_id_to_edge = None
+        self._search_backend = search_backend
+        self._csr_graph = None
+        self._client_side_localization = client_side_localization
+        self._waypoint_index = None
+
+        self._route_cache = OrderedDict()
+        self._route_cache_size = route_cache_size
+        self._route_cache_hits = 0
+        self._route_cache_misses = 0
 
         self._intersection_end_node = -1
         self._previous_decision = RoadOption.VOID
 
-        # Build the graph
-        self._build_topology()
-        self._build_graph()
-        self._find_loose_ends()
-        self._lane_change_link()
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = route_graph_cache_file(cache_dir, self._wmap, self._sampling_resolution)
+
+        if cache_file is not None and os.path.exists(cache_file):
+            self._graph, self._id_map, self._road_id_to_edge = load_route_graph(cache_file, self._wmap)
+        else:
+            # Build the graph
+            self._build_topology()
+            self._build_graph()
+            self._find_loose_ends()
+            self._lane_change_link()
+            if cache_file is not None:
+                save_route_graph(cache_file, self._graph, self._road_id_to_edge)
+
+        self._build_edge_arrays()
+
+        if search_backend == 'csr':
+            self._get_csr_graph()
 
     def trace_route(self, origin, destination):
         """
         This method returns list of (carla.Waypoint, RoadOption)
         from origin to destination
         """
+        if self._client_side_localization:
+            current_waypoint = self._get_waypoint_index().query(origin)[0]
+            destination_waypoint = self._get_waypoint_index().query(destination)[0]
+        else:
+            current_waypoint = self._wmap.get_waypoint(origin)
+            destination_waypoint = self._wmap.get_waypoint(destination)
+        start = self._waypoint_edge(current_waypoint)
+        end = self._waypoint_edge(destination_waypoint)
+
+        # The route and its turn decisions only depend on the start and end edges,
+        # just the partial segments at both ends are trimmed again for every query
+        key = (start, end, self._sampling_resolution)
+        if key in self._route_cache:
+            self._route_cache_hits += 1
+            self._route_cache.move_to_end(key)
+            route, road_options = self._route_cache[key]
+        else:
+            self._route_cache_misses += 1
+            route = self._search_route(start, end)
+            road_options = self._turn_decisions(route)
+            if self._route_cache_size > 0:
+                self._route_cache[key] = (route, road_options)
+                if len(self._route_cache) > self._route_cache_size:
+                    self._route_cache.popitem(last=False)
+
+        return self._route_to_trace(route, destination, current_waypoint, destination_waypoint, road_options)
+
+    def get_route_cache_info(self):
+        """
+        Returns a dictionary with the hits, misses, current size and maximum size of the route cache
+        """
+        return {
+            'hits': self._route_cache_hits,
+            'misses': self._route_cache_misses,
+            'size': len(self._route_cache),
+            'max_size': self._route_cache_size
+        }
+
+    def clear_route_cache(self):
+        """
+        Empties the route cache and resets its counters
+        """
+        self._route_cache.clear()
+        self._route_cache_hits = 0
+        self._route_cache_misses = 0
+
+    def trace_routes(self, pairs, processes=None):
+        """
+        This method returns a list of (carla.Waypoint, RoadOption) lists, one per
+        (origin, destination) pair, with the same routes as trace_route. Every distinct
+        endpoint is localized only once, and every distinct pair of edges is searched once.
+
+            :param pairs: list of (carla.Location, carla.Location) tuples
+            :param processes: if given, the searches are done by a pool of this many processes
+        """
+        localized = dict()
+
+        def localize(location):
+            key = (location.x, location.y, location.z)
+            if key not in localized:
+                if self._client_side_localization:
+                    waypoint = self._get_waypoint_index().query(location)[0]
+                else:
+                    waypoint = self._wmap.get_waypoint(location)
+                localized[key] = (waypoint, self._waypoint_edge(waypoint))
+            return localized[key]
+
+        queries = []
+        for origin, destination in pairs:
+            origin_wp, start = localize(origin)
+            destination_wp, end = localize(destination)
+            queries.append((origin_wp, destination_wp, start, end))
+
+        # Same A* as trace_route, the CSR search returns the same routes as the networkx one
+        node_routes = astar_routes(self._get_csr_graph(), [(start[0], end[0]) for _, _, start, end in queries],
+                                   processes)
+
+        route_traces = []
+        for (origin_wp, destination_wp, start, end), (_, destination) in zip(queries, pairs):
+            route = node_routes[start[0], end[0]]
+            if route is None:
+                raise nx.NetworkXNoPath("Node {} not reachable from {}".format(end[0], start[0]))
+            route = route + [end[1]]
+            route_traces.append(self._route_to_trace(route, destination, origin_wp, destination_wp))
+
+        return route_traces
+
+    def _route_to_trace(self, route, destination, current_waypoint, destination_waypoint, road_options=None):
+        """
+        This method converts a route of graph nodes into a list of (carla.Waypoint, RoadOption)
+
+            :param route: list of node ids returned by the path search
+            :param destination: carla.Location of the end of the route
+            :param current_waypoint: carla.Waypoint of the start of the route
+            :param destination_waypoint: carla.Waypoint of the end of the route
+            :param road_options: turn decision of each edge of the route, computed if not given
+        """
         route_trace = []
-        route = self._path_search(origin, destination)
-        current_waypoint = self._wmap.get_waypoint(origin)
-        destination_waypoint = self._wmap.get_waypoint(destination)
+        if road_options is None:
+            road_options = self._turn_decisions(route)
 
         for i in range(len(route) - 1):
-            road_option = self._turn_decision(i, route)
+            road_option = road_options[i]
             edge = self._graph.edges[route[i], route[i+1]]
             path = []
 
@@ -59,27 +201,50 @@ class GlobalRoutePlanner(object):
                 n1, n2 = self._road_id_to_edge[exit_wp.road_id][exit_wp.section_id][exit_wp.lane_id]
                 next_edge = self._graph.edges[n1, n2]
                 if next_edge['path']:
-                    closest_index = self._find_closest_in_list(current_waypoint, next_edge['path'])
-                    closest_index = min(len(next_edge['path'])-1, closest_index+5)
-                    current_waypoint = next_edge['path'][closest_index]
+                    closest_idx = closest_index(waypoint_xyz(current_waypoint), next_edge['waypoints_xyz'][1:-1])
+                    closest_idx = min(len(next_edge['path'])-1, closest_idx+5)
+                    current_waypoint = next_edge['path'][closest_idx]
                 else:
                     current_waypoint = next_edge['exit_waypoint']
                 route_trace.append((current_waypoint, road_option))
 
             else:
                 path = path + [edge['entry_waypoint']] + edge['path'] + [edge['exit_waypoint']]
-                closest_index = self._find_closest_in_list(current_waypoint, path)
-                for waypoint in path[closest_index:]:
-                    current_waypoint = waypoint
+                path_xyz = edge['waypoints_xyz']
+                closest_idx = closest_index(waypoint_xyz(current_waypoint), path_xyz)
+                last_edges = len(route)-i <= 2
+                if last_edges:
+                    destination_distances = np.linalg.norm(
+                        path_xyz - [destination.x, destination.y, destination.z], axis=1)
+                    destination_idx = closest_index(waypoint_xyz(destination_waypoint), path_xyz)
+                for j in range(closest_idx, len(path)):
+                    current_waypoint = path[j]
                     route_trace.append((current_waypoint, road_option))
-                    if len(route)-i <= 2 and waypoint.transform.location.distance(destination) < 2*self._sampling_resolution:
+                    if last_edges and destination_distances[j] < 2*self._sampling_resolution:
                         break
-                    elif len(route)-i <= 2 and current_waypoint.road_id == destination_waypoint.road_id and current_waypoint.section_id == destination_waypoint.section_id and current_waypoint.lane_id == destination_waypoint.lane_id:
-                        destination_index = self._find_closest_in_list(destination_waypoint, path)
-                        if closest_index > destination_index:
+                    elif last_edges and self._same_lane(current_waypoint, destination_waypoint):
+                        if closest_idx > destination_idx:
                             break
 
-        return route_trace
+        return [(materialize(wp), option) for wp, option in route_trace]
+
+    def _build_edge_arrays(self):
+        """
+        This method stores the locations of the entry, path and exit waypoints of every
+        edge as a (N, 3) array in the 'waypoints_xyz' attribute of the edge, so that the
+        closest waypoint searches are done with NumPy instead of looping over waypoints.
+        """
+        for _, _, edge in self._graph.edges(data=True):
+            waypoints = [edge['entry_waypoint']] + edge['path'] + [edge['exit_waypoint']]
+            edge['waypoints_xyz'] = np.array([waypoint_xyz(wp) for wp in waypoints], dtype=np.float64)
+
+    def _get_waypoint_index(self):
+        """
+        Returns the map-wide index of the graph waypoints, building it on first use
+        """
+        if self._waypoint_index is None:
+            self._waypoint_index = WaypointIndex(self._graph)
+        return self._waypoint_index
 
     def _build_topology(self):
         """
@@ -94,6 +259,8 @@ class GlobalRoutePlanner(object):
         - path (list of carla.Waypoint):  list of waypoints between entry to exit, separated by the resolution
         """
         self._topology = []
+        # All the lanes are sampled at once, instead of following every segment with waypoint.next()
+        sampler = TopologySampler(self._wmap, self._sampling_resolution)
         # Retrieving waypoints to construct a detailed topology
         for segment in self._wmap.get_topology():
             wp1, wp2 = segment[0], segment[1]
@@ -107,13 +274,18 @@ class GlobalRoutePlanner(object):
             seg_dict['path'] = []
             endloc = wp2.transform.location
             if wp1.transform.location.distance(endloc) > self._sampling_resolution:
-                w = wp1.next(self._sampling_resolution)[0]
-                while w.transform.location.distance(endloc) > self._sampling_resolution:
-                    seg_dict['path'].append(w)
-                    next_ws = w.next(self._sampling_resolution)
-                    if len(next_ws) == 0:
-                        break
-                    w = next_ws[0]
+                path = sampler.segment_path(wp1, wp2, self._sampling_resolution)
+                if path is not None:
+                    seg_dict['path'] = path
+                else:
+                    # Lanes too short to get any sample are still followed step by step
+                    w = wp1.next(self._sampling_resolution)[0]
+                    while w.transform.location.distance(endloc) > self._sampling_resolution:
+                        seg_dict['path'].append(w)
+                        next_ws = w.next(self._sampling_resolution)
+                        if len(next_ws) == 0:
+                            break
+                        w = next_ws[0]
             else:
                 next_wps = wp1.next(self._sampling_resolution)
                 if len(next_wps) == 0:
@@ -267,7 +439,12 @@ class GlobalRoutePlanner(object):
         This function finds the road segment that a given location
         is part of, returning the edge it belongs to
         """
-        waypoint = self._wmap.get_waypoint(location)
+        return self._waypoint_edge(self._wmap.get_waypoint(location))
+
+    def _waypoint_edge(self, waypoint):
+        """
+        This function returns the edge of the graph a waypoint belongs to
+        """
         edge = None
         try:
             edge = self._road_id_to_edge[waypoint.road_id][waypoint.section_id][waypoint.lane_id]
@@ -275,6 +452,21 @@ class GlobalRoutePlanner(object):
             pass
         return edge
 
+    def _same_lane(self, waypoint1, waypoint2):
+        """
+        This function returns True if both waypoints belong to the same lane of the same road section
+        """
+        return (waypoint1.road_id, waypoint1.section_id, waypoint1.lane_id) == \
+            (waypoint2.road_id, waypoint2.section_id, waypoint2.lane_id)
+
+    def _get_csr_graph(self):
+        """
+        Returns the CSR copy of the graph, building it on first use
+        """
+        if self._csr_graph is None:
+            self._csr_graph = CSRRoadGraph(self._graph)
+        return self._csr_graph
+
     def _distance_heuristic(self, n1, n2):
         """
         Distance heuristic calculator for path searching
@@ -294,10 +486,21 @@ class GlobalRoutePlanner(object):
         connecting origin and destination
         """
         start, end = self._localize(origin), self._localize(destination)
+        return self._search_route(start, end)
 
-        route = nx.astar_path(
-            self._graph, source=start[0], target=end[0],
-            heuristic=self._distance_heuristic, weight='length')
+    def _search_route(self, start, end):
+        """
+        This function finds the path between the start and end edges of the graph
+        start       :   edge (n1, n2) of the start position
+        end         :   edge (n1, n2) of the end position
+        return      :   path as list of node ids, from start[0] to end[1]
+        """
+        if self._search_backend == 'csr':
+            route = self._get_csr_graph().astar(start[0], end[0])
+        else:
+            route = nx.astar_path(
+                self._graph, source=start[0], target=end[0],
+                heuristic=self._distance_heuristic, weight='length')
         route.append(end[1])
         return route
 
@@ -323,6 +526,16 @@ class GlobalRoutePlanner(object):
 
         return last_node, last_intersection_edge
 
+    def _turn_decisions(self, route):
+        """
+        This method returns the turn decision (RoadOption) of every edge of the route.
+        The decisions carry state from one edge to the next, which is reset for every route
+        so that they do not depend on the previously traced ones.
+        """
+        self._intersection_end_node = -1
+        self._previous_decision = RoadOption.VOID
+        return [self._turn_decision(i, route) for i in range(len(route) - 1)]
+
     def _turn_decision(self, index, route, threshold=math.radians(35)):
         """
         This method returns the turn decision (RoadOption) for pair of edges
@@ -0,0 +1,220 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides an index of where the lanes of a map allow lane changes,
+computed once and shared by all the agents.
+"""
+
+import numpy as np
+
+import carla
+
+from agents.navigation.local_planner import RoadOption
+from agents.navigation.topology_sampler import TopologySampler
+
+
+class LaneChangeIndex(object):
+    """
+    Lane change feasibility of the driving lanes of a map. Every lane, keyed by
+    (road_id, section_id, lane_id), is split in bins of s, one per sample of a TopologySampler,
+    storing whether the road markings allow changing to the left and to the right. The side lanes
+    do not change along a lane section, so they are resolved once per lane. Candidate maneuvers are
+    then checked and their target lane polylines returned without walking the map.
+    """
+
+    def __init__(self, wmap, resolution=2.0, sampler=None):
+        """
+            :param wmap: carla.Map to index
+            :param resolution: distance between the s bins of a lane
+            :param sampler: TopologySampler of the map, to reuse one already built
+        """
+        if sampler is None:
+            sampler = TopologySampler(wmap, resolution)
+        self.resolution = sampler.resolution
+
+        self._lanes = dict()
+        for key in sampler.lanes():
+            s, xyz = sampler.lane_polyline(*key)
+            waypoints = sampler.lane_waypoints(*key)
+            lane_change = np.array([int(w.lane_change) for w in waypoints], dtype=np.int64)
+            middle = waypoints[len(waypoints) // 2]
+            self._lanes[key] = {
+                's': s,
+                'xyz': xyz,
+                'waypoints': waypoints,
+                'left': (lane_change & int(carla.LaneChange.Left)) != 0,
+                'right': (lane_change & int(carla.LaneChange.Right)) != 0,
+                'left_lane': self._lane_key(middle.get_left_lane()),
+                'right_lane': self._lane_key(middle.get_right_lane())
+            }
+
+    def __len__(self):
+        return len(self._lanes)
+
+    @staticmethod
+    def _lane_key(waypoint):
+        """Returns the key of the lane of a waypoint, None if it isn't a driving lane"""
+        if not waypoint or waypoint.lane_type != carla.LaneType.Driving:
+            return None
+        return (waypoint.road_id, waypoint.section_id, waypoint.lane_id)
+
+    @staticmethod
+    def _bin(lane, s):
+        """Returns the bin of a lane closest to s"""
+        s_bins = lane['s']
+        i = int(np.searchsorted(s_bins, s))
+        if i > 0 and (i == len(s_bins) or s - s_bins[i - 1] <= s_bins[i] - s):
+            i -= 1
+        return i
+
+    def _contains(self, lane, s):
+        """Returns whether s lies on the sampled part of a lane"""
+        half = self.resolution / 2.0
+        return lane['s'][0] - half <= s <= lane['s'][-1] + half
+
+    def _side(self, waypoint, direction):
+        """
+        Returns the lane of a waypoint, its bin and the key of the side lane in a direction.
+        The lane is None if it is not indexed, and the side key None if the change is not possible.
+        """
+        lane = self._lanes.get((waypoint.road_id, waypoint.section_id, waypoint.lane_id))
+        if lane is None or direction not in ('left', 'right'):
+            return lane, None, None
+        i = self._bin(lane, waypoint.s)
+        if not lane[direction][i]:
+            return lane, i, None
+        return lane, i, lane[direction + '_lane']
+
+    def can_change(self, waypoint, direction, same_direction=False):
+        """
+        Returns whether the road markings at a waypoint allow a change to the driving lane at one side,
+        or None if the lane of the waypoint is not indexed
+
+            :param waypoint: carla.Waypoint
+            :param direction: 'left' or 'right'
+            :param same_direction: if True, the side lane must also have the direction of the waypoint lane
+        """
+        lane, _, side = self._side(waypoint, direction)
+        if lane is None:
+            return None
+        if side is None:
+            return False
+        return not same_direction or side[2] * waypoint.lane_id > 0
+
+    def side_waypoint(self, waypoint, direction):
+        """
+        Returns the carla.Waypoint of the side lane next to a waypoint, None if the change is not possible
+
+            :param waypoint: carla.Waypoint
+            :param direction: 'left' or 'right'
+        """
+        lane, i, side = self._side(waypoint, direction)
+        side_lane = self._lanes.get(side)
+        if side_lane is None:
+            return None
+        return side_lane['waypoints'][self._bin(side_lane, lane['s'][i])]
+
+    def target_polyline(self, waypoint, direction, length):
+        """
+        Returns the s and (x, y, z) arrays of the side lane next to a waypoint, from the lane change
+        point and up to a length in the driving direction of that lane. None if the change is not possible.
+
+            :param waypoint: carla.Waypoint
+            :param direction: 'left' or 'right'
+            :param length: length of the polyline in meters
+        """
+        lane, i, side = self._side(waypoint, direction)
+        side_lane = self._lanes.get(side)
+        if side_lane is None:
+            return None
+        s_start = lane['s'][i]
+        indices = self._ahead(side, s_start, length, inclusive=True)
+        return side_lane['s'][indices], side_lane['xyz'][indices]
+
+    def _ahead(self, key, s, distance, inclusive=False):
+        """
+        Returns the bins of a lane ahead of s in its driving direction, sorted in that direction,
+        that are closer than distance. The first bin past distance is also included if there is one.
+        """
+        s_bins = self._lanes[key]['s']
+        if key[2] < 0:
+            ahead = np.flatnonzero(s_bins >= s if inclusive else s_bins > s)
+            distances = s_bins[ahead] - s
+        else:
+            ahead = np.flatnonzero(s_bins <= s if inclusive else s_bins < s)[::-1]
+            distances = s - s_bins[ahead]
+        return ahead[:int(np.searchsorted(distances, distance)) + 1]
+
+    def _follow(self, key, s, distance):
+        """Returns the waypoints of a lane up to distance ahead of s, None if the lane ends before"""
+        lane = self._lanes[key]
+        ahead = self._ahead(key, s, distance)
+        if len(ahead) == 0 or abs(lane['s'][ahead[-1]] - s) < distance:
+            return None
+        return [lane['waypoints'][i] for i in ahead.tolist()]
+
+    def lane_change_path(self, waypoint, direction='left', distance_same_lane=10,
+                         distance_other_lane=25, lane_change_distance=25, check=True, lane_changes=1):
+        """
+        Returns a plan that results in a lane change, like BasicAgent._generate_lane_change_path,
+        built from the bins of the index. The plan is empty if the lane change is impossible, and
+        None if the maneuver doesn't fit in the indexed lanes, in which case the map has to be walked.
+
+            :param waypoint: carla.Waypoint where the maneuver starts
+            :param direction: 'left' or 'right'
+            :param distance_same_lane: distance driven before the lane change
+            :param distance_other_lane: distance driven after the lane change
+            :param lane_change_distance: distance driven while changing lanes
+            :param check: if True, the road markings have to allow the lane change
+            :param lane_changes: number of lanes to change
+        """
+        if direction == 'left':
+            option = RoadOption.CHANGELANELEFT
+        elif direction == 'right':
+            option = RoadOption.CHANGELANERIGHT
+        else:
+            return []
+
+        key = (waypoint.road_id, waypoint.section_id, waypoint.lane_id)
+        if key not in self._lanes:
+            return None
+
+        plan = [(waypoint, RoadOption.LANEFOLLOW)]
+
+        # Same lane
+        same_lane = self._follow(key, waypoint.s, max(distance_same_lane, 0.1))
+        if same_lane is None:
+            return None
+        plan.extend((wp, RoadOption.LANEFOLLOW) for wp in same_lane)
+
+        # Lane change
+        step = max(lane_change_distance, 0.1) / lane_changes
+        s = plan[-1][0].s
+        for _ in range(lane_changes):
+            lane = self._lanes[key]
+            change_s = s + step if key[2] < 0 else s - step
+            if not self._contains(lane, change_s):
+                return None
+            i = self._bin(lane, change_s)
+            if check and not lane[direction][i]:
+                return []
+            key = lane[direction + '_lane']
+            if key is None:
+                return []
+            side_lane = self._lanes.get(key)
+            if side_lane is None:
+                return None
+            j = self._bin(side_lane, lane['s'][i])
+            plan.append((side_lane['waypoints'][j], option))
+            s = side_lane['s'][j]
+
+        # Other lane
+        other_lane = self._follow(key, s, max(distance_other_lane, 0.1))
+        if other_lane is None:
+            return None
+        plan.extend((wp, RoadOption.LANEFOLLOW) for wp in other_lane)
+
+        return plan
@@ -6,9 +6,10 @@
 """ This module contains a local planner to perform low-level waypoint following based on PID controllers. """
 
 from enum import IntEnum
-from collections import deque
 import random
 
+import numpy as np
+
 import carla
 from agents.navigation.controller import VehiclePIDController
 from agents.tools.misc import draw_waypoints, get_speed
@@ -28,6 +29,131 @@ class RoadOption(IntEnum):
     CHANGELANERIGHT = 6
 
 
+class WaypointQueue(object):
+    """
+    Queue of (carla.Waypoint, RoadOption) pairs, with the location and right vector of every
+    waypoint kept in NumPy arrays. Popped elements only move a head index, and the arrays
+    are compacted once the popped part is larger than the queued one.
+    """
+
+    # Number of waypoints checked at once by the searches that start at the head
+    _WINDOW = 32
+
+    def __init__(self, maxlen=10000):
+        """
+        :param maxlen: maximum number of waypoints the planner adds on its own
+        """
+        self.maxlen = maxlen
+        self._elements = []
+        self._xyz = np.zeros((64, 3))
+        self._right = np.zeros((64, 2))
+        self._head = 0
+
+    def __len__(self):
+        return len(self._elements) - self._head
+
+    def __iter__(self):
+        for i in range(self._head, len(self._elements)):
+            yield self._elements[i]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("WaypointQueue index out of range")
+        return self._elements[self._head + index]
+
+    def append(self, element):
+        """Adds a (carla.Waypoint, RoadOption) pair at the end of the queue"""
+        self.extend([element])
+
+    def extend(self, elements):
+        """Adds a list of (carla.Waypoint, RoadOption) pairs at the end of the queue"""
+        elements = list(elements)
+        if not elements:
+            return
+        if self._head > len(self) and self._head > 0:
+            self._compact()
+
+        start = len(self._elements)
+        end = start + len(elements)
+        if end > len(self._xyz):
+            capacity = max(end, 2 * len(self._xyz))
+            self._xyz = np.resize(self._xyz, (capacity, 3))
+            self._right = np.resize(self._right, (capacity, 2))
+
+        for i, (waypoint, _) in enumerate(elements, start):
+            transform = waypoint.transform
+            r_vec = transform.get_right_vector()
+            self._xyz[i] = (transform.location.x, transform.location.y, transform.location.z)
+            self._right[i] = (r_vec.x, r_vec.y)
+        self._elements.extend(elements)
+
+    def popleft(self, count=1):
+        """Removes the first count elements of the queue"""
+        self._head = min(self._head + count, len(self._elements))
+
+    def clear(self):
+        """Removes all the elements of the queue"""
+        self._elements = []
+        self._head = 0
+
+    def _compact(self):
+        size = len(self)
+        self._xyz[:size] = self._xyz[self._head:len(self._elements)]
+        self._right[:size] = self._right[self._head:len(self._elements)]
+        self._elements = self._elements[self._head:]
+        self._head = 0
+
+    def locations(self):
+        """Returns the (N, 3) array with the locations of the queued waypoints"""
+        return self._xyz[self._head:len(self._elements)]
+
+    def right_vectors(self):
+        """Returns the (N, 2) array with the right vectors of the queued waypoints"""
+        return self._right[self._head:len(self._elements)]
+
+    def _first_index(self, location, condition):
+        """
+        Index of the first queued waypoint whose distance to location meets the condition,
+        or the length of the queue if none does. Only the waypoints up to it are looked at.
+        """
+        xyz = (location.x, location.y, location.z)
+        size = len(self)
+        for start in range(0, size, self._WINDOW):
+            diff = self._xyz[self._head + start:self._head + min(start + self._WINDOW, size)] - xyz
+            matches = np.flatnonzero(condition(np.sqrt(np.einsum('ij,ij->i', diff, diff)), start))
+            if len(matches) > 0:
+                return start + int(matches[0])
+        return size
+
+    def count_passed(self, location, min_distance, last_min_distance):
+        """
+        Returns the number of waypoints at the head of the queue closer than min_distance to
+        the location. The last waypoint of the queue uses last_min_distance instead.
+
+            :param location: carla.Location of the vehicle
+        """
+        size = len(self)
+
+        def too_far(distances, start):
+            thresholds = np.full(len(distances), float(min_distance))
+            if start + len(distances) == size:
+                thresholds[-1] = last_min_distance
+            return distances >= thresholds
+
+        return self._first_index(location, too_far)
+
+    def count_within(self, location, max_distance):
+        """
+        Returns the number of waypoints at the head of the queue before the first one
+        that is further than max_distance from the location.
+
+            :param location: carla.Location
+        """
+        return self._first_index(location, lambda distances, start: distances > max_distance)
+
+
 class LocalPlanner(object):
     """
     LocalPlanner implements the basic behavior of following a
@@ -67,10 +193,11 @@ class LocalPlanner(object):
             self._map = self._world.get_map()
 
         self._vehicle_controller = None
+        self._perception = None
         self.target_waypoint = None
         self.target_road_option = None
 
-        self._waypoints_queue = deque(maxlen=10000)
+        self._waypoints_queue = WaypointQueue(maxlen=10000)
         self._min_waypoint_queue_length = 100
         self._stop_waypoint_creation = False
 
@@ -149,6 +276,15 @@ class LocalPlanner(object):
                   "Use 'follow_speed_limits' to deactivate this")
         self._target_speed = speed
 
+    def set_perception(self, perception):
+        """
+        Reads the location and speed of the vehicle from a shared WorldPerception
+
+        :param perception: WorldPerception updated every tick, None to query the vehicle again
+        :return:
+        """
+        self._perception = perception
+
     def follow_speed_limits(self, value=True):
         """
         Activates a flag that makes the max speed dynamically vary according to the spped limits
@@ -203,16 +339,10 @@ class LocalPlanner(object):
         if clean_queue:
             self._waypoints_queue.clear()
 
-        # Remake the waypoints queue if the new plan has a higher length than the queue
+        # Let the queue hold the whole plan, the planner won't add random waypoints past it
         new_plan_length = len(current_plan) + len(self._waypoints_queue)
-        if new_plan_length > self._waypoints_queue.maxlen:
-            new_waypoint_queue = deque(maxlen=new_plan_length)
-            for wp in self._waypoints_queue:
-                new_waypoint_queue.append(wp)
-            self._waypoints_queue = new_waypoint_queue
-
-        for elem in current_plan:
-            self._waypoints_queue.append(elem)
+        self._waypoints_queue.maxlen = max(self._waypoints_queue.maxlen, new_plan_length)
+        self._waypoints_queue.extend(current_plan)
 
         self._stop_waypoint_creation = stop_waypoint_creation
 
@@ -232,26 +362,18 @@ class LocalPlanner(object):
             self._compute_next_waypoints(k=self._min_waypoint_queue_length)
 
         # Purge the queue of obsolete waypoints
-        veh_location = self._vehicle.get_location()
-        vehicle_speed = get_speed(self._vehicle) / 3.6
+        if self._perception is not None and self._vehicle in self._perception:
+            veh_location = self._perception.get_location(self._vehicle)
+            vehicle_speed = self._perception.get_speed(self._vehicle) / 3.6
+        else:
+            veh_location = self._vehicle.get_location()
+            vehicle_speed = get_speed(self._vehicle) / 3.6
         self._min_distance = self._base_min_distance + self._distance_ratio * vehicle_speed
 
-        num_waypoint_removed = 0
-        for waypoint, _ in self._waypoints_queue:
-
-            if len(self._waypoints_queue) - num_waypoint_removed == 1:
-                min_distance = 1  # Don't remove the last waypoint until very close by
-            else:
-                min_distance = self._min_distance
-
-            if veh_location.distance(waypoint.transform.location) < min_distance:
-                num_waypoint_removed += 1
-            else:
-                break
-
+        # Don't remove the last waypoint until very close by
+        num_waypoint_removed = self._waypoints_queue.count_passed(veh_location, self._min_distance, 1)
         if num_waypoint_removed > 0:
-            for _ in range(num_waypoint_removed):
-                self._waypoints_queue.popleft()
+            self._waypoints_queue.popleft(num_waypoint_removed)
 
         # Get the target waypoint and move using the PID controllers. Stop if no target waypoint
         if len(self._waypoints_queue) == 0:
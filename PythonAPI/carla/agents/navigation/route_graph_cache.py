@@ -0,0 +1,251 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module stores the road graph built by the GlobalRoutePlanner on disk,
+so that later planners of the same map can skip the topology sampling.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import networkx as nx
+
+import carla
+from agents.navigation.local_planner import RoadOption
+
+
+# Distance that the s of a waypoint is moved to fall inside of its lane
+LANE_END_OFFSET = 0.01
+
+
+class LazyWaypoint(object):
+    """
+    Stand-in for a carla.Waypoint whose lane identifiers and location are known
+    on the client side. The actual waypoint is only queried from the map the first
+    time any other attribute is accessed.
+    """
+
+    __slots__ = ('_map', 'road_id', 'section_id', 'lane_id', 's', 'xyz', '_waypoint')
+
+    def __init__(self, wmap, road_id, section_id, lane_id, s, xyz):
+        self._map = wmap
+        self.road_id = road_id
+        self.section_id = section_id
+        self.lane_id = lane_id
+        self.s = s
+        self.xyz = xyz
+        self._waypoint = None
+
+    @property
+    def waypoint(self):
+        """Returns the carla.Waypoint, querying the map on first use"""
+        if self._waypoint is None:
+            self._waypoint = self._rehydrate()
+        return self._waypoint
+
+    def _rehydrate(self):
+        """
+        Queries the waypoint of the lane at s. The s of the lane ends can fall just outside of
+        the lane, so it is moved slightly inwards before looking it up by its location. A waypoint
+        of another lane is never returned, as the graph edges depend on it.
+        """
+        for offset in (0.0, -LANE_END_OFFSET, LANE_END_OFFSET):
+            waypoint = self._map.get_waypoint_xodr(self.road_id, self.lane_id, self.s + offset)
+            if waypoint is not None:
+                return waypoint
+
+        waypoint = self._map.get_waypoint(carla.Location(*self.xyz), lane_type=carla.LaneType.Any)
+        if waypoint is None or (waypoint.road_id, waypoint.lane_id) != (self.road_id, self.lane_id):
+            raise RuntimeError("Waypoint of road {} lane {} at s {} not found in the map, delete the route graph "
+                               "cache if the map has changed".format(self.road_id, self.lane_id, self.s))
+        return waypoint
+
+    def __getattr__(self, name):
+        return getattr(self.waypoint, name)
+
+
+def materialize(waypoint):
+    """
+    Returns the carla.Waypoint behind a LazyWaypoint, or the waypoint itself otherwise
+
+        :param waypoint: carla.Waypoint or LazyWaypoint
+    """
+    if isinstance(waypoint, LazyWaypoint):
+        return waypoint.waypoint
+    return waypoint
+
+
+def route_graph_cache_file(cache_dir, wmap, sampling_resolution):
+    """
+    Returns the path of the cache file of a map, keyed by the hash of its OpenDRIVE
+    content and the sampling resolution.
+
+        :param cache_dir: folder where the graphs are stored
+        :param wmap: carla.Map
+        :param sampling_resolution: sampling resolution of the planner
+    """
+    opendrive_hash = hashlib.sha1(wmap.to_opendrive().encode('utf-8')).hexdigest()[:16]
+    map_name = wmap.name.split('/')[-1]
+    return os.path.join(cache_dir, "route_graph_{}_{}_{}.npz".format(
+        map_name, opendrive_hash, str(float(sampling_resolution)).replace('.', '_')))
+
+
+def _waypoint_key(waypoint):
+    """Returns the (road, section, lane), s and xyz of a waypoint"""
+    if isinstance(waypoint, LazyWaypoint):
+        return (waypoint.road_id, waypoint.section_id, waypoint.lane_id), waypoint.s, waypoint.xyz
+    location = waypoint.transform.location
+    return (waypoint.road_id, waypoint.section_id, waypoint.lane_id), waypoint.s, \
+        (location.x, location.y, location.z)
+
+
+def _vector_or_nan(vec):
+    if vec is None:
+        return [np.nan, np.nan, np.nan]
+    return list(vec)
+
+
+def _nan_to_none(vec):
+    if np.isnan(vec).any():
+        return None
+    return vec
+
+
+def save_route_graph(file_name, graph, road_id_to_edge):
+    """
+    Serializes the road graph into a compressed .npz file. Waypoints are stored as their
+    (road, section, lane) ids, their s and their location.
+
+        :param file_name: output file
+        :param graph: networkx.DiGraph of the GlobalRoutePlanner
+        :param road_id_to_edge: road_id -> section_id -> lane_id -> edge dictionary
+    """
+    node_ids = list(graph.nodes)
+    node_xyz = [graph.nodes[n]['vertex'] for n in node_ids]
+
+    edge_nodes, edge_type, edge_length, edge_intersection, edge_vectors = [], [], [], [], []
+    end_ids, end_s, end_xyz = [], [], []
+    path_offsets, path_ids, path_s, path_xyz = [0], [], [], []
+
+    for n1, n2, edge in graph.edges(data=True):
+        edge_nodes.append([n1, n2])
+        edge_type.append(int(edge['type']))
+        edge_length.append(edge['length'])
+        edge_intersection.append(bool(edge['intersection']))
+        edge_vectors.append([
+            _vector_or_nan(edge.get('entry_vector')),
+            _vector_or_nan(edge.get('exit_vector')),
+            _vector_or_nan(edge.get('net_vector'))])
+
+        ids, s_values, xyz_values = [], [], []
+        for waypoint in (edge['entry_waypoint'], edge['exit_waypoint']):
+            ids_, s_, xyz_ = _waypoint_key(waypoint)
+            ids.append(ids_)
+            s_values.append(s_)
+            xyz_values.append(xyz_)
+        end_ids.append(ids)
+        end_s.append(s_values)
+        end_xyz.append(xyz_values)
+
+        for waypoint in edge['path']:
+            ids_, s_, xyz_ = _waypoint_key(waypoint)
+            path_ids.append(ids_)
+            path_s.append(s_)
+            path_xyz.append(xyz_)
+        path_offsets.append(len(path_ids))
+
+    road_edges = []
+    for road_id, sections in road_id_to_edge.items():
+        for section_id, lanes in sections.items():
+            for lane_id, (n1, n2) in lanes.items():
+                road_edges.append([road_id, section_id, lane_id, n1, n2])
+
+    directory = os.path.dirname(file_name)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    # Write to a temporary file first so that concurrent planners never read a partial graph
+    tmp_file_name = "{}.{}.tmp".format(file_name, os.getpid())
+    with open(tmp_file_name, 'wb') as cache_file:
+        np.savez_compressed(
+            cache_file,
+            node_ids=np.array(node_ids, dtype=np.int64),
+            node_xyz=np.array(node_xyz, dtype=np.float64).reshape(-1, 3),
+            edge_nodes=np.array(edge_nodes, dtype=np.int64).reshape(-1, 2),
+            edge_type=np.array(edge_type, dtype=np.int64),
+            edge_length=np.array(edge_length, dtype=np.float64),
+            edge_intersection=np.array(edge_intersection, dtype=bool),
+            edge_vectors=np.array(edge_vectors, dtype=np.float64).reshape(-1, 3, 3),
+            end_ids=np.array(end_ids, dtype=np.int64).reshape(-1, 2, 3),
+            end_s=np.array(end_s, dtype=np.float64).reshape(-1, 2),
+            end_xyz=np.array(end_xyz, dtype=np.float64).reshape(-1, 2, 3),
+            path_offsets=np.array(path_offsets, dtype=np.int64),
+            path_ids=np.array(path_ids, dtype=np.int64).reshape(-1, 3),
+            path_s=np.array(path_s, dtype=np.float64),
+            path_xyz=np.array(path_xyz, dtype=np.float64).reshape(-1, 3),
+            road_edges=np.array(road_edges, dtype=np.int64).reshape(-1, 5))
+    os.replace(tmp_file_name, file_name)
+
+
+def load_route_graph(file_name, wmap):
+    """
+    Loads a road graph stored by save_route_graph. All the waypoints of the graph
+    are LazyWaypoints, so no server call is done until a route touches them.
+
+        :param file_name: .npz file
+        :param wmap: carla.Map used to rehydrate the waypoints
+        :return: tuple (graph, id_map, road_id_to_edge)
+    """
+    data = np.load(file_name)
+
+    def lazy(ids, s, xyz):
+        return LazyWaypoint(wmap, ids[0], ids[1], ids[2], s, tuple(xyz))
+
+    graph = nx.DiGraph()
+    id_map = dict()
+    for node_id, xyz in zip(data['node_ids'].tolist(), data['node_xyz'].tolist()):
+        vertex = tuple(xyz)
+        graph.add_node(node_id, vertex=vertex)
+        if node_id >= 0:
+            id_map[vertex] = node_id
+
+    # Plain lists are much faster to index than arrays when building one object per waypoint
+    path_offsets = data['path_offsets'].tolist()
+    path_ids, path_s, path_xyz = data['path_ids'].tolist(), data['path_s'].tolist(), data['path_xyz'].tolist()
+    end_ids, end_s, end_xyz = data['end_ids'].tolist(), data['end_s'].tolist(), data['end_xyz'].tolist()
+    edge_type, edge_length = data['edge_type'].tolist(), data['edge_length'].tolist()
+    edge_intersection = data['edge_intersection'].tolist()
+    edge_vectors = data['edge_vectors']
+
+    for i, (n1, n2) in enumerate(data['edge_nodes'].tolist()):
+        road_option = RoadOption(edge_type[i])
+        length = edge_length[i]
+        path = [lazy(path_ids[j], path_s[j], path_xyz[j]) for j in range(path_offsets[i], path_offsets[i + 1])]
+        entry_wp = lazy(end_ids[i][0], end_s[i][0], end_xyz[i][0])
+        exit_wp = lazy(end_ids[i][1], end_s[i][1], end_xyz[i][1])
+        entry_vector = _nan_to_none(edge_vectors[i, 0])
+        exit_vector = _nan_to_none(edge_vectors[i, 1])
+        net_vector = _nan_to_none(edge_vectors[i, 2])
+
+        if road_option in (RoadOption.CHANGELANELEFT, RoadOption.CHANGELANERIGHT):
+            graph.add_edge(
+                n1, n2, entry_waypoint=entry_wp, exit_waypoint=exit_wp,
+                intersection=edge_intersection[i], exit_vector=exit_vector,
+                path=path, length=length, type=road_option, change_waypoint=exit_wp)
+        else:
+            graph.add_edge(
+                n1, n2, length=length, path=path,
+                entry_waypoint=entry_wp, exit_waypoint=exit_wp,
+                entry_vector=entry_vector, exit_vector=exit_vector,
+                net_vector=None if net_vector is None else net_vector.tolist(),
+                intersection=edge_intersection[i], type=road_option)
+
+    road_id_to_edge = dict()
+    for road_id, section_id, lane_id, n1, n2 in data['road_edges'].tolist():
+        road_id_to_edge.setdefault(road_id, dict()).setdefault(section_id, dict())[lane_id] = (n1, n2)
+
+    return graph, id_map, road_id_to_edge
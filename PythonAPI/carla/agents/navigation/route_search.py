@@ -0,0 +1,173 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a compact road graph and the path searches used by the
+GlobalRoutePlanner as an alternative to the networkx ones.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappop
+from itertools import count
+
+import numpy as np
+import networkx as nx
+
+
+class CSRRoadGraph(object):
+    """
+    Road graph stored as compressed sparse row arrays:
+
+    - node_ids (N,): original id of each node
+    - xyz (N, 3): position of each node
+    - indptr (N+1,): the successors of node i are indices[indptr[i]:indptr[i+1]]
+    - indices (E,): index of the successor node of each edge
+    - weights (E,): length of each edge
+
+    The successors keep the order of the networkx graph, so the searches explore
+    the nodes in the same order as their networkx counterparts.
+    """
+
+    def __init__(self, graph, weight='length'):
+        """
+            :param graph: networkx.DiGraph with a 'vertex' (x, y, z) attribute per node
+            :param weight: edge attribute used as the edge length
+        """
+        node_ids = list(graph.nodes)
+        self._index = {node: i for i, node in enumerate(node_ids)}
+
+        indptr = [0]
+        indices = []
+        weights = []
+        for node in node_ids:
+            for neighbor, edge in graph.succ[node].items():
+                indices.append(self._index[neighbor])
+                weights.append(edge[weight])
+            indptr.append(len(indices))
+
+        self.node_ids = np.array(node_ids, dtype=np.int64)
+        self.xyz = np.array([graph.nodes[n]['vertex'] for n in node_ids], dtype=np.float64).reshape(-1, 3)
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+
+        # The search loops run in Python, where lists index faster than arrays
+        self._node_list = node_ids
+        self._indptr_list = indptr
+        self._indices_list = indices
+        self._weights_list = self.weights.tolist()
+
+    def __len__(self):
+        return len(self._node_list)
+
+    def index(self, node):
+        """Returns the CSR index of a node id"""
+        try:
+            return self._index[node]
+        except KeyError:
+            raise nx.NodeNotFound("Node {} not in the road graph".format(node))
+
+    def heuristic_table(self, target):
+        """
+        Euclidean distance from every node to the target, computed at once.
+
+            :param target: node id
+        """
+        return np.linalg.norm(self.xyz - self.xyz[self.index(target)], axis=1).tolist()
+
+    def astar(self, source, target):
+        """
+        A* search with euclidean distance heuristic, following the same expansion and
+        tie-breaking rules as networkx.astar_path.
+
+            :param source: node id of the start
+            :param target: node id of the goal
+            :return: list of node ids from source to target
+        """
+        src = self.index(source)
+        dst = self.index(target)
+        heuristic = self.heuristic_table(target)
+        indptr, indices, weights = self._indptr_list, self._indices_list, self._weights_list
+
+        counter = count()
+        queue = [(0, next(counter), src, 0, None)]
+        enqueued = {}
+        explored = {}
+
+        while queue:
+            _, __, current, dist, parent = heappop(queue)
+
+            if current == dst:
+                path = [current]
+                node = parent
+                while node is not None:
+                    path.append(node)
+                    node = explored[node]
+                path.reverse()
+                return [self._node_list[i] for i in path]
+
+            if current in explored:
+                # Do not override the parent of the starting node
+                if explored[current] is None:
+                    continue
+                # Skip bad paths that were enqueued before finding a better one
+                qcost, _ = enqueued[current]
+                if qcost < dist:
+                    continue
+
+            explored[current] = parent
+
+            for k in range(indptr[current], indptr[current + 1]):
+                neighbor = indices[k]
+                ncost = dist + weights[k]
+                if neighbor in enqueued:
+                    qcost, h = enqueued[neighbor]
+                    if qcost <= ncost:
+                        continue
+                else:
+                    h = heuristic[neighbor]
+                enqueued[neighbor] = ncost, h
+                heappush(queue, (ncost + h, next(counter), neighbor, ncost, current))
+
+        raise nx.NetworkXNoPath("Node {} not reachable from {}".format(target, source))
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    """Stores the graph once per worker process instead of sending it with every task"""
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _astar_or_none(graph, pair):
+    try:
+        return graph.astar(*pair)
+    except nx.NetworkXNoPath:
+        return None
+
+
+def _worker_astar(pair):
+    return _astar_or_none(_worker_graph, pair)
+
+
+def astar_routes(graph, pairs, processes=None):
+    """
+    Computes the A* routes for many (source, target) pairs, searching every distinct pair once.
+    The routes are the same returned by GlobalRoutePlanner.trace_route for the same edges.
+
+        :param graph: CSRRoadGraph
+        :param pairs: list of (source, target) node id tuples
+        :param processes: if given, the searches are done by a pool of this many processes
+        :return: dictionary (source, target) -> list of node ids, or None if the target is unreachable
+    """
+    pairs = list(OrderedDict.fromkeys(pairs))
+    if not processes or len(pairs) < 2:
+        return {pair: _astar_or_none(graph, pair) for pair in pairs}
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(graph,)) as executor:
+        return dict(zip(pairs, executor.map(_worker_astar, pairs)))
@@ -0,0 +1,138 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module samples the lanes of a map with a single bulk query, to replace
+the step by step waypoint.next() walks used to follow the topology segments.
+"""
+
+import numpy as np
+
+
+class TopologySampler(object):
+    """
+    Waypoints of all the driving lanes of a map, as returned by one call to
+    carla.Map.generate_waypoints. The samples are grouped by (road_id, section_id, lane_id)
+    and sorted by s, and every lane is exposed as NumPy arrays of its s and locations.
+    The Python lists of waypoints are only built for the lanes that ask for them.
+    """
+
+    def __init__(self, wmap, resolution):
+        """
+            :param wmap: carla.Map to sample
+            :param resolution: distance between the samples of a lane
+        """
+        self.resolution = resolution
+        self._waypoints = wmap.generate_waypoints(resolution)
+
+        keys = np.array([(w.road_id, w.section_id, w.lane_id) for w in self._waypoints],
+                        dtype=np.int64).reshape(-1, 3)
+        s = np.array([w.s for w in self._waypoints], dtype=np.float64)
+        xyz = np.array([(w.transform.location.x, w.transform.location.y, w.transform.location.z)
+                        for w in self._waypoints], dtype=np.float64).reshape(-1, 3)
+
+        order = np.lexsort((s, keys[:, 2], keys[:, 1], keys[:, 0]))
+        keys, self._s, self._xyz = keys[order], s[order], xyz[order]
+        self._order = order
+
+        # Every lane is a contiguous slice of the sorted samples
+        self._lanes = dict()
+        self._sections = dict()
+        if len(keys) == 0:
+            return
+        starts = np.concatenate(([0], np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1))
+        ends = np.append(starts[1:], len(keys))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            road_id, section_id, lane_id = keys[start].tolist()
+            self._lanes[(road_id, section_id, lane_id)] = (start, end)
+            self._sections.setdefault(road_id, set()).add(section_id)
+
+    def __len__(self):
+        return len(self._waypoints)
+
+    def lanes(self):
+        """Returns the (road_id, section_id, lane_id) keys of the sampled lanes"""
+        return list(self._lanes)
+
+    def lane_polyline(self, road_id, section_id, lane_id):
+        """
+        Returns the s and (x, y, z) arrays of a lane sorted by s, None if the lane has no samples
+
+            :param road_id: road id of the lane
+            :param section_id: lane section id of the lane
+            :param lane_id: lane id of the lane
+        """
+        bounds = self._lanes.get((road_id, section_id, lane_id))
+        if bounds is None:
+            return None
+        start, end = bounds
+        return self._s[start:end], self._xyz[start:end]
+
+    def lane_waypoints(self, road_id, section_id, lane_id, reverse=False):
+        """
+        Returns the list of carla.Waypoint of a lane sorted by s, empty if the lane has no samples
+
+            :param road_id: road id of the lane
+            :param section_id: lane section id of the lane
+            :param lane_id: lane id of the lane
+            :param reverse: if True, the waypoints are sorted by decreasing s
+        """
+        start, end = self._lanes.get((road_id, section_id, lane_id), (0, 0))
+        indices = self._order[start:end]
+        if reverse:
+            indices = indices[::-1]
+        return [self._waypoints[i] for i in indices]
+
+    def segment_path(self, entry_waypoint, exit_waypoint, min_exit_distance=0.0):
+        """
+        Returns the samples of the lane of a topology segment in driving direction, as
+        the walk with waypoint.next() from its entry would, or None if there are none.
+        The lane is followed through the sections of its road until its end, the exit
+        itself is at the start of the successor road.
+
+            :param entry_waypoint: carla.Waypoint at the start of the segment
+            :param exit_waypoint: carla.Waypoint at the end of the segment
+            :param min_exit_distance: the path stops at the first sample closer than this to the exit location
+        """
+        location = exit_waypoint.transform.location
+        exit_xyz = np.array([location.x, location.y, location.z])
+        road_id = entry_waypoint.road_id
+        # The samples of a road share the same s grid, so the walk samples are at most half
+        # the resolution away from them. The ones closer than that to the entry are skipped.
+        margin = 0.5 * self.resolution
+
+        path = []
+        current, key = entry_waypoint, (road_id, entry_waypoint.section_id, entry_waypoint.lane_id)
+        visited = set()
+        while key in self._lanes and key not in visited:
+            visited.add(key)
+            start, end = self._lanes[key]
+            s = self._s[start:end]
+            if key[2] < 0:
+                indices = np.flatnonzero(s > current.s + margin)
+            else:
+                indices = np.flatnonzero(s < current.s - margin)[::-1]
+
+            reached_exit = False
+            if min_exit_distance > 0.0 and len(indices) > 0:
+                diff = self._xyz[start + indices] - exit_xyz
+                near = np.flatnonzero(np.einsum('ij,ij->i', diff, diff) <= min_exit_distance ** 2)
+                if len(near) > 0:
+                    indices = indices[:near[0]]
+                    reached_exit = True
+
+            path.extend(self._waypoints[i] for i in self._order[start + indices])
+            if path:
+                current = path[-1]
+            if reached_exit or len(self._sections.get(road_id, ())) < 2:
+                break
+
+            # Follow the lane into the next section of the road, its id may change there
+            next_waypoints = current.next(self.resolution)
+            if not next_waypoints or next_waypoints[0].road_id != road_id:
+                break
+            key = (road_id, next_waypoints[0].section_id, next_waypoints[0].lane_id)
+
+        return path if path else None
@@ -0,0 +1,82 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides an index of the traffic light trigger waypoints of a map,
+computed once and shared by all the agents.
+"""
+
+import numpy as np
+
+from agents.tools.misc import get_trafficlight_trigger_location
+
+
+class TrafficLightIndex(object):
+    """
+    Trigger waypoints of all the traffic lights of the world, grouped by road and lane.
+    The trigger locations and forward vectors are stored as (N, 3) arrays, so that the
+    lights of a road are filtered by distance and direction at once.
+    """
+
+    def __init__(self, world, map_inst=None):
+        """
+            :param world: carla.World
+            :param map_inst: carla.Map instance to avoid the expensive call of getting it.
+        """
+        wmap = map_inst if map_inst else world.get_map()
+
+        self.traffic_lights = list(world.get_actors().filter("*traffic_light*"))
+        self.trigger_waypoints = []
+        for traffic_light in self.traffic_lights:
+            trigger_location = get_trafficlight_trigger_location(traffic_light)
+            self.trigger_waypoints.append(wmap.get_waypoint(trigger_location))
+
+        locations = [wp.transform.location for wp in self.trigger_waypoints]
+        forwards = [wp.transform.get_forward_vector() for wp in self.trigger_waypoints]
+        self.locations = np.array([(l.x, l.y, l.z) for l in locations], dtype=np.float64).reshape(-1, 3)
+        self.forward_vectors = np.array([(f.x, f.y, f.z) for f in forwards], dtype=np.float64).reshape(-1, 3)
+        self.road_ids = np.array([wp.road_id for wp in self.trigger_waypoints], dtype=np.int64)
+        self.lane_ids = np.array([wp.lane_id for wp in self.trigger_waypoints], dtype=np.int64)
+
+        self._by_road = dict()
+        self._by_lane = dict()
+        for i, (road_id, lane_id) in enumerate(zip(self.road_ids.tolist(), self.lane_ids.tolist())):
+            self._by_road.setdefault(road_id, []).append(i)
+            self._by_lane.setdefault((road_id, lane_id), []).append(i)
+        self._by_road = {k: np.array(v, dtype=np.int64) for k, v in self._by_road.items()}
+        self._by_lane = {k: np.array(v, dtype=np.int64) for k, v in self._by_lane.items()}
+
+    def __len__(self):
+        return len(self.traffic_lights)
+
+    def rows(self, road_id, lane_id=None):
+        """
+        Returns the rows of the lights whose trigger is on a road, or on one of its lanes
+
+            :param road_id: road id
+            :param lane_id: lane id, None for all the lanes of the road
+        """
+        if lane_id is None:
+            return self._by_road.get(road_id, np.zeros(0, dtype=np.int64))
+        return self._by_lane.get((road_id, lane_id), np.zeros(0, dtype=np.int64))
+
+    def candidates(self, waypoint, location, max_distance):
+        """
+        Returns the (carla.TrafficLight, trigger carla.Waypoint) pairs whose trigger is on the road
+        of a waypoint, facing its direction and closer than max_distance to a location, in world order.
+
+            :param waypoint: carla.Waypoint of the ego vehicle
+            :param location: carla.Location of the ego vehicle
+            :param max_distance: max distance for traffic lights to be considered relevant
+        """
+        rows = self.rows(waypoint.road_id)
+        if len(rows) == 0:
+            return []
+
+        forward = waypoint.transform.get_forward_vector()
+        diff = self.locations[rows] - (location.x, location.y, location.z)
+        close = np.einsum('ij,ij->i', diff, diff) <= max_distance ** 2
+        ahead = self.forward_vectors[rows].dot((forward.x, forward.y, forward.z)) >= 0
+        return [(self.traffic_lights[i], self.trigger_waypoints[i]) for i in rows[close & ahead].tolist()]
@@ -0,0 +1,113 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a nearest neighbour index over the waypoints of the
+GlobalRoutePlanner graph, to localize locations on the client side.
+"""
+
+import numpy as np
+
+from agents.navigation.local_planner import RoadOption
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def waypoint_xyz(waypoint):
+    """
+    Returns the location of a carla.Waypoint or LazyWaypoint as an (x, y, z) tuple
+
+        :param waypoint: carla.Waypoint or LazyWaypoint
+    """
+    xyz = getattr(waypoint, 'xyz', None)
+    if xyz is not None:
+        return xyz
+    location = waypoint.transform.location
+    return (location.x, location.y, location.z)
+
+
+def closest_index(xyz, points):
+    """
+    Returns the index of the point closest to xyz, -1 if there are no points.
+    Ties are resolved in favor of the first point, as a linear scan would.
+
+        :param xyz: (x, y, z) of the reference location
+        :param points: (N, 3) array
+    """
+    if len(points) == 0:
+        return -1
+    diff = points - np.asarray(xyz, dtype=np.float64)
+    return int(np.argmin(np.einsum('ij,ij->i', diff, diff)))
+
+
+class WaypointIndex(object):
+    """
+    Map-wide index over the lanes stored in the edges of a road graph. Every waypoint of an
+    edge starts a segment of its lane, up to the next waypoint of the edge, and locations
+    are matched to the closest segment, as the map projects them onto the closest lane.
+    A scipy KD-tree is used to find the candidate segments when scipy is installed,
+    otherwise the queries fall back to a vectorized scan of all the points.
+    """
+
+    # Number of nearest waypoints whose segments are checked by every query
+    CANDIDATES = 16
+
+    def __init__(self, graph):
+        """
+            :param graph: networkx.DiGraph of the GlobalRoutePlanner, with the 'waypoints_xyz'
+                array of every edge
+        """
+        points, ends, next_indices = [], [], []
+        self._waypoints = []
+        for _, _, edge in graph.edges(data=True):
+            # Lane change edges only link waypoints already stored by the lane follow ones
+            if edge['type'] in (RoadOption.CHANGELANELEFT, RoadOption.CHANGELANERIGHT):
+                continue
+            # The exit of an edge is the entry of the next one, keep only the latter
+            waypoints = [edge['entry_waypoint']] + edge['path']
+            first = len(self._waypoints)
+            self._waypoints.extend(waypoints)
+            points.append(edge['waypoints_xyz'][:-1])
+            ends.append(edge['waypoints_xyz'][1:])
+            # Index of the waypoint at the end of every segment, -1 for the exit of the edge
+            next_index = np.arange(first + 1, first + len(waypoints) + 1)
+            next_index[-1] = -1
+            next_indices.append(next_index)
+
+        self.points = np.concatenate(points) if points else np.zeros((0, 3))
+        self._ends = np.concatenate(ends) if ends else np.zeros((0, 3))
+        self._next_index = np.concatenate(next_indices) if next_indices else np.zeros(0, dtype=np.int64)
+        self._tree = cKDTree(self.points) if cKDTree is not None and len(self.points) > 0 else None
+
+    def query(self, location):
+        """
+        Returns the graph waypoint of the lane closest to a location, the one of its lane segment
+        closest to the projection of the location, and the distance from the location to the lane
+
+            :param location: carla.Location
+        """
+        xyz = np.array([location.x, location.y, location.z], dtype=np.float64)
+        k = min(self.CANDIDATES, len(self.points))
+        if self._tree is not None:
+            candidates = np.atleast_1d(self._tree.query(xyz, k)[1])
+        else:
+            diff = self.points - xyz
+            candidates = np.argsort(np.einsum('ij,ij->i', diff, diff), kind='stable')[:k]
+
+        # Projection of the location onto the segments of the candidates
+        starts = self.points[candidates]
+        segments = self._ends[candidates] - starts
+        lengths = np.maximum(np.einsum('ij,ij->i', segments, segments), 1e-12)
+        t = np.clip(np.einsum('ij,ij->i', xyz - starts, segments) / lengths, 0.0, 1.0)
+        distances = np.linalg.norm(starts + t[:, None] * segments - xyz, axis=1)
+
+        best = int(np.argmin(distances))
+        index = int(candidates[best])
+        if t[best] > 0.5 and self._next_index[index] >= 0:
+            index = int(self._next_index[index])
+        return self._waypoints[index], float(distances[best])
@@ -0,0 +1,202 @@
+# Copyright (c) # Copyright (c) 2018-2020 CVC.
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+This module provides a snapshot of the dynamic actors of the world, taken once
+per tick and shared by all the agents instead of each one querying the server.
+"""
+
+import math
+
+import numpy as np
+
+import carla
+
+
+class WorldPerception(object):
+    """
+    Positions, headings, velocities and bounding box extents of the vehicles, walkers and
+    traffic lights of the world at one frame, stored as NumPy arrays indexed like the actor lists.
+    The map waypoints of the actors are computed on demand and shared until the next update.
+    """
+
+    def __init__(self, world, map_inst=None):
+        """
+            :param world: carla.World
+            :param map_inst: carla.Map instance to avoid the expensive call of getting it.
+        """
+        self._world = world
+        self._map = map_inst if map_inst else world.get_map()
+        self._actors = dict()
+
+        self.frame = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.actors = []
+        self.locations = np.zeros((0, 3))
+        self.rotations = np.zeros((0, 3))
+        self.velocities = np.zeros((0, 3))
+        self.extents = np.zeros((0, 3))
+        self.speeds = np.zeros(0)
+
+        self.vehicles = np.zeros(0, dtype=np.int64)
+        self.walkers = np.zeros(0, dtype=np.int64)
+        self.traffic_lights = np.zeros(0, dtype=np.int64)
+        self.traffic_light_states = dict()
+
+        self._index = dict()
+        self._waypoints = dict()
+
+        self.update()
+
+    def update(self, snapshot=None):
+        """
+        Refreshes the perception with the state of a frame. The actor list is only queried
+        when actors appear in the snapshot that were not seen before.
+
+            :param snapshot: carla.WorldSnapshot, the current one of the world if not given
+        """
+        if snapshot is None:
+            snapshot = self._world.get_snapshot()
+
+        actor_snapshots = [a for a in snapshot]
+        ids = [a.id for a in actor_snapshots]
+        new_ids = [i for i in ids if i not in self._actors]
+        if new_ids:
+            for actor in self._world.get_actors(new_ids):
+                self._actors[actor.id] = actor
+        alive = set(ids)
+        for actor_id in [i for i in self._actors if i not in alive]:
+            del self._actors[actor_id]
+
+        actors, rows, vehicles, walkers, traffic_lights = [], [], [], [], []
+        for actor_snapshot in actor_snapshots:
+            actor = self._actors.get(actor_snapshot.id)
+            if actor is None:
+                continue
+            type_id = actor.type_id
+            if type_id.startswith('vehicle.'):
+                vehicles.append(len(actors))
+            elif type_id.startswith('walker.pedestrian'):
+                walkers.append(len(actors))
+            elif type_id.startswith('traffic.traffic_light'):
+                traffic_lights.append(len(actors))
+            else:
+                continue
+
+            transform = actor_snapshot.get_transform()
+            velocity = actor_snapshot.get_velocity()
+            extent = actor.bounding_box.extent
+            rows.append((
+                transform.location.x, transform.location.y, transform.location.z,
+                transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll,
+                velocity.x, velocity.y, velocity.z,
+                extent.x, extent.y, extent.z))
+            actors.append(actor)
+
+        data = np.array(rows, dtype=np.float64).reshape(-1, 12)
+        self.frame = snapshot.frame
+        self.actors = actors
+        self.ids = np.array([actor.id for actor in actors], dtype=np.int64)
+        self.locations = data[:, 0:3]
+        self.rotations = data[:, 3:6]
+        self.velocities = data[:, 6:9]
+        self.extents = data[:, 9:12]
+        self.speeds = np.linalg.norm(self.velocities, axis=1)
+
+        self.vehicles = np.array(vehicles, dtype=np.int64)
+        self.walkers = np.array(walkers, dtype=np.int64)
+        self.traffic_lights = np.array(traffic_lights, dtype=np.int64)
+        self.traffic_light_states = {actors[i].id: actors[i].state for i in traffic_lights}
+
+        self._index = {actor.id: i for i, actor in enumerate(actors)}
+        self._waypoints = dict()
+
+    def __contains__(self, actor):
+        return actor.id in self._index
+
+    def _row(self, actor):
+        try:
+            return self._index[actor.id]
+        except KeyError:
+            raise KeyError("Actor {} is not in the perception of frame {}".format(actor.id, self.frame))
+
+    def get_rows(self, actors):
+        """Returns the rows of the perception arrays that hold a list of actors"""
+        return np.array([self._row(actor) for actor in actors], dtype=np.int64)
+
+    def get_location(self, actor):
+        """Returns a new carla.Location of an actor"""
+        x, y, z = self.locations[self._row(actor)].tolist()
+        return carla.Location(x=x, y=y, z=z)
+
+    def get_transform(self, actor):
+        """Returns a new carla.Transform of an actor, safe to modify"""
+        i = self._row(actor)
+        x, y, z = self.locations[i].tolist()
+        pitch, yaw, roll = self.rotations[i].tolist()
+        return carla.Transform(carla.Location(x=x, y=y, z=z), carla.Rotation(pitch=pitch, yaw=yaw, roll=roll))
+
+    def get_velocity(self, actor):
+        """Returns a new carla.Vector3D with the velocity of an actor"""
+        x, y, z = self.velocities[self._row(actor)].tolist()
+        return carla.Vector3D(x=x, y=y, z=z)
+
+    def get_speed(self, actor):
+        """Returns the speed of an actor in Km/h"""
+        return 3.6 * float(self.speeds[self._row(actor)])
+
+    def get_traffic_light_state(self, traffic_light):
+        """Returns the carla.TrafficLightState of a traffic light at the perception frame"""
+        return self.traffic_light_states.get(traffic_light.id, traffic_light.state)
+
+    def get_waypoint(self, actor, lane_type=carla.LaneType.Driving):
+        """
+        Returns the map waypoint of an actor, computed once per frame and lane type
+
+            :param actor: carla.Actor of the perception
+            :param lane_type: carla.LaneType used to project the location
+        """
+        key = (actor.id, lane_type)
+        waypoint = self._waypoints.get(key)
+        if waypoint is None:
+            waypoint = self._map.get_waypoint(self.get_location(actor), lane_type=lane_type)
+            self._waypoints[key] = waypoint
+        return waypoint
+
+    def get_heading(self, actor):
+        """Returns the (x, y) unit forward vector of an actor"""
+        yaw = math.radians(self.rotations[self._row(actor), 1])
+        return math.cos(yaw), math.sin(yaw)
+
+    def actors_near(self, indices, location, max_distance, exclude=None):
+        """
+        Returns the actors among the given rows that are within a distance of a location,
+        sorted by distance, with a single vectorized distance computation.
+
+            :param indices: rows of the actors, e.g. self.vehicles or self.walkers
+            :param location: carla.Location
+            :param max_distance: radius of the search in meters
+            :param exclude: carla.Actor to leave out, usually the ego vehicle
+        """
+        if len(indices) == 0:
+            return []
+        diff = self.locations[indices] - (location.x, location.y, location.z)
+        sq_distances = np.einsum('ij,ij->i', diff, diff)
+        close = np.flatnonzero(sq_distances <= max_distance ** 2)
+        close = close[np.argsort(sq_distances[close], kind='stable')]
+        exclude_id = exclude.id if exclude is not None else None
+        return [self.actors[i] for i in indices[close].tolist() if self.actors[i].id != exclude_id]
+
+    def vehicles_near(self, location, max_distance, exclude=None):
+        """Returns the vehicles within a distance of a location, sorted by distance"""
+        return self.actors_near(self.vehicles, location, max_distance, exclude)
+
+    def walkers_near(self, location, max_distance, exclude=None):
+        """Returns the walkers within a distance of a location, sorted by distance"""
+        return self.actors_near(self.walkers, location, max_distance, exclude)
+
+    def get_traffic_lights(self):
+        """Returns the list of carla.TrafficLight of the perception"""
+        return [self.actors[i] for i in self.traffic_lights.tolist()]
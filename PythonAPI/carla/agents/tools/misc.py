@@ -169,3 +169,184 @@ def positive(num):
         :param num: value to check
     """
     return num if num > 0.0 else 0.0
+
+
+def get_speeds(velocities):
+    """
+    Compute the speeds in Km/h of several velocities at once, as get_speed does for one vehicle.
+
+        :param velocities: (N, 3) array with the velocities in m/s
+        :return: (N,) array with the speeds in Km/h
+    """
+    velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 3)
+    return 3.6 * np.sqrt(np.einsum('ij,ij->i', velocities, velocities))
+
+
+def compute_distances(locations, location):
+    """
+    Euclidean distances between several 3D points and a reference one, as compute_distance does for one
+
+        :param locations: (N, 3) array with the points
+        :param location: carla.Location or (3,) array with the reference point
+        :return: (N,) array with the distances
+    """
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+    diff = locations - _as_xyz(location)
+    return np.sqrt(np.einsum('ij,ij->i', diff, diff)) + np.finfo(float).eps
+
+
+def compute_forward_vectors(rotations):
+    """
+    Forward vectors of several rotations, as carla.Rotation.get_forward_vector does for one
+
+        :param rotations: (N, 3) array with the pitch, yaw and roll of each rotation, in degrees
+        :return: (N, 3) array with the unit forward vectors
+    """
+    rotations = np.radians(np.asarray(rotations, dtype=np.float64).reshape(-1, 3))
+    pitch, yaw = rotations[:, 0], rotations[:, 1]
+    return np.stack([np.cos(pitch) * np.cos(yaw), np.cos(pitch) * np.sin(yaw), np.sin(pitch)], axis=1)
+
+
+def compute_magnitude_angles(target_locations, current_location, orientation):
+    """
+    Compute the relative angles and distances between several target locations and a current_location,
+    as compute_magnitude_angle does for one target
+
+        :param target_locations: (N, 3) or (N, 2) array with the locations of the target objects
+        :param current_location: location of the reference object
+        :param orientation: orientation of the reference object
+        :return: a tuple composed by the (N,) arrays of distances and angles to the objects
+    """
+    target_vectors = _as_xy(target_locations) - _as_xyz(current_location)[0:2]
+    norm_targets = np.linalg.norm(target_vectors, axis=1)
+
+    forward_vector = np.array([math.cos(math.radians(orientation)), math.sin(math.radians(orientation))])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_angles = np.clip(target_vectors.dot(forward_vector) / norm_targets, -1., 1.)
+    return norm_targets, np.degrees(np.arccos(cos_angles))
+
+
+def is_within_distances(target_locations, reference_transform, max_distance, angle_interval=None):
+    """
+    Check which of several locations are within a certain distance of a reference object,
+    as is_within_distance does for one target. The 'angle_interval' has the same meaning.
+
+        :param target_locations: (N, 3) or (N, 2) array with the locations of the target objects
+        :param reference_transform: transform of the reference object
+        :param max_distance: maximum allowed distance
+        :param angle_interval: only locations between [min, max] angles will be considered
+        :return: (N,) boolean array
+    """
+    reference_location = reference_transform.location
+    target_vectors = _as_xy(target_locations) - (reference_location.x, reference_location.y)
+    norm_targets = np.linalg.norm(target_vectors, axis=1)
+
+    within = norm_targets <= max_distance
+    if angle_interval:
+        fwd = reference_transform.get_forward_vector()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_angles = np.clip(target_vectors.dot((fwd.x, fwd.y)) / norm_targets, -1., 1.)
+        angles = np.degrees(np.arccos(cos_angles))
+        within &= (angle_interval[0] < angles) & (angles < angle_interval[1])
+
+    # Targets on top of the reference are always within distance
+    return within | (norm_targets < 0.001)
+
+
+def get_snapshot_arrays(snapshot, actor_ids=None):
+    """
+    Read the state of actors from a world snapshot into the arrays taken by the vectorized helpers.
+    Actors that are not in the snapshot get NaN rows, which are never within distance.
+
+        :param snapshot: carla.WorldSnapshot
+        :param actor_ids: ids of the actors to read, all the actors of the snapshot if None
+        :return: a tuple composed by the (N,) ids, and the (N, 3) locations, rotations
+            (pitch, yaw, roll) and velocities of the actors
+    """
+    if actor_ids is None:
+        actor_snapshots = list(snapshot)
+        actor_ids = [actor_snapshot.id for actor_snapshot in actor_snapshots]
+    else:
+        actor_ids = list(actor_ids)
+        actor_snapshots = [snapshot.find(actor_id) for actor_id in actor_ids]
+
+    data = np.full((len(actor_ids), 9), np.nan)
+    for i, actor_snapshot in enumerate(actor_snapshots):
+        if actor_snapshot is None:
+            continue
+        transform = actor_snapshot.get_transform()
+        velocity = actor_snapshot.get_velocity()
+        data[i] = (transform.location.x, transform.location.y, transform.location.z,
+                   transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll,
+                   velocity.x, velocity.y, velocity.z)
+
+    return np.array(actor_ids, dtype=np.int64), data[:, 0:3], data[:, 3:6], data[:, 6:9]
+
+
+def _as_xyz(location):
+    """Returns a carla.Location, or anything with three coordinates, as a (3,) array"""
+    if hasattr(location, 'x'):
+        return np.array([location.x, location.y, location.z], dtype=np.float64)
+    return np.asarray(location, dtype=np.float64).reshape(3)
+
+
+def _as_xy(locations):
+    """Returns the x and y coordinates of an (N, 2) or (N, 3) array of locations"""
+    locations = np.asarray(locations, dtype=np.float64)
+    if locations.size == 0:
+        return np.zeros((0, 2))
+    return locations.reshape(-1, locations.shape[-1])[:, 0:2]
+
+
+def compute_obb_vertices(centers, yaws, extents):
+    """
+    Corners of 2D oriented bounding boxes, in counterclockwise order
+
+        :param centers: (N, 2) array with the center of each box
+        :param yaws: (N,) array with the yaw of each box, in degrees
+        :param extents: (N, 2) array with the half length and half width of each box
+        :return: (N, 4, 2) array
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    extents = np.asarray(extents, dtype=np.float64).reshape(-1, 2)
+    yaws = np.radians(np.asarray(yaws, dtype=np.float64).reshape(-1))
+    forward = np.stack([np.cos(yaws), np.sin(yaws)], axis=1) * extents[:, 0:1]
+    right = np.stack([-np.sin(yaws), np.cos(yaws)], axis=1) * extents[:, 1:2]
+    return np.stack([
+        centers - forward - right,
+        centers + forward - right,
+        centers + forward + right,
+        centers - forward + right], axis=1)
+
+
+def polygons_intersect(polygons_a, polygons_b):
+    """
+    Separating axis test between every polygon of a group and every polygon of another one.
+    Polygons have to be convex, and touching polygons are considered to intersect.
+
+        :param polygons_a: (A, N, 2) array with the vertices of each polygon, in order
+        :param polygons_b: (B, M, 2) array with the vertices of each polygon, in order
+        :return: (A, B) boolean array, True where the polygons intersect
+    """
+    polygons_a = np.asarray(polygons_a, dtype=np.float64)
+    polygons_b = np.asarray(polygons_b, dtype=np.float64)
+
+    # Pairs whose axis aligned boxes do not overlap are already separated
+    min_a, max_a = polygons_a.min(axis=1), polygons_a.max(axis=1)
+    min_b, max_b = polygons_b.min(axis=1), polygons_b.max(axis=1)
+    result = np.all((min_a[:, None] <= max_b[None]) & (min_b[None] <= max_a[:, None]), axis=2)
+    index_a, index_b = np.nonzero(result)
+    if len(index_a) == 0:
+        return result
+
+    def separated(owners, others):
+        # Edge normals of the owner polygons as axes, both polygons projected on them
+        edges = np.roll(owners, -1, axis=1) - owners
+        axes = np.stack([-edges[..., 1], edges[..., 0]], axis=-1)
+        own = np.einsum('pkj,pnj->pkn', axes, owners)
+        other = np.einsum('pkj,pnj->pkn', axes, others)
+        return np.any((other.max(axis=2) < own.min(axis=2)) | (other.min(axis=2) > own.max(axis=2)), axis=1)
+
+    pairs_a, pairs_b = polygons_a[index_a], polygons_b[index_b]
+    result[index_a, index_b] = ~(separated(pairs_a, pairs_b) | separated(pairs_b, pairs_a))
+    return result
@@ -20,6 +20,8 @@ except IndexError:
 import carla
 import random
 
+from agents.navigation.topology_sampler import TopologySampler
+
 
 def get_scene_layout(carla_map):
     """
@@ -32,24 +34,17 @@ def get_scene_layout(carla_map):
         transform.rotation.yaw += 90
         return transform.location + shift * transform.get_forward_vector()
 
-    topology = [x[0] for x in carla_map.get_topology()]
-    topology = sorted(topology, key=lambda w: w.transform.location.z)
+    topology = sorted(carla_map.get_topology(), key=lambda x: x[0].transform.location.z)
+
+    # All the lanes are sampled at once. Every lane is followed from its entry through the sections
+    # of its road by its successors, as its lane id can change between them
+    precision = 0.05
+    sampler = TopologySampler(carla_map, precision)
 
     # A road contains a list of lanes, a each lane contains a list of waypoints
     map_dict = dict()
-    precision = 0.05
-    for waypoint in topology:
-        waypoints = [waypoint]
-        nxt = waypoint.next(precision)
-        if len(nxt) > 0:
-            nxt = nxt[0]
-            while nxt.road_id == waypoint.road_id:
-                waypoints.append(nxt)
-                nxt = nxt.next(precision)
-                if len(nxt) > 0:
-                    nxt = nxt[0]
-                else:
-                    break
+    for waypoint, exit_waypoint in topology:
+        waypoints = [waypoint] + (sampler.segment_path(waypoint, exit_waypoint) or [])
 
         left_marking = [_lateral_shift(w.transform, -w.lane_width * 0.5) for w in waypoints]
         right_marking = [_lateral_shift(w.transform, w.lane_width * 0.5) for w in waypoints]
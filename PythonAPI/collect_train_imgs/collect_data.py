@@ -1,6 +1,7 @@
 import glob
 import os
 import sys
+import argparse
 
 try:
     sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
@@ -25,7 +26,8 @@ import time
 import queue
 import cv2
 import json
-import csv
+
+from walker_spawn_plan import WalkerSpawnPlan
 
 try:
     import pygame
@@ -44,11 +46,32 @@ except ImportError:
     raise RuntimeError('cannot import numpy, make sure numpy package is installed')
 
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--egos",default=1,type=int,help="number of ego-vehicles to spawn")
+parser.add_argument("--rigs",default="front",type=str,
+                    help="comma separated camera rigs mounted on every ego (front, high, low)")
+parser.add_argument("--every",default=50,type=int,help="save the captured images every n world ticks")
+parser.add_argument("--max_frames",default=1000,type=int,help="number of saved world ticks before stopping")
+parser.add_argument("--seed",default=42,type=int,help="seed of the pedestrian spawn plan")
+args = parser.parse_args()
+
 SpawnActor = carla.command.SpawnActor
 
 
 OUTPUT_FOLDER = "_dataset_vehicles_testing" 
 
+# Camera mounts relative to the ego-vehicle. "high" and "low" match the
+# "Camera High" / "Camera Low" setups of the attack statistics.
+CAMERA_RIGS = {
+    "front": carla.Transform(carla.Location(x=1.5, z=2.4)),
+    "high": carla.Transform(carla.Location(x=1.5, z=3.0), carla.Rotation(pitch=-10.0)),
+    "low": carla.Transform(carla.Location(x=1.5, z=1.2))
+}
+
+for rig in args.rigs.split(","):
+    if rig not in CAMERA_RIGS:
+        raise Exception("Unknown camera rig '{}', choose from {}.".format(rig, list(CAMERA_RIGS.keys())))
+
 
 if not os.path.exists(os.path.join("./",OUTPUT_FOLDER)):
     os.makedirs(os.path.join("./",OUTPUT_FOLDER))
@@ -62,11 +85,22 @@ if not os.path.exists(os.path.join("./",OUTPUT_FOLDER)):
 class GTBoundingBoxes(object):
     
     @staticmethod
-    def get_bounding_boxes(world, vehicle, camera, K, labels, img=None):
+    def get_level_bbs(world, labels):
+        """
+        Retrieves the level bounding boxes of all the given labels. The result
+        can be shared by all the cameras capturing the same world tick.
+        """
+        return {label: list(world.get_level_bbs(label)) for label in labels}
+
+    @staticmethod
+    def get_bounding_boxes(world, vehicle, camera, K, labels, img=None, level_bbs=None):
         bounding_boxes = []
 
+        if level_bbs is None:
+            level_bbs = GTBoundingBoxes.get_level_bbs(world, labels)
+
         for label in labels:
-            bbs = list(world.get_level_bbs(label))
+            bbs = level_bbs[label]
             for bb in bbs:
                 bb_verts = GTBoundingBoxes.__filter_bbs(bb, vehicle, camera, K)
                 bounding_boxes.append(bb_verts)
@@ -178,10 +212,10 @@ class StaticAttackScenario(object):
         self.pedestrian_list = []
         self.static_attacks = []
 
-        self.car = None
-        self.camera = None
-        self.K = None
-        self.image_queue = queue.LifoQueue(maxsize=10)
+        # One entry per ego-vehicle and per camera. Every camera keeps its own
+        # queue so that the images can be matched to the world frame.
+        self.egos = []
+        self.cameras = []
 
         self.ground_truth_annotations = {
             "info": {},
@@ -219,18 +253,9 @@ class StaticAttackScenario(object):
         self.image = None
         self.capture = True
 
-        # Get Walker spawn points
+        # Walker spawn points, filled from the cached spawn plan once the world is known
+        self.spawn_plan = None
         self.walker_spawn_point = []
-        with open("./../attack_scenario/pedestrian_spawn_points.csv", 'r') as file:
-            csvreader = csv.reader(file)
-            for i, row in enumerate(csvreader):
-                if i==0:
-                    continue
-                spawn_point = carla.Transform()
-                spawn_point.location.x = float(row[1])
-                spawn_point.location.y = float(row[2])
-                spawn_point.location.z = float(row[3])
-                self.walker_spawn_point.append(spawn_point)
 
     def set_synchronous_mode(self, mode):
         # Set up the simulator in synchronous mode
@@ -277,15 +302,10 @@ class StaticAttackScenario(object):
         # some settings
         percentagePedestriansRunning = 0.0      # how many pedestrians will run
         percentagePedestriansCrossing = 0.0     # how many pedestrians will walk through the road
-        self.world.set_pedestrians_seed(42)
-        # 1. take all the random locations to spawn
-        spawn_points = []
-        for i in range(n):
-            spawn_point = carla.Transform()
-            loc = self.world.get_random_location_from_navigation()
-            if (loc != None):
-                spawn_point.location = loc
-                spawn_points.append(spawn_point)
+        self.world.set_pedestrians_seed(args.seed)
+        random.seed(args.seed)
+        # 1. take the spawn and goal locations from the cached navigation samples
+        spawn_points, goals = self.spawn_plan.draw(n, args.seed)
         # 2. we spawn the walker object
         batch = []
         walker_speed = []
@@ -317,6 +337,7 @@ class StaticAttackScenario(object):
 
         results = self.client.apply_batch_sync(batch, True)
         walker_speed2 = []
+        goals2 = []
         walkers_list = []
         for i in range(len(results)):
             if results[i].error:
@@ -324,7 +345,9 @@ class StaticAttackScenario(object):
             else:
                 walkers_list.append({"id": results[i].actor_id})
                 walker_speed2.append(walker_speed[i])
+                goals2.append(goals[i])
         walker_speed = walker_speed2
+        goals = goals2
         # 3. we spawn the walker controller
         batch = []
         num_walkers = len(walkers_list)
@@ -352,22 +375,53 @@ class StaticAttackScenario(object):
             # start walker
             all_pedestrians[i].start()
             # set walk to random point
-            all_pedestrians[i].go_to_location(self.world.get_random_location_from_navigation())
+            all_pedestrians[i].go_to_location(goals[int(i/2)])
             # max speed
             all_pedestrians[i].set_max_speed(float(walker_speed[int(i/2)]))
 
-    def spawn_ego(self, transform):
+    def spawn_egos(self, transforms, rigs):
         """
-        Spawns the ego-vehicle and attaches an RGB camera to it.
+        Spawns one ego-vehicle per transform and attaches an RGB camera for
+        every rig to each of them.
+
+        Input:
+            transforms: spawn points of the ego-vehicles
+            rigs: names of the camera rigs (keys of CAMERA_RIGS)
         """
         vehicle_bp = self.bp_lib.find('vehicle.lincoln.mkz_2020')
-        self.car = self.world.try_spawn_actor(vehicle_bp, transform)
-
         camera_bp = self.bp_lib.find('sensor.camera.rgb')
-        camera_init_trans = carla.Transform(carla.Location(x=1.5, z=2.4))
-        self.camera = self.world.spawn_actor(camera_bp, camera_init_trans, attach_to=self.car)
-        self.camera.listen(self.image_queue.put)
 
+        for transform in transforms:
+            car = self.world.try_spawn_actor(vehicle_bp, transform)
+            if car is None:
+                continue
+            self.egos.append(car)
+
+            for rig in rigs:
+                camera = self.world.spawn_actor(camera_bp, CAMERA_RIGS[rig], attach_to=car)
+                image_queue = queue.Queue()
+                camera.listen(image_queue.put)
+                self.cameras.append({
+                    "id": len(self.cameras),
+                    "rig": rig,
+                    "ego": car,
+                    "ego_id": len(self.egos) - 1,
+                    "sensor": camera,
+                    "queue": image_queue,
+                    "K": None
+                })
+
+        print("Spawned {} ego-vehicles with {} cameras.".format(len(self.egos), len(self.cameras)))
+
+    @staticmethod
+    def retrieve_image(image_queue, frame, timeout=2.0):
+        """
+        Returns the image of the given camera queue captured at the given world frame.
+        """
+        while True:
+            image = image_queue.get(timeout=timeout)
+            if image.frame == frame:
+                return image
 
     def get_camera_matrix(self, w, h, fov):
         """
@@ -400,6 +454,11 @@ class StaticAttackScenario(object):
             self.world = self.client.get_world()
             self.bp_lib = self.world.get_blueprint_library()
 
+            csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'attack_scenario',
+                                    'pedestrian_spawn_points.csv')
+            self.spawn_plan = WalkerSpawnPlan(self.world, csv_path=csv_path)
+            self.walker_spawn_point = self.spawn_plan.csv_spawn_points()
+
             self.traffic_manager = self.client.get_trafficmanager()
             self.traffic_manager.set_global_distance_to_leading_vehicle(2.5)
             self.traffic_manager.set_synchronous_mode(True)
@@ -423,22 +482,33 @@ class StaticAttackScenario(object):
 
             spawn_points = self.world.get_map().get_spawn_points()
 
-            self.spawn_ego(spawn_points[1])
+            # The NPCs take spawn points 2..51, place the extra egos after them
+            max_egos = 1 + max(len(spawn_points) - 52, 0)
+            if not 1 <= args.egos <= max_egos:
+                raise Exception("The number of egos must be between 1 and {}, the map has {} spawn points "
+                                "and 50 of them are taken by the NPCs.".format(max_egos, len(spawn_points)))
+            ego_spawn_points = [spawn_points[1]] + spawn_points[52:52 + args.egos - 1]
+            self.spawn_egos(ego_spawn_points, args.rigs.split(","))
+            if not self.cameras:
+                raise Exception("No ego-vehicle could be spawned, there are no cameras to collect data from.")
 
             self.world.tick()
 
-            # Calculate the camera projection matrix to project from 3D -> 2D and save to camera attributes
-            image_w = int(self.camera.attributes["image_size_x"])
-            image_h = int(self.camera.attributes["image_size_y"])
-            fov = float(self.camera.attributes["fov"])
-            self.K = self.get_camera_matrix(image_w, image_h, fov)
+            # Calculate the camera projection matrices to project from 3D -> 2D and save to camera attributes
+            for camera in self.cameras:
+                image_w = int(camera["sensor"].attributes["image_size_x"])
+                image_h = int(camera["sensor"].attributes["image_size_y"])
+                fov = float(camera["sensor"].attributes["fov"])
+                camera["K"] = self.get_camera_matrix(image_w, image_h, fov)
 
-            self.car.set_autopilot(True)
+            for car in self.egos:
+                car.set_autopilot(True)
 
-            self.world.tick()
+            frame = self.world.tick()
             frame_number = 0
+            image_id = 0
 
-            image = self.image_queue.get()
+            image = self.retrieve_image(self.cameras[0]["queue"], frame)
             # Reshape the raw data into an RGB array
             img = np.reshape(np.copy(image.raw_data), (image.height, image.width, 4))
 
@@ -450,51 +520,63 @@ class StaticAttackScenario(object):
             i = 0
 
             while True:
-                self.world.tick()
-                image = self.image_queue.get()
+                frame = self.world.tick()
+                # Every camera produces one image per tick, all of them have to be consumed
+                images = [self.retrieve_image(camera["queue"], frame) for camera in self.cameras]
 
-                if i%50 == 0:
-                    # Retrieve and reshape the image
-                    
-                    img = np.reshape(np.copy(image.raw_data), (image.height, image.width, 4))   
+                if i%args.every == 0:
                     frame_number += 1
+                    level_bbs = GTBoundingBoxes.get_level_bbs(self.world, labels)
+
+                    for camera, image in zip(self.cameras, images):
+                        # Retrieve and reshape the image
+                        img = np.reshape(np.copy(image.raw_data), (image.height, image.width, 4))
+                        image_id += 1
+
+                        bb_img = img.copy()
+
+                        # Save frame to annotations json
+                        frame_file = "{:05d}_ego{:02d}_{}.png".format(frame_number, camera["ego_id"], camera["rig"])
+
+                        self.ground_truth_annotations["images"].append({
+                            "file_name": frame_file,
+                            "height": image.height,
+                            "width": image.width,
+                            "id": image_id,
+                            "frame": frame,
+                            "ego_id": camera["ego_id"],
+                            "camera_id": camera["id"],
+                            "rig": camera["rig"]
+                        })
+
+                        bounding_boxes, bb_img = GTBoundingBoxes.get_bounding_boxes(
+                            self.world, camera["ego"], camera["sensor"], camera["K"], labels, bb_img, level_bbs)
+
+                        for bb_verts in bounding_boxes:
+                            if bb_verts:
+                                bb_cocoFormat = [bb_verts[0], bb_verts[1],
+                                                 bb_verts[2]-bb_verts[0], bb_verts[3]-bb_verts[1]]
+                                category = self.objectlabel2categoryid[bb_verts[-1]]
+                                self.ground_truth_annotations["annotations"].append({
+                                    "segmentation": [],
+                                    "area": bb_cocoFormat[2]*bb_cocoFormat[3],
+                                    "iscrowd": 0,
+                                    "category_id": category,
+                                    "image_id": image_id,
+                                    "bbox": bb_cocoFormat
+                                })
+
+                        cv2.imwrite(os.path.join(OUTPUT_FOLDER, frame_file), img)
+
+                        if camera["id"] == 0:
+                            cv2.imshow('CameraFeed',bb_img)
 
-                    bb_img = img.copy()
-
-                    # Save frame to annotations json
-                    frame_file = "{:05d}.png".format(frame_number)
-
-                    self.ground_truth_annotations["images"].append({
-                        "file_name": frame_file,
-                        "height": image.height,
-                        "width": image.width,
-                        "id": frame_number
-                    })
-
-                    bounding_boxes, bb_img = GTBoundingBoxes.get_bounding_boxes(self.world, self.car, self.camera, self.K, labels, bb_img)
-
-                    for bb_verts in bounding_boxes:
-                        if bb_verts:
-                            bb_cocoFormat = [bb_verts[0], bb_verts[1], bb_verts[2]-bb_verts[0], bb_verts[3]-bb_verts[1]]
-                            category = self.objectlabel2categoryid[bb_verts[-1]]
-                            self.ground_truth_annotations["annotations"].append({
-                                "segmentation": [],
-                                "area": bb_cocoFormat[2]*bb_cocoFormat[3],
-                                "iscrowd": 0,
-                                "category_id": category,
-                                "image_id": frame_number,
-                                "bbox": bb_cocoFormat
-                            })
-
-                    cv2.imwrite(os.path.join(OUTPUT_FOLDER, frame_file), img)
-
-                    cv2.imshow('CameraFeed',bb_img)
                     if cv2.waitKey(1) == ord('q'):
                         break
 
                 i += 1
 
-                if frame_number >= 1000:
+                if frame_number >= args.max_frames:
                     break
 
         except KeyboardInterrupt:
@@ -518,11 +600,13 @@ class StaticAttackScenario(object):
             print(len(self.pedestrian_list))
             self.client.apply_batch([carla.command.DestroyActor(x) for x in self.pedestrian_list])
 
-            # self.car.destroy()
-            # self.camera.destroy()
-            if self.car.destroy() and self.camera.destroy():
+            for camera in self.cameras:
+                camera["sensor"].stop()
+            self.client.apply_batch([carla.command.DestroyActor(x["sensor"]) for x in self.cameras])
+            self.client.apply_batch([carla.command.DestroyActor(x) for x in self.egos])
 
-                print("Destroyed {} vehicles, {} walkers and the ego-vehicle and camera.".format(len(self.vehicle_list), int(len(self.pedestrian_list)/2)))
+            print("Destroyed {} vehicles, {} walkers, {} ego-vehicles and {} cameras.".format(
+                len(self.vehicle_list), int(len(self.pedestrian_list)/2), len(self.egos), len(self.cameras)))
             
             cv2.destroyAllWindows()
 
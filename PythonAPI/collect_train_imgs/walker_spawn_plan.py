@@ -0,0 +1,118 @@
+import csv
+import hashlib
+import os
+import re
+
+import carla
+
+try:
+    import numpy as np
+except ImportError:
+    raise RuntimeError('cannot import numpy, make sure numpy package is installed')
+
+
+# =============================================================================
+# -- walker spawn plan --------------------------------------------------------
+# =============================================================================
+
+class WalkerSpawnPlan(object):
+    """
+    Pool of navigation mesh locations sampled once per map and stored on disk.
+
+    The pool is saved as a NumPy .npz file keyed by the map name and the hash
+    of its OpenDRIVE content, so sampling only happens the first time a map is
+    used. Spawn and goal locations are then drawn from the pool with a seed,
+    which makes the pedestrian setup reproducible between runs. Delete the
+    cache file to resample the pool. The CSV spawn points are not cached, they
+    are read again on every run.
+    """
+
+    def __init__(self, world, pool_size=2000, cache_dir="_spawn_plan_cache", csv_path=None):
+        """
+        Input:
+            world: carla.World to sample the navigation mesh from
+            pool_size: number of navigation locations to sample on a cache miss
+            cache_dir: folder where the .npz pools are stored
+            csv_path: optional CSV of hand picked walker spawn points, it must exist if given
+        """
+        self.world = world
+        self.pool_size = pool_size
+        self.cache_dir = cache_dir
+        self.csv_path = csv_path
+
+        carla_map = world.get_map()
+        map_name = re.sub(r'[^A-Za-z0-9_]', '_', carla_map.name.split('/')[-1])
+        opendrive_hash = hashlib.sha1(carla_map.to_opendrive().encode('utf-8')).hexdigest()[:16]
+        self.cache_file = os.path.join(cache_dir, "{}_{}.npz".format(map_name, opendrive_hash))
+
+        self.csv_locations = self._read_csv()
+
+        self.navigation_locations = None
+        if os.path.exists(self.cache_file):
+            self.navigation_locations = np.load(self.cache_file)["navigation"]
+
+        # An empty pool is never stored, and the one of an older run is sampled again
+        if self.navigation_locations is None or len(self.navigation_locations) == 0:
+            self.navigation_locations = self._sample_navigation()
+            if len(self.navigation_locations) == 0:
+                raise RuntimeError("The navigation mesh of {} returned no locations.".format(carla_map.name))
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            np.savez_compressed(self.cache_file, navigation=self.navigation_locations)
+
+    def _sample_navigation(self):
+        """
+        Samples the navigation mesh. This is the only place where the server is queried.
+        """
+        locations = []
+        for _ in range(self.pool_size):
+            loc = self.world.get_random_location_from_navigation()
+            if loc is not None:
+                locations.append([loc.x, loc.y, loc.z])
+        return np.array(locations, dtype=np.float32).reshape(-1, 3)
+
+    def _read_csv(self):
+        """
+        Parses the CSV written by attack_scenario/get_walker_spawn_points.py.
+        """
+        locations = []
+        if self.csv_path is not None:
+            if not os.path.exists(self.csv_path):
+                raise RuntimeError("The walker spawn points file {} does not exist.".format(self.csv_path))
+            with open(self.csv_path, 'r') as file:
+                csvreader = csv.reader(file)
+                for i, row in enumerate(csvreader):
+                    if i==0:
+                        continue
+                    locations.append([float(row[1]), float(row[2]), float(row[3])])
+        return np.array(locations, dtype=np.float32).reshape(-1, 3)
+
+    @staticmethod
+    def _to_location(row):
+        return carla.Location(x=float(row[0]), y=float(row[1]), z=float(row[2]))
+
+    def csv_spawn_points(self):
+        """
+        Returns the hand picked spawn points of the CSV as carla.Transform.
+        """
+        return [carla.Transform(self._to_location(row)) for row in self.csv_locations]
+
+    def draw(self, n, seed):
+        """
+        Draws n spawn points and n goal locations from the pool.
+
+        Input:
+            n: number of walkers
+            seed: seed of the draw, the same seed gives the same plan
+        Output:
+            spawn_points: list of carla.Transform
+            goals: list of carla.Location
+        """
+        rng = np.random.RandomState(seed)
+        replace = n > len(self.navigation_locations)
+        spawn_idx = rng.choice(len(self.navigation_locations), size=n, replace=replace)
+        goal_idx = rng.choice(len(self.navigation_locations), size=n, replace=True)
+
+        spawn_points = [carla.Transform(self._to_location(self.navigation_locations[i])) for i in spawn_idx]
+        goals = [self._to_location(self.navigation_locations[i]) for i in goal_idx]
+        return spawn_points, goals
@@ -0,0 +1,124 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import threading
+import unittest
+
+import carla
+
+from agents.navigation.agent_fleet import AgentFleet
+
+
+class StubActors(list):
+    def filter(self, _):
+        return StubActors()
+
+
+class StubSnapshot(list):
+    frame = 1
+
+
+class StubMap(object):
+    def generate_waypoints(self, _):
+        return []
+
+
+class StubWorld(object):
+    """World without actors"""
+
+    def get_map(self):
+        return StubMap()
+
+    def get_actors(self, actor_ids=None):
+        return StubActors()
+
+    def get_snapshot(self):
+        return StubSnapshot()
+
+
+class StubClient(object):
+    """Client recording the batches of commands sent to it"""
+
+    def __init__(self):
+        self.world = StubWorld()
+        self.batches = []
+
+    def get_world(self):
+        return self.world
+
+    def apply_batch(self, commands):
+        self.batches.append(list(commands))
+
+
+class StubVehicle(object):
+    def __init__(self, actor_id):
+        self.id = actor_id
+
+
+class StubAgent(object):
+    """Agent returning a throttle derived from the id of its vehicle"""
+
+    def __init__(self, actor_id):
+        self._vehicle = StubVehicle(actor_id)
+        self.perception = None
+        self.threads = set()
+
+    def set_perception(self, perception):
+        self.perception = perception
+
+    def set_traffic_light_index(self, _):
+        pass
+
+    def set_lane_change_index(self, _):
+        pass
+
+    def run_step(self):
+        self.threads.add(threading.current_thread().name)
+        return carla.VehicleControl(throttle=self._vehicle.id / 100.0)
+
+    def done(self):
+        return False
+
+
+class TestAgentFleet(unittest.TestCase):
+    def check_step(self, num_workers):
+        client = StubClient()
+        agents = [StubAgent(actor_id) for actor_id in (12, 7, 30, 45)]
+        fleet = AgentFleet(client, agents, num_workers=num_workers)
+        try:
+            for agent in agents:
+                self.assertIs(agent.perception, fleet.get_perception())
+
+            controls = fleet.run_step()
+            self.assertEqual(len(client.batches), 1)
+            commands = client.batches[0]
+            self.assertEqual([command.actor_id for command in commands], [12, 7, 30, 45])
+            for agent, command, control in zip(agents, commands, controls):
+                self.assertIsInstance(command, carla.command.ApplyVehicleControl)
+                self.assertAlmostEqual(command.control.throttle, agent._vehicle.id / 100.0)  # pylint: disable=protected-access
+                self.assertAlmostEqual(control.throttle, command.control.throttle)
+
+            fleet.run_step(apply=False)
+            self.assertEqual(len(client.batches), 1)
+        finally:
+            fleet.close()
+        return agents
+
+    def test_single_batch(self):
+        agents = self.check_step(0)
+        self.assertEqual(agents[0].threads, {threading.current_thread().name})
+
+    def test_single_batch_with_workers(self):
+        self.check_step(4)
+
+    def test_remove_agent(self):
+        client = StubClient()
+        agents = [StubAgent(1), StubAgent(2)]
+        fleet = AgentFleet(client, agents)
+        fleet.remove_agent(agents[0])
+        self.assertIsNone(agents[0].perception)
+        fleet.run_step()
+        self.assertEqual([command.actor_id for command in client.batches[0]], [2])
@@ -0,0 +1,67 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+import carla
+
+COSIM_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'Co-Simulation')
+sys.path.append(os.path.join(COSIM_PATH, 'Sumo'))
+sys.path.append(os.path.join(COSIM_PATH, 'PTV-Vissim'))
+
+from vissim_integration.bridge_helper import BridgeHelper as VissimBridgeHelper
+
+try:
+    from sumo_integration.bridge_helper import BridgeHelper as SumoBridgeHelper
+except ImportError:
+    SumoBridgeHelper = None
+
+
+def to_rows(transform):
+    return ([transform.location.x, transform.location.y, transform.location.z],
+            [transform.rotation.pitch, transform.rotation.yaw, transform.rotation.roll])
+
+
+class TestBridgeHelperArrays(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.locations = rng.uniform(-500, 500, size=(100, 3))
+        self.rotations = rng.uniform(-180, 180, size=(100, 3))
+        self.rotations[:, 0] /= 10.0
+        self.extents = rng.uniform(0.5, 5.0, size=(100, 3))
+
+    def check_conversion(self, scalar_function, array_function, with_extents=True):
+        extents = self.extents if with_extents else None
+        locations, rotations = array_function(self.locations, self.rotations, extents)
+        for i in range(len(self.locations)):
+            transform = carla.Transform(carla.Location(*self.locations[i].tolist()),
+                                        carla.Rotation(*self.rotations[i].tolist()))
+            extent = carla.Vector3D(*self.extents[i].tolist()) if with_extents else None
+            expected_location, expected_rotation = to_rows(scalar_function(transform, extent))
+            np.testing.assert_allclose(locations[i], expected_location, atol=1e-3)
+            np.testing.assert_allclose(rotations[i], expected_rotation, atol=1e-3)
+
+    @unittest.skipIf(SumoBridgeHelper is None, 'sumo tools are not available')
+    def test_sumo(self):
+        SumoBridgeHelper.offset = (-123.5, 48.25)
+        self.check_conversion(SumoBridgeHelper.get_carla_transform, SumoBridgeHelper.get_carla_transforms)
+        self.check_conversion(SumoBridgeHelper.get_sumo_transform, SumoBridgeHelper.get_sumo_transforms)
+
+    def test_vissim(self):
+        for with_extents in (True, False):
+            self.check_conversion(VissimBridgeHelper.get_carla_transform,
+                                  VissimBridgeHelper.get_carla_transforms, with_extents)
+            self.check_conversion(VissimBridgeHelper.get_vissim_transform,
+                                  VissimBridgeHelper.get_vissim_transforms, with_extents)
+
+    def test_empty(self):
+        locations, rotations = VissimBridgeHelper.get_carla_transforms([], [], [])
+        self.assertEqual(locations.shape, (0, 3))
+        self.assertEqual(rotations.shape, (0, 3))
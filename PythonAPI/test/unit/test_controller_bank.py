@@ -0,0 +1,75 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import unittest
+
+import numpy as np
+
+import carla
+
+from agents.navigation.controller import VehiclePIDController, VehiclePIDControllerBank
+
+
+class FakeVehicle(object):
+    """Vehicle whose state is set by the test at every step"""
+
+    def __init__(self):
+        self.transform = carla.Transform()
+        self.velocity = carla.Vector3D()
+
+    def get_world(self):
+        return None
+
+    def get_control(self):
+        return carla.VehicleControl()
+
+    def get_transform(self):
+        return carla.Transform(
+            carla.Location(x=self.transform.location.x, y=self.transform.location.y, z=self.transform.location.z),
+            carla.Rotation(pitch=self.transform.rotation.pitch, yaw=self.transform.rotation.yaw,
+                           roll=self.transform.rotation.roll))
+
+    def get_velocity(self):
+        return self.velocity
+
+
+class FakeWaypoint(object):
+    def __init__(self, x, y, yaw):
+        self.transform = carla.Transform(carla.Location(x=x, y=y), carla.Rotation(yaw=yaw))
+
+
+class TestVehiclePIDControllerBank(unittest.TestCase):
+    def test_same_controls_as_vehicle_controllers(self):
+        rng = np.random.RandomState(0)
+        num_vehicles = 20
+        args_lateral = {'K_P': 1.95, 'K_I': 0.05, 'K_D': 0.2, 'dt': 0.05}
+        args_longitudinal = {'K_P': 1.0, 'K_I': 0.05, 'K_D': 0, 'dt': 0.05}
+        offsets = rng.choice([0.0, 0.5, -0.5], size=num_vehicles)
+
+        vehicles = [FakeVehicle() for _ in range(num_vehicles)]
+        controllers = [
+            VehiclePIDController(v, args_lateral, args_longitudinal, offset=o, max_throttle=0.75, max_brake=0.3)
+            for v, o in zip(vehicles, offsets)]
+        bank = VehiclePIDControllerBank(
+            vehicles, args_lateral, args_longitudinal, offset=offsets, max_throttle=0.75, max_brake=0.3)
+
+        for _ in range(35):
+            for vehicle in vehicles:
+                vehicle.transform = carla.Transform(
+                    carla.Location(x=rng.uniform(-50, 50), y=rng.uniform(-50, 50)),
+                    carla.Rotation(pitch=rng.uniform(-5, 5), yaw=rng.uniform(-180, 180)))
+                vehicle.velocity = carla.Vector3D(x=rng.uniform(-10, 10), y=rng.uniform(-10, 10))
+            waypoints = [FakeWaypoint(rng.uniform(-50, 50), rng.uniform(-50, 50), rng.uniform(-180, 180))
+                         for _ in range(num_vehicles)]
+            target_speeds = rng.uniform(0, 60, size=num_vehicles)
+
+            expected = [c.run_step(s, w) for c, s, w in zip(controllers, target_speeds, waypoints)]
+            controls = bank.run_step(target_speeds, waypoints)
+
+            for control, expected_control in zip(controls, expected):
+                self.assertAlmostEqual(control.throttle, expected_control.throttle, places=5)
+                self.assertAlmostEqual(control.brake, expected_control.brake, places=5)
+                self.assertAlmostEqual(control.steer, expected_control.steer, places=5)
@@ -0,0 +1,179 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import carla
+import networkx as nx
+import numpy as np
+
+from agents.navigation.global_route_planner import GlobalRoutePlanner
+from agents.navigation.route_graph_cache import LazyWaypoint
+
+XODR_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'Unreal', 'CarlaUE4', 'Plugins', 'CarlaTools',
+    'Content', 'MapGenerator', 'Misc', 'OpenDrive', 'TemplateOpenDrive.xodr')
+
+
+def to_rows(route_trace):
+    return [(wp.road_id, wp.section_id, wp.lane_id, round(wp.transform.location.x, 3),
+             round(wp.transform.location.y, 3), option) for wp, option in route_trace]
+
+
+def walk_segment(entry, exit_waypoint, resolution):
+    """Previous path of a topology segment, following it with waypoint.next()"""
+    endloc = exit_waypoint.transform.location
+    path = []
+    waypoint = entry.next(resolution)[0]
+    while waypoint.transform.location.distance(endloc) > resolution:
+        path.append(waypoint)
+        next_waypoints = waypoint.next(resolution)
+        if len(next_waypoints) == 0:
+            break
+        waypoint = next_waypoints[0]
+    return path
+
+
+def path_xyz(path):
+    return np.array([(wp.transform.location.x, wp.transform.location.y, wp.transform.location.z)
+                     for wp in path]).reshape(-1, 3)
+
+
+class StubWaypoint(object):
+    def __init__(self, road_id, lane_id, s):
+        self.road_id = road_id
+        self.lane_id = lane_id
+        self.s = s
+
+
+class StubMap(object):
+    """Map with one lane of road 14 ending at s 14.68, where road 11 starts"""
+    def get_waypoint_xodr(self, road_id, lane_id, s):
+        if road_id == 14 and lane_id == 1 and 0.0 <= s < 14.68:
+            return StubWaypoint(road_id, lane_id, s)
+        return None
+
+    def get_waypoint(self, location, project_to_road=True, lane_type=carla.LaneType.Driving):
+        return StubWaypoint(11, 1, 0.0)
+
+
+class TestLazyWaypoint(unittest.TestCase):
+    def test_lane_end(self):
+        waypoint = LazyWaypoint(StubMap(), 14, 0, 1, 14.68, (0.0, 0.0, 0.0)).waypoint
+        self.assertEqual((waypoint.road_id, waypoint.lane_id), (14, 1))
+        self.assertAlmostEqual(waypoint.s, 14.68, delta=0.05)
+
+    def test_other_road(self):
+        with self.assertRaises(RuntimeError):
+            LazyWaypoint(StubMap(), 14, 0, 1, 20.0, (0.0, 0.0, 0.0)).waypoint  # pylint: disable=expression-not-assigned
+
+
+@unittest.skipIf(not os.path.exists(XODR_FILE), 'OpenDRIVE template not found')
+class TestGlobalRoutePlanner(unittest.TestCase):
+    def setUp(self):
+        with open(XODR_FILE) as xodr:
+            self.wmap = carla.Map('TemplateOpenDrive', xodr.read())
+        self.planner = GlobalRoutePlanner(self.wmap, 2.0, route_cache_size=0)
+
+        # Pairs of locations on different roads that are connected by the graph, including the
+        # junctions, as the turn decisions of a route ending inside one used to leak to the next
+        waypoints = dict()
+        for waypoint in self.wmap.generate_waypoints(2.0):
+            waypoints.setdefault((waypoint.road_id, waypoint.lane_id), []).append(waypoint)
+        # The middle of a lane of every road, as the ends are shared with the neighbouring ones
+        locations = dict()
+        for (road_id, _), wps in sorted(waypoints.items()):
+            if len(wps) >= 3:
+                locations.setdefault(road_id, wps[len(wps) // 2].transform.location)
+        self.pairs = []
+        for origin in locations.values():
+            for destination in locations.values():
+                if origin is not destination:
+                    try:
+                        self.planner.trace_route(origin, destination)
+                    except (nx.NetworkXException, TypeError):
+                        continue
+                    self.pairs.append((origin, destination))
+
+    def test_routes_do_not_depend_on_previous_ones(self):
+        self.assertGreater(len(self.pairs), 1)
+        for a_to_b in self.pairs[:10]:
+            planner = GlobalRoutePlanner(self.wmap, 2.0, route_cache_size=0)
+            first = to_rows(planner.trace_route(*a_to_b))
+            for c_to_d in self.pairs:
+                planner.trace_route(*c_to_d)
+                self.assertEqual(to_rows(planner.trace_route(*a_to_b)), first)
+
+    def test_cached_route(self):
+        for c_to_d in self.pairs:
+            planner = GlobalRoutePlanner(self.wmap, 2.0)
+            first = to_rows(planner.trace_route(*self.pairs[0]))
+            planner.trace_route(*c_to_d)
+            self.assertEqual(to_rows(planner.trace_route(*self.pairs[0])), first)
+            self.assertEqual(to_rows(self.planner.trace_route(*c_to_d)), to_rows(planner.trace_route(*c_to_d)))
+
+    def test_trace_routes(self):
+        expected = [to_rows(self.planner.trace_route(*pair)) for pair in self.pairs]
+        self.assertEqual([to_rows(route) for route in self.planner.trace_routes(self.pairs)], expected)
+
+    def test_topology_paths(self):
+        # The paths are sampled on the grid of the road instead of from the entry, which moves
+        # them up to half the resolution along the lane
+        resolution = 2.0
+        tolerance = 0.5 * resolution + 1e-3
+        for segment in self.planner._topology:  # pylint: disable=protected-access
+            entry, exit_waypoint = segment['entry'], segment['exit']
+            if entry.transform.location.distance(exit_waypoint.transform.location) <= resolution:
+                continue
+            expected = path_xyz(walk_segment(entry, exit_waypoint, resolution))
+            path = path_xyz(segment['path'])
+            self.assertLessEqual(abs(len(path) - len(expected)), 1)
+            if len(expected) == 0 or len(path) == 0:
+                continue
+            distances = np.linalg.norm(path[:, None, :] - expected[None, :, :], axis=2)
+            self.assertLessEqual(distances.min(axis=0).max(), tolerance)
+            self.assertLessEqual(distances.min(axis=1).max(), tolerance)
+            gaps = np.linalg.norm(np.diff(path, axis=0), axis=1)
+            self.assertTrue(np.all(gaps <= resolution + 1e-3))
+
+    def test_route_graph_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            GlobalRoutePlanner(self.wmap, 2.0, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            loaded = GlobalRoutePlanner(self.wmap, 2.0, cache_dir=cache_dir, route_cache_size=0)
+            for pair in self.pairs:
+                expected = self.planner.trace_route(*pair)
+                route = loaded.trace_route(*pair)
+                self.assertEqual([row[:3] + row[5:] for row in to_rows(route)],
+                                 [row[:3] + row[5:] for row in to_rows(expected)])
+                # The lane ends can be moved slightly inside of the lane when loaded
+                np.testing.assert_allclose(path_xyz([wp for wp, _ in route]),
+                                           path_xyz([wp for wp, _ in expected]), atol=0.05)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_client_side_localization(self):  # pylint: disable=protected-access
+        planner = GlobalRoutePlanner(self.wmap, 2.0, route_cache_size=0, client_side_localization=True)
+        index = planner._get_waypoint_index()
+        for waypoint in self.wmap.generate_waypoints(2.0):
+            if waypoint.is_junction:
+                continue
+            right = waypoint.transform.get_right_vector()
+            for offset in (-0.25, 0.0, 0.25):
+                location = waypoint.transform.location + right * (offset * waypoint.lane_width)
+                expected = planner._waypoint_edge(self.wmap.get_waypoint(location))
+                self.assertEqual(planner._waypoint_edge(index.query(location)[0]), expected)
+
+        # The lanes overlap inside of the junctions, where either of them can be picked
+        for pair in self.pairs:
+            if any(self.wmap.get_waypoint(location).is_junction for location in pair):
+                continue
+            self.assertEqual([row[:3] + row[5:] for row in to_rows(planner.trace_route(*pair))],
+                             [row[:3] + row[5:] for row in to_rows(self.planner.trace_route(*pair))])
@@ -0,0 +1,109 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import unittest
+
+import carla
+
+from agents.navigation.basic_agent import BasicAgent
+from agents.navigation.lane_change_index import LaneChangeIndex
+from agents.navigation.local_planner import RoadOption
+
+
+ROAD_LENGTH = 200.0
+LANE_WIDTH = 3.5
+NUM_LANES = 3
+
+
+class FakeWaypoint(object):
+    """Waypoint of a straight road with lanes -1 to -3, going along x"""
+
+    def __init__(self, lane_id, s):
+        self.road_id = 1
+        self.section_id = 0
+        self.lane_id = lane_id
+        self.s = s
+        self.lane_type = carla.LaneType.Driving
+        self.transform = carla.Transform(carla.Location(x=s, y=(abs(lane_id) - 0.5) * LANE_WIDTH))
+        # No lane changes are allowed between the two leftmost lanes in the second half of the road
+        can_left = abs(lane_id) > 1 and not (abs(lane_id) == 2 and s > ROAD_LENGTH / 2)
+        can_right = abs(lane_id) < NUM_LANES
+        if can_left and can_right:
+            self.lane_change = carla.LaneChange.Both
+        elif can_left:
+            self.lane_change = carla.LaneChange.Left
+        elif can_right:
+            self.lane_change = carla.LaneChange.Right
+        else:
+            self.lane_change = carla.LaneChange.NONE
+
+    def next(self, distance):
+        if self.s + distance > ROAD_LENGTH:
+            return []
+        return [FakeWaypoint(self.lane_id, self.s + distance)]
+
+    def get_left_lane(self):
+        return FakeWaypoint(self.lane_id + 1, self.s) if self.lane_id < -1 else None
+
+    def get_right_lane(self):
+        return FakeWaypoint(self.lane_id - 1, self.s) if self.lane_id > -NUM_LANES else None
+
+
+class FakeMap(object):
+    def generate_waypoints(self, distance):
+        return [FakeWaypoint(-lane, i * distance)
+                for lane in range(1, NUM_LANES + 1) for i in range(int(ROAD_LENGTH / distance) + 1)]
+
+
+class FakeAgent(object):
+    """Agent without index, to generate the lane changes walking the map"""
+    _lane_change_index = None
+
+
+class TestLaneChangeIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = LaneChangeIndex(FakeMap(), 2.0)
+
+    def test_same_path_as_map_walk(self):
+        for lane_id in (-1, -2, -3):
+            for s in (0.0, 17.0, 60.0, 95.0, 120.0):
+                for direction in ('left', 'right'):
+                    for lane_changes in (1, 2):
+                        waypoint = FakeWaypoint(lane_id, s)
+                        expected = BasicAgent._generate_lane_change_path(
+                            FakeAgent(), waypoint, direction, 10, 25, 25, True, lane_changes, 2.0)
+                        path = self.index.lane_change_path(waypoint, direction, 10, 25, 25, True, lane_changes)
+
+                        self.assertIsNotNone(path)
+                        self.assertEqual(bool(path), bool(expected))
+                        if not expected:
+                            continue
+
+                        # Sampled differently, but changing lanes and ending at the same points
+                        changes = [(wp, option) for wp, option in path if option != RoadOption.LANEFOLLOW]
+                        expected_changes = [(wp, option) for wp, option in expected if option != RoadOption.LANEFOLLOW]
+                        self.assertEqual(len(changes), len(expected_changes))
+                        for (wp, option), (expected_wp, expected_option) in zip(
+                                changes + path[-1:], expected_changes + expected[-1:]):
+                            self.assertEqual(option, expected_option)
+                            self.assertEqual(wp.lane_id, expected_wp.lane_id)
+                            self.assertAlmostEqual(wp.s, expected_wp.s, delta=self.index.resolution)
+
+    def test_feasibility(self):
+        self.assertTrue(self.index.can_change(FakeWaypoint(-2, 10.0), 'left'))
+        self.assertFalse(self.index.can_change(FakeWaypoint(-2, 150.0), 'left'))
+        self.assertFalse(self.index.can_change(FakeWaypoint(-3, 10.0), 'right'))
+        self.assertIsNone(self.index.can_change(FakeWaypoint(-4, 10.0), 'right'))
+
+        s, xyz = self.index.target_polyline(FakeWaypoint(-1, 10.0), 'right', 20.0)
+        self.assertAlmostEqual(s[0], 10.0)
+        self.assertGreaterEqual(s[-1], 30.0)
+        self.assertTrue((xyz[:, 1] == 1.5 * LANE_WIDTH).all())
+
+    def test_maneuver_out_of_the_lane(self):
+        self.assertIsNone(self.index.lane_change_path(FakeWaypoint(-1, 190.0), 'right'))
+        self.assertEqual(self.index.lane_change_path(FakeWaypoint(-1, 10.0), 'left'), [])
+        self.assertEqual(self.index.lane_change_path(FakeWaypoint(-1, 10.0), 'up'), [])
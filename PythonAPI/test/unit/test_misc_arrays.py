@@ -0,0 +1,62 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import unittest
+
+import numpy as np
+
+import carla
+
+from agents.tools.misc import (compute_distance, compute_distances, compute_forward_vectors,
+                               compute_magnitude_angle, compute_magnitude_angles, get_speed,
+                               get_speeds, is_within_distance, is_within_distances)
+
+
+class FakeVehicle(object):
+    def __init__(self, velocity):
+        self.velocity = velocity
+
+    def get_velocity(self):
+        return self.velocity
+
+
+class TestMiscArrays(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.locations = rng.uniform(-30, 30, size=(200, 3))
+        self.locations[:5] = 0.0
+        self.rotations = rng.uniform(-180, 180, size=(200, 3))
+        self.reference = carla.Transform(carla.Location(), carla.Rotation(pitch=5.0, yaw=30.0))
+
+    def test_distances_and_speeds(self):
+        reference = carla.Location(x=1.0, y=-2.0, z=0.5)
+        distances = compute_distances(self.locations, reference)
+        speeds = get_speeds(self.locations)
+        for i, (x, y, z) in enumerate(self.locations.tolist()):
+            location = carla.Location(x=x, y=y, z=z)
+            self.assertAlmostEqual(distances[i], compute_distance(location, reference), places=4)
+            self.assertAlmostEqual(speeds[i], get_speed(FakeVehicle(location)), places=4)
+
+    def test_forward_vectors(self):
+        forward_vectors = compute_forward_vectors(self.rotations)
+        for (pitch, yaw, roll), forward in zip(self.rotations.tolist(), forward_vectors):
+            expected = carla.Rotation(pitch=pitch, yaw=yaw, roll=roll).get_forward_vector()
+            np.testing.assert_allclose(forward, [expected.x, expected.y, expected.z], atol=1e-6)
+
+    def test_magnitude_angles(self):
+        current = carla.Location(x=3.0, y=4.0)
+        magnitudes, angles = compute_magnitude_angles(self.locations[5:], current, 45.0)
+        for i, (x, y, z) in enumerate(self.locations[5:].tolist()):
+            magnitude, angle = compute_magnitude_angle(carla.Location(x=x, y=y, z=z), current, 45.0)
+            self.assertAlmostEqual(magnitudes[i], magnitude, places=4)
+            self.assertAlmostEqual(angles[i], angle, places=3)
+
+    def test_within_distances(self):
+        for max_distance, angle_interval in ((20.0, None), (20.0, [0, 90]), (35.0, [160, 180])):
+            within = is_within_distances(self.locations, self.reference, max_distance, angle_interval)
+            for i, (x, y, z) in enumerate(self.locations.tolist()):
+                target = carla.Transform(carla.Location(x=x, y=y, z=z))
+                self.assertEqual(within[i], is_within_distance(target, self.reference, max_distance, angle_interval))
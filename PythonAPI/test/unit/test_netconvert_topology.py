@@ -0,0 +1,102 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+SUMO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'Co-Simulation', 'Sumo')
+NET_FILE = os.path.join(SUMO_PATH, 'examples', 'net', 'Town01.net.xml')
+
+try:
+    # netconvert_carla exits when the sumo tools are not found.
+    if 'SUMO_HOME' not in os.environ:
+        raise ImportError('SUMO_HOME is not declared')
+    sys.path.append(SUMO_PATH)
+    import sumolib
+    from util.netconvert_carla import build_topology, load_topology
+except ImportError:
+    sumolib = None
+
+
+def build_topology_pairwise(sumo_net):
+    """Previous build of the topology, checking the connections of every pair of edges"""
+    odr2sumo_ids = {}
+    for edge in sumo_net.getEdges():
+        for lane in edge.getLanes():
+            for odr_id in lane.getParam('origId').split():
+                odr_road_id, odr_lane_id = odr_id.split('_')
+                odr2sumo_ids.setdefault((odr_road_id, int(odr_lane_id)), set()).add(
+                    (edge.getID(), lane.getIndex()))
+
+    topology = {}
+    paths = {}
+    for from_edge in sumo_net.getEdges():
+        for to_edge in sumo_net.getEdges():
+            for connection in from_edge.getConnections(to_edge):
+                from_ = connection.getFromLane()
+                to_ = connection.getToLane()
+                from_key = (from_.getEdge().getID(), from_.getIndex())
+                to_key = (to_.getEdge().getID(), to_.getIndex())
+                topology.setdefault(from_key, set()).add(to_key)
+
+                conn_odr_ids = connection.getParam('origId')
+                if conn_odr_ids is not None:
+                    for odr_id in conn_odr_ids.split():
+                        odr_road_id, odr_lane_id = odr_id.split('_')
+                        paths.setdefault((odr_road_id, int(odr_lane_id)), set()).add((from_key, to_key))
+
+    return topology, paths, odr2sumo_ids
+
+
+def write_net_with_odr_ids(net_file, output):
+    """
+    Writes the given sumo net with made up opendrive ids, as netconvert adds them with
+    --output.original-names. The examples are not converted with it.
+    """
+    import lxml.etree as ET
+    tree = ET.parse(net_file)
+    for lane in tree.iter('lane'):
+        edge_id = lane.getparent().get('id').lstrip(':-').split('.')[0].replace('_', '')
+        lane_id = int(lane.get('index')) + 1
+        ET.SubElement(lane, 'param', key='origId', value='{}_{}'.format(edge_id, -lane_id))
+    for connection in tree.iter('connection'):
+        if connection.get('via') is not None:
+            road_id = connection.get('via').lstrip(':').replace('_', '')
+            ET.SubElement(connection, 'param', key='origId', value='{}_-1'.format(road_id))
+    tree.write(output)
+
+
+@unittest.skipIf(sumolib is None, 'sumo tools are not available')
+class TestNetconvertTopology(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.net_file = os.path.join(self.tmpdir, 'Town01.net.xml')
+        write_net_with_odr_ids(NET_FILE, self.net_file)
+        self.sumo_net = sumolib.net.readNet(self.net_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertSameTopology(self, sumo_topology, expected):
+        topology, paths, odr2sumo_ids = expected
+        self.assertEqual(sumo_topology._topology, topology)
+        self.assertEqual(sumo_topology._paths, paths)
+        self.assertEqual(sumo_topology._odr2sumo_ids, odr2sumo_ids)
+
+    def test_same_as_pairwise(self):
+        expected = build_topology_pairwise(self.sumo_net)
+        self.assertTrue(expected[0] and expected[1])
+        self.assertSameTopology(build_topology(self.sumo_net), expected)
+
+    def test_cache(self):
+        expected = build_topology_pairwise(self.sumo_net)
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        self.assertSameTopology(load_topology(self.net_file, cache_dir), expected)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertSameTopology(load_topology(self.net_file, cache_dir), expected)
@@ -0,0 +1,52 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import unittest
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from agents.tools.misc import compute_obb_vertices, polygons_intersect
+
+
+def random_route_quads(rng, num_steps):
+    """Corridor of a random smooth route, split in one quad per step as the BasicAgent does"""
+    yaw = rng.uniform(-np.pi, np.pi)
+    position = rng.uniform(-20, 20, size=2)
+    half_width = rng.uniform(0.8, 1.5)
+    points = []
+    for _ in range(num_steps + 1):
+        right = np.array([-np.sin(yaw), np.cos(yaw)])
+        points.append([position + half_width * right, position - half_width * right])
+        position = position + rng.uniform(1.0, 3.0) * np.array([np.cos(yaw), np.sin(yaw)])
+        yaw += rng.uniform(-0.3, 0.3)
+    points = np.array(points)
+    return np.stack([points[:-1, 0], points[1:, 0], points[1:, 1], points[:-1, 1]], axis=1)
+
+
+class TestPolygonsIntersect(unittest.TestCase):
+    def test_same_as_shapely(self):
+        rng = np.random.RandomState(0)
+        for _ in range(50):
+            quads = random_route_quads(rng, rng.randint(1, 15))
+            num_boxes = 100
+            boxes = compute_obb_vertices(
+                rng.uniform(-30, 30, size=(num_boxes, 2)),
+                rng.uniform(-180, 180, size=num_boxes),
+                rng.uniform(0.2, 3.0, size=(num_boxes, 2)))
+
+            result = polygons_intersect(quads, boxes)
+            self.assertEqual(result.shape, (len(quads), num_boxes))
+            for i, quad in enumerate(quads):
+                quad_polygon = Polygon(quad)
+                for j, box in enumerate(boxes):
+                    self.assertEqual(result[i, j], quad_polygon.intersects(Polygon(box)))
+
+    def test_obb_vertices(self):
+        vertices = compute_obb_vertices([[1.0, 2.0]], [90.0], [[2.0, 1.0]])
+        expected = [[2.0, 0.0], [2.0, 4.0], [0.0, 4.0], [0.0, 0.0]]
+        np.testing.assert_allclose(vertices[0], expected, atol=1e-9)
+        self.assertAlmostEqual(Polygon(vertices[0]).area, 8.0)
@@ -0,0 +1,82 @@
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+import random
+import unittest
+
+import networkx as nx
+import numpy as np
+
+from agents.navigation.route_search import CSRRoadGraph, astar_routes
+
+
+def random_road_graph(seed, num_nodes=60, num_edges=180):
+    rng = random.Random(seed)
+    graph = nx.DiGraph()
+    for node in range(num_nodes):
+        # Loose ends use negative ids in the planner graph
+        node_id = node if node % 10 else -node - 1
+        graph.add_node(node_id, vertex=(rng.uniform(-500, 500), rng.uniform(-500, 500), rng.uniform(0, 5)))
+    nodes = list(graph.nodes)
+    for _ in range(num_edges):
+        n1, n2 = rng.sample(nodes, 2)
+        # Lengths are waypoint counts in the planner, zero for lane changes
+        graph.add_edge(n1, n2, length=rng.choice([0, rng.randint(1, 200)]))
+    return graph
+
+
+class TestCSRRoadGraph(unittest.TestCase):
+    def test_same_routes_as_networkx(self):
+        for seed in range(20):
+            graph = random_road_graph(seed)
+            csr = CSRRoadGraph(graph)
+
+            def heuristic(n1, n2):
+                l1 = np.array(graph.nodes[n1]['vertex'])
+                l2 = np.array(graph.nodes[n2]['vertex'])
+                return np.linalg.norm(l1 - l2)
+
+            rng = random.Random(seed)
+            for _ in range(50):
+                source, target = rng.choice(list(graph.nodes)), rng.choice(list(graph.nodes))
+                try:
+                    expected = nx.astar_path(graph, source, target, heuristic=heuristic, weight='length')
+                except nx.NetworkXNoPath:
+                    self.assertRaises(nx.NetworkXNoPath, csr.astar, source, target)
+                    continue
+                self.assertEqual(csr.astar(source, target), expected)
+
+    def test_astar_routes(self):
+        for seed in range(10):
+            graph = random_road_graph(seed)
+            csr = CSRRoadGraph(graph)
+            nodes = list(graph.nodes)
+            rng = random.Random(seed)
+            pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(30)]
+            pairs += pairs[:5]
+
+            routes = astar_routes(csr, pairs)
+            self.assertEqual(len(routes), len(set(pairs)))
+            self.assertEqual(routes, astar_routes(csr, pairs, processes=2))
+
+            for source, target in pairs:
+                try:
+                    expected = csr.astar(source, target)
+                except nx.NetworkXNoPath:
+                    expected = None
+                self.assertEqual(routes[source, target], expected)
+
+    def test_arrays(self):
+        graph = random_road_graph(0)
+        csr = CSRRoadGraph(graph)
+        self.assertEqual(len(csr), graph.number_of_nodes())
+        self.assertEqual(len(csr.indices), graph.number_of_edges())
+        self.assertEqual(csr.indptr[-1], graph.number_of_edges())
+        self.assertEqual(csr.xyz.shape, (graph.number_of_nodes(), 3))
+
+    def test_unknown_node(self):
+        csr = CSRRoadGraph(random_road_graph(0))
+        self.assertRaises(nx.NodeNotFound, csr.astar, 0, 1000)
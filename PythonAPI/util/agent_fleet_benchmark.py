@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Benchmark of the step time of an AgentFleet of BehaviorAgents for several numbers
+of worker threads. The agents drive in the fake world of behavior_agent_benchmark.py,
+so no simulator is needed and the timings do not include the server round-trips.
+As the agents are mostly Python code, the threads only pay off on the parts that
+release the GIL, which are the server calls of a real world.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+try:
+    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
+        sys.version_info.major,
+        sys.version_info.minor,
+        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+try:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/carla')
+except IndexError:
+    pass
+
+import networkx as nx
+import numpy as np
+
+from agents.navigation.agent_fleet import AgentFleet  # pylint: disable=import-error
+from agents.navigation.behavior_agent import BehaviorAgent  # pylint: disable=import-error
+from agents.navigation.global_route_planner import GlobalRoutePlanner  # pylint: disable=import-error
+
+from behavior_agent_benchmark import DEFAULT_XODR, FakeWorld, load_map
+
+
+class FakeClient(object):
+    """Client of a FakeWorld, counting the batches of commands sent to it"""
+
+    def __init__(self, world):
+        self._world = world
+        self.batches = 0
+        self.commands = 0
+
+    def get_world(self):
+        return self._world
+
+    def apply_batch(self, commands):
+        self.batches += 1
+        self.commands += len(commands)
+
+
+def run(wmap, grp, num_actors, num_agents, num_workers, steps, seed=0):
+    """Returns the mean step time, and the batches and commands per step of an AgentFleet in a FakeWorld"""
+    world = FakeWorld(wmap, num_actors, seed)
+    client = FakeClient(world)
+    vehicles = [a for a in world.actors if a.type_id.startswith('vehicle.')][:num_agents]
+
+    rng = np.random.RandomState(seed)
+    destinations = wmap.generate_waypoints(10.0)
+    fleet = AgentFleet(client, map_inst=wmap, num_workers=num_workers)
+    for vehicle in vehicles:
+        agent = BehaviorAgent(vehicle, behavior='normal', map_inst=wmap, grp_inst=grp)
+        # Not every lane of the map reaches all the others
+        for index in rng.permutation(len(destinations))[:10]:
+            try:
+                agent.set_destination(destinations[index].transform.location)
+            except nx.NetworkXException:
+                continue
+            fleet.add_agent(agent)
+            break
+
+    start = time.time()
+    for _ in range(steps):
+        world.frame += 1
+        fleet.run_step()
+    elapsed = (time.time() - start) / steps
+    fleet.close()
+    return elapsed, client.batches / float(steps), client.commands / float(steps)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--xodr', default=DEFAULT_XODR,
+        help='OpenDRIVE file of the map (default: the template of the map generator)')
+    argparser.add_argument(
+        '--actors', default=250, type=int,
+        help='number of actors of the world (default: 250)')
+    argparser.add_argument(
+        '--agents', default=[10, 50], type=int, nargs='+',
+        help='number of agents of the fleet, several values can be given (default: 10 50)')
+    argparser.add_argument(
+        '--workers', default=[0, 2, 4, 8], type=int, nargs='+',
+        help='number of worker threads, several values can be given (default: 0 2 4 8)')
+    argparser.add_argument(
+        '--steps', default=20, type=int,
+        help='number of steps averaged per measure (default: 20)')
+    args = argparser.parse_args()
+
+    wmap = load_map(args.xodr)
+    grp = GlobalRoutePlanner(wmap, 4.5)
+
+    for num_agents in args.agents:
+        for num_workers in args.workers:
+            elapsed, batches, commands = run(wmap, grp, args.actors, num_agents, num_workers, args.steps)
+            print("{:4d} agents, {:2d} workers {:8.3f} ms/step   batches/step {:.1f}, commands/step {:.1f}".format(
+                num_agents, num_workers, elapsed * 1000, batches, commands))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Benchmark of the step time of the BehaviorAgent in a crowded world. The map is
+loaded from an OpenDRIVE file and populated with a fake world of vehicles,
+walkers and traffic lights, which counts the calls that would be sent to the
+simulator. The agent is stepped on its own and reading a shared WorldPerception.
+No simulator is needed, so the timings do not include the server round-trips,
+only how many of them would happen.
+"""
+
+import argparse
+import fnmatch
+import glob
+import os
+import sys
+import time
+from collections import Counter
+
+try:
+    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
+        sys.version_info.major,
+        sys.version_info.minor,
+        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+try:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/carla')
+except IndexError:
+    pass
+
+import carla
+import numpy as np
+
+from agents.navigation.behavior_agent import BehaviorAgent  # pylint: disable=import-error
+from agents.navigation.global_route_planner import GlobalRoutePlanner  # pylint: disable=import-error
+from agents.navigation.world_perception import WorldPerception  # pylint: disable=import-error
+
+DEFAULT_XODR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Unreal', 'CarlaUE4', 'Plugins', 'CarlaTools',
+    'Content', 'MapGenerator', 'Misc', 'OpenDrive', 'TemplateOpenDrive.xodr')
+
+
+class FakeActor(object):
+    """Actor placed at a fixed transform, counting the calls made to it"""
+
+    def __init__(self, world, actor_id, type_id, transform, velocity, extent):
+        self._world = world
+        self.id = actor_id
+        self.type_id = type_id
+        self.attributes = {'role_name': 'autopilot'}
+        self._transform = transform
+        self._velocity = velocity
+        self.bounding_box = carla.BoundingBox(carla.Location(), extent)
+        self.trigger_volume = carla.BoundingBox(carla.Location(x=-5.0), carla.Vector3D(1.0, 2.0, 1.0))
+        self.state = carla.TrafficLightState.Red
+
+    def get_world(self):
+        return self._world
+
+    def get_transform(self):
+        self._world.calls['actor.get_transform'] += 1
+        location, rotation = self._transform.location, self._transform.rotation
+        return carla.Transform(
+            carla.Location(x=location.x, y=location.y, z=location.z),
+            carla.Rotation(pitch=rotation.pitch, yaw=rotation.yaw, roll=rotation.roll))
+
+    def get_location(self):
+        self._world.calls['actor.get_location'] += 1
+        location = self._transform.location
+        return carla.Location(x=location.x, y=location.y, z=location.z)
+
+    def get_velocity(self):
+        self._world.calls['actor.get_velocity'] += 1
+        return carla.Vector3D(x=self._velocity.x, y=self._velocity.y, z=self._velocity.z)
+
+    def get_control(self):
+        return carla.VehicleControl()
+
+    def get_speed_limit(self):
+        return 50.0
+
+    def get_state(self):
+        self._world.calls['actor.get_state'] += 1
+        return self.state
+
+
+class FakeActorList(list):
+    """List of actors with the filter of carla.ActorList"""
+
+    def filter(self, wildcard_pattern):
+        return FakeActorList(a for a in self if fnmatch.fnmatch(a.type_id, wildcard_pattern))
+
+    def find(self, actor_id):
+        for actor in self:
+            if actor.id == actor_id:
+                return actor
+        return None
+
+
+class FakeActorSnapshot(object):
+    def __init__(self, actor):
+        self.id = actor.id
+        self._transform = actor._transform
+        self._velocity = actor._velocity
+
+    def get_transform(self):
+        return self._transform
+
+    def get_velocity(self):
+        return self._velocity
+
+
+class FakeSnapshot(list):
+    def __init__(self, actors, frame):
+        super(FakeSnapshot, self).__init__(FakeActorSnapshot(a) for a in actors)
+        self.frame = frame
+        self._by_id = {actor_snapshot.id: actor_snapshot for actor_snapshot in self}
+
+    def find(self, actor_id):
+        return self._by_id.get(actor_id)
+
+
+class FakeWorld(object):
+    """
+    World with static vehicles, walkers and traffic lights placed on the lanes of a map.
+    Every call to the world or to its actors is counted, as each one would be a request to the server.
+    """
+
+    def __init__(self, wmap, num_actors, seed=0):
+        self._map = wmap
+        self.calls = Counter()
+        self.frame = 0
+        self.actors = FakeActorList()
+        self._snapshot = None
+
+        rng = np.random.RandomState(seed)
+        waypoints = wmap.generate_waypoints(2.0)
+        for i, index in enumerate(rng.choice(len(waypoints), size=num_actors)):
+            transform = waypoints[index].transform
+            if i % 50 == 49:
+                type_id, extent = 'traffic.traffic_light', carla.Vector3D(0.5, 0.5, 2.0)
+                speed = 0.0
+            elif i % 5 == 4:
+                type_id, extent = 'walker.pedestrian.0001', carla.Vector3D(0.3, 0.3, 0.9)
+                speed = rng.uniform(0.0, 1.5)
+            else:
+                type_id, extent = 'vehicle.tesla.model3', carla.Vector3D(2.4, 1.0, 0.75)
+                speed = rng.uniform(0.0, 10.0)
+            forward = transform.get_forward_vector()
+            velocity = carla.Vector3D(x=speed * forward.x, y=speed * forward.y, z=0.0)
+            self.actors.append(FakeActor(self, 1000 + i, type_id, transform, velocity, extent))
+
+    def get_map(self):
+        self.calls['world.get_map'] += 1
+        return self._map
+
+    def get_actors(self, actor_ids=None):
+        self.calls['world.get_actors'] += 1
+        if actor_ids is None:
+            return FakeActorList(self.actors)
+        actor_ids = set(actor_ids)
+        return FakeActorList(a for a in self.actors if a.id in actor_ids)
+
+    def get_snapshot(self):
+        self.calls['world.get_snapshot'] += 1
+        if self._snapshot is None or self._snapshot.frame != self.frame:
+            self._snapshot = FakeSnapshot(self.actors, self.frame)
+        return self._snapshot
+
+
+def load_map(xodr_path):
+    """Returns a carla.Map built from an OpenDRIVE file"""
+    with open(xodr_path) as od_file:
+        return carla.Map(os.path.splitext(os.path.basename(xodr_path))[0], od_file.read())
+
+
+def run(wmap, grp, num_actors, steps, use_perception):
+    """Returns the mean step time and the calls per step of a BehaviorAgent in a FakeWorld"""
+    world = FakeWorld(wmap, num_actors)
+    ego = next(a for a in world.actors if a.type_id.startswith('vehicle.'))
+    agent = BehaviorAgent(ego, behavior='normal', map_inst=wmap, grp_inst=grp)
+    destination = wmap.generate_waypoints(10.0)[-1].transform.location
+    agent.set_destination(destination)
+
+    perception = None
+    if use_perception:
+        perception = WorldPerception(world, wmap)
+        agent.set_perception(perception)
+
+    world.calls.clear()
+    start = time.time()
+    for _ in range(steps):
+        world.frame += 1
+        if perception is not None:
+            perception.update()
+        agent.run_step()
+    elapsed = (time.time() - start) / steps
+    return elapsed, {name: count / float(steps) for name, count in world.calls.items()}
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--xodr', default=DEFAULT_XODR,
+        help='OpenDRIVE file of the map (default: the template of the map generator)')
+    argparser.add_argument(
+        '--actors', default=[50, 100, 250, 500], type=int, nargs='+',
+        help='number of actors of the world, several values can be given (default: 50 100 250 500)')
+    argparser.add_argument(
+        '--steps', default=50, type=int,
+        help='number of steps averaged per measure (default: 50)')
+    args = argparser.parse_args()
+
+    wmap = load_map(args.xodr)
+    grp = GlobalRoutePlanner(wmap, 4.5)
+
+    for num_actors in args.actors:
+        for use_perception in (False, True):
+            elapsed, calls = run(wmap, grp, num_actors, args.steps, use_perception)
+            print("{:4d} actors, {:12s} {:8.3f} ms/step   calls/step: {}".format(
+                num_actors, 'perception' if use_perception else 'standalone', elapsed * 1000,
+                ', '.join('{} {:.1f}'.format(name, count) for name, count in sorted(calls.items()))))
+
+
+if __name__ == '__main__':
+    main()
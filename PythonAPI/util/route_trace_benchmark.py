@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2019 Computer Vision Center (CVC) at the Universitat Autonoma de
+# Barcelona (UAB).
+#
+# This work is licensed under the terms of the MIT license.
+# For a copy, see <https://opensource.org/licenses/MIT>.
+
+"""
+Benchmark of the closest waypoint searches done by the GlobalRoutePlanner when
+tracing a route. A synthetic winding route of the given length is split into
+graph edges, and the linear scan over carla.Waypoint lists is compared against
+the NumPy searches over the per-edge arrays and the map-wide waypoint index.
+No simulator is needed.
+"""
+
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+
+try:
+    sys.path.append(glob.glob('../carla/dist/carla-*%d.%d-%s.egg' % (
+        sys.version_info.major,
+        sys.version_info.minor,
+        'win-amd64' if os.name == 'nt' else 'linux-x86_64'))[0])
+except IndexError:
+    pass
+
+try:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + '/carla')
+except IndexError:
+    pass
+
+import carla
+import networkx as nx
+import numpy as np
+
+from agents.navigation.global_route_planner import GlobalRoutePlanner  # pylint: disable=import-error
+from agents.navigation.local_planner import RoadOption  # pylint: disable=import-error
+from agents.navigation.waypoint_index import WaypointIndex, closest_index, waypoint_xyz  # pylint: disable=import-error
+
+
+class SyntheticWaypoint(object):
+    """Holds the attributes of a carla.Waypoint used by the searches"""
+
+    def __init__(self, road_id, s, location):
+        self.road_id = road_id
+        self.section_id = 0
+        self.lane_id = -1
+        self.s = s
+        self.transform = carla.Transform(location)
+
+
+def build_route(length, resolution, edge_length):
+    """Returns the edges of a winding route as lists of waypoints"""
+    waypoints = []
+    for i in range(int(length / resolution) + 1):
+        s = i * resolution
+        location = carla.Location(x=s, y=50.0 * math.sin(s / 200.0), z=0.0)
+        waypoints.append(SyntheticWaypoint(int(s // edge_length), s, location))
+
+    step = max(int(edge_length / resolution), 2)
+    return [waypoints[i:i + step + 1] for i in range(0, len(waypoints) - 1, step)]
+
+
+def build_graph(edges):
+    """Returns a GlobalRoutePlanner like graph of the route, with the per-edge arrays"""
+    graph = nx.DiGraph()
+    for i, waypoints in enumerate(edges):
+        graph.add_edge(
+            i, i + 1, entry_waypoint=waypoints[0], exit_waypoint=waypoints[-1], path=waypoints[1:-1],
+            length=len(waypoints) - 1, type=RoadOption.LANEFOLLOW,
+            waypoints_xyz=np.array([waypoint_xyz(wp) for wp in waypoints], dtype=np.float64))
+    return graph
+
+
+def benchmark(function, repetitions):
+    start = time.time()
+    for _ in range(repetitions):
+        function()
+    return (time.time() - start) / repetitions
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument(
+        '--length', default=10000.0, type=float,
+        help='length of the route in meters (default: 10000)')
+    argparser.add_argument(
+        '--resolution', default=2.0, type=float,
+        help='distance between waypoints in meters (default: 2.0)')
+    argparser.add_argument(
+        '--edge-length', default=100.0, type=float,
+        help='length of the graph edges in meters (default: 100)')
+    argparser.add_argument(
+        '--repetitions', default=5, type=int,
+        help='number of runs averaged per measure (default: 5)')
+    args = argparser.parse_args()
+
+    edges = build_route(args.length, args.resolution, args.edge_length)
+    graph = build_graph(edges)
+    all_waypoints = [wp for waypoints in edges for wp in waypoints]
+    destination = edges[-1][-1]
+    print("Route of {:.1f} km: {} edges, {} waypoints".format(
+        args.length / 1000.0, len(edges), len(all_waypoints)))
+
+    # Tracing: one closest search per edge, plus one per waypoint of the last edge
+    def trace_linear():
+        current = edges[0][0]
+        for waypoints in edges:
+            index = GlobalRoutePlanner._find_closest_in_list(None, current, waypoints)
+            current = waypoints[-1]
+        for _ in edges[-1][index:]:
+            GlobalRoutePlanner._find_closest_in_list(None, destination, edges[-1])
+
+    def trace_vectorized():
+        current = waypoint_xyz(edges[0][0])
+        for _, _, edge in graph.edges(data=True):
+            closest_index(current, edge['waypoints_xyz'])
+            current = waypoint_xyz(edge['exit_waypoint'])
+        closest_index(waypoint_xyz(destination), edge['waypoints_xyz'])
+
+    linear = benchmark(trace_linear, args.repetitions)
+    vectorized = benchmark(trace_vectorized, args.repetitions)
+    print("Trace route searches:    linear {:8.3f} ms   vectorized {:8.3f} ms   ({:.1f}x)".format(
+        linear * 1000, vectorized * 1000, linear / vectorized))
+
+    # Localization of arbitrary locations over the whole route
+    queries = [carla.Location(x=x, y=10.0, z=0.0) for x in range(0, int(args.length), 250)]
+    index = WaypointIndex(graph)
+
+    def localize_linear():
+        for location in queries:
+            min(all_waypoints, key=lambda wp: wp.transform.location.distance(location))
+
+    def localize_index():
+        for location in queries:
+            index.query(location)
+
+    linear = benchmark(localize_linear, args.repetitions)
+    indexed = benchmark(localize_index, args.repetitions)
+    print("Localize {:3d} locations: linear {:8.3f} ms   index      {:8.3f} ms   ({:.1f}x)".format(
+        len(queries), linear * 1000, indexed * 1000, linear / indexed))
+
+
+if __name__ == '__main__':
+    main()